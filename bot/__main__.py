@@ -0,0 +1,99 @@
+# bot/__main__.py
+"""
+Command line entry point.
+
+    python -m bot run [--mode stream] [--broker sim]   # trade until interrupted
+    python -m bot run --workers 4                      # strategies in 4 symbol-sharded processes
+    python -m bot once                                 # one poll cycle (cron / after a crash)
+    python -m bot dry-run                              # one cycle, print orders and exits only
+    python -m bot replay --filings f.jsonl --bars data/bars   # offline backtest (bot.backtest.engine)
+    python -m bot startup-check                        # import-time budget, exit status 1 if blown
+
+Importing bot.main is cheap and side-effect free (no broker, no network, no
+state/ or logs/ directories); everything is set up by main.start(). Heavy
+dependencies (alpaca_trade_api and its pandas, requests, websockets) load
+on first use, and startup-check keeps it that way.
+"""
+import argparse, json, os, pathlib, subprocess, sys, tempfile
+
+IMPORT_BUDGET_MS = float(os.getenv("IMPORT_BUDGET_MS", "400"))   # `import bot.main`, fresh interpreter
+LAZY_MODULES = ("alpaca_trade_api", "pandas", "requests", "websockets", "feedparser")
+
+_PROBE = """
+import json, sys, time
+t0 = time.perf_counter()
+import bot.main
+dt = time.perf_counter() - t0
+print(json.dumps({"ms": dt * 1e3, "loaded": sorted(m for m in %r if m in sys.modules)}))
+"""
+
+
+def startup_check(budget_ms: float = IMPORT_BUDGET_MS, runs: int = 3) -> bool:
+    """Import bot.main in fresh interpreters from an empty directory; True if within budget.
+
+    Fails when the best of `runs` imports exceeds `budget_ms`, when any of
+    LAZY_MODULES got imported, or when the import created files.
+    """
+    root = str(pathlib.Path(__file__).resolve().parent.parent)
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, (root, os.getenv("PYTHONPATH")))))
+    with tempfile.TemporaryDirectory() as tmp:
+        results = []
+        for _ in range(runs):
+            out = subprocess.run([sys.executable, "-c", _PROBE % (LAZY_MODULES,)], cwd=tmp, env=env,
+                                 capture_output=True, text=True)
+            if out.returncode:
+                print(out.stderr.strip())
+                return False
+            results.append(json.loads(out.stdout.strip().splitlines()[-1]))
+        created = sorted(os.listdir(tmp))
+    ms = min(r["ms"] for r in results)
+    loaded = results[0]["loaded"]
+    ok = ms <= budget_ms and not loaded and not created
+    print(f"import bot.main: {ms:.0f} ms (budget {budget_ms:.0f} ms)"
+          f"{', eagerly loaded ' + ', '.join(loaded) if loaded else ''}"
+          f"{', created ' + ', '.join(created) if created else ''} — {'ok' if ok else 'FAILED'}")
+    return ok
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if argv[:1] == ["replay"]:   # engine's own options (argparse.REMAINDER chokes on a leading --flag)
+        from bot.backtest import engine
+        engine.main(argv[1:])
+        return 0
+
+    ap = argparse.ArgumentParser(prog="python -m bot", description="Insider-filing trading bot.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    for name, text in (("run", "trade until interrupted"), ("once", "run one poll cycle and exit"),
+                       ("dry-run", "one poll cycle; print orders and exits instead of placing them")):
+        p = sub.add_parser(name, help=text)
+        p.add_argument("--broker", choices=("alpaca", "sim"), help="overrides BROKER")
+        p.add_argument("--workers", type=int, help="strategy worker processes (bot.workers); overrides WORKERS")
+        if name == "run":
+            p.add_argument("--mode", choices=("poll", "stream"), help="overrides RUN_MODE")
+    sub.add_parser("replay", help="backtest archived filings (options of bot.backtest.engine)")
+    cp = sub.add_parser("startup-check", help="check the import-time budget of bot.main")
+    cp.add_argument("--budget-ms", type=float, default=IMPORT_BUDGET_MS)
+    args = ap.parse_args(argv)
+
+    if args.cmd == "startup-check":
+        return 0 if startup_check(args.budget_ms) else 1
+    from bot import main as bot
+    if args.broker:
+        bot.BROKER = args.broker
+    if getattr(args, "mode", None):
+        bot.RUN_MODE = args.mode
+    bot.start(dry_run=args.cmd == "dry-run",
+              n_workers=bot.WORKERS if args.workers is None else args.workers)
+    if args.cmd == "run":
+        bot.run()
+    else:
+        try:
+            bot.run_cycle()
+        finally:
+            bot.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,98 @@
+# bot/backtest/broker.py
+"""Point-in-time broker: the AlpacaBroker interface answered from a BarStore at a simulated clock."""
+import itertools
+from datetime import datetime, timezone
+from bot.brokers.alpaca import MarketDataHelpers, DAILY_LOOKBACK
+from bot.backtest.store import BarStore
+
+
+class Fill:
+    __slots__ = ("id", "symbol", "qty", "side", "filled_avg_price", "filled_at")
+
+    def __init__(self, id, symbol, qty, side, filled_avg_price, filled_at):
+        self.id, self.symbol, self.qty, self.side = id, symbol, qty, side
+        self.filled_avg_price, self.filled_at = filled_avg_price, filled_at
+
+
+class Account:
+    __slots__ = ("cash", "equity")
+
+    def __init__(self, cash, equity):
+        self.cash, self.equity = cash, equity
+
+
+class _BarsAPI:
+    """Just enough of tradeapi.REST for code that calls broker.api.get_bars."""
+
+    def __init__(self, broker):
+        self._broker = broker
+
+    def get_bars(self, symbol, timeframe, start=None, limit=DAILY_LOOKBACK, sort=None):
+        if str(timeframe) == "1Day":
+            bars = self._broker.daily_bars(symbol, limit)
+        else:
+            bars = self._broker.minute_bars(symbol, limit)
+        return bars[::-1] if getattr(sort, "value", sort) == "desc" else bars
+
+
+class PointInTimeBroker(MarketDataHelpers):
+    """Every lookup only sees bars that were complete at `now`; orders fill at current_price."""
+
+    def __init__(self, store: BarStore, cash: float = 100_000.0, slippage_pct: float = 0.0):
+        self.store = store
+        self.cash = cash
+        self.slippage_pct = slippage_pct
+        self.now = None
+        self._ts = 0
+        self._ids = itertools.count(1)
+        self.fills: list[Fill] = []
+        self.holdings: dict[str, int] = {}
+        self.api = _BarsAPI(self)
+
+    def set_time(self, now: datetime):
+        self.now = now
+        self._ts = int(now.replace(tzinfo=timezone.utc).timestamp())
+
+    # --- raw market data ---
+    def daily_bars(self, symbol: str, limit: int = DAILY_LOOKBACK):
+        return self.store.to_bars(self.store.upto("day", symbol, self._ts, limit))
+
+    def minute_bars(self, symbol: str, limit: int = 60):
+        return self.store.to_bars(self.store.upto("1Min", symbol, self._ts, limit))
+
+    def latest_quote(self, symbol: str):
+        return None  # no recorded quotes → spread gates are skipped, as on a live lookup failure
+
+    def current_price(self, symbol: str):
+        for tf in ("1Min", "day"):
+            last = self.store.upto(tf, symbol, self._ts, 1)
+            if len(last):
+                return float(last["c"][0])
+        return None
+
+    def latest_prices(self, symbols) -> dict:
+        prices = {s: self.current_price(s) for s in dict.fromkeys(symbols)}
+        return {s: p for s, p in prices.items() if p is not None}
+
+    # --- orders / account ---
+    def _fill(self, symbol: str, qty: int, side: str) -> Fill:
+        price = self.current_price(symbol)
+        if price is None:
+            raise ValueError(f"no price for {symbol} at {self.now}")
+        price *= 1 + self.slippage_pct if side == "buy" else 1 - self.slippage_pct
+        sign = 1 if side == "buy" else -1
+        self.cash -= sign * qty * price
+        self.holdings[symbol] = self.holdings.get(symbol, 0) + sign * qty
+        fill = Fill(f"bt-{next(self._ids)}", symbol, qty, side, price, self.now)
+        self.fills.append(fill)
+        return fill
+
+    def submit_buy_market(self, symbol: str, qty: int):
+        return self._fill(symbol, qty, "buy")
+
+    def submit_sell_market(self, symbol: str, qty: int):
+        return self._fill(symbol, qty, "sell")
+
+    def account_info(self):
+        equity = self.cash + sum(q * (self.current_price(s) or 0.0) for s, q in self.holdings.items())
+        return Account(self.cash, equity)
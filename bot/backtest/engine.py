@@ -0,0 +1,234 @@
+# bot/backtest/engine.py
+"""
+Offline backtest: replay archived filings and a local bar store through the
+unchanged strategy decide_trade(filing, broker) functions.
+
+Filings are sharded into contiguous date ranges and each shard runs in its own
+process against a PointInTimeBroker. A shard only opens positions for its own
+filings but keeps checking exits (via should_exit, once per trading-day close)
+until everything it opened is closed, so no trade is cut off at a shard edge.
+Shards are independent: a symbol bought in two shards is two positions, and
+the trade-history filter in insider_simple only sees its own shard's closes.
+
+    python -m bot.backtest.engine --filings filings.jsonl --bars data/bars --workers 8
+
+With --features-out DIR every evaluation's feature snapshot
+(bot.strategies.snapshots) is written to a features journal under DIR, ready
+for python -m bot.backtest.sweep.
+"""
+import argparse, importlib, json, os, pathlib
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from bot.backtest.broker import PointInTimeBroker
+from bot.backtest.store import BarStore
+from bot.risk.exit import should_exit, MAX_DAYS
+from bot.strategies import pipeline
+
+DEFAULT_STRATEGIES = ("insider_simple", "momentum")
+EXIT_CHECK_UTC = timedelta(hours=21)   # daily exit check, after the close
+CAPITAL = 100_000.0
+SHARDS = 16   # fixed so results don't depend on the worker count
+
+
+def load_filings(path) -> list[dict]:
+    """Filings from a JSONL archive, or from a directory of recorded atom feeds."""
+    path = pathlib.Path(path)
+    if path.is_dir():
+        from bot.data.edgar_feed import parse_filings
+        filings = [f for p in sorted(path.glob("*.xml")) for f in parse_filings(p.read_bytes())]
+    else:
+        with path.open() as f:
+            filings = [json.loads(line) for line in f if line.strip()]
+    for f in filings:
+        if isinstance(f["filed_at"], str):
+            f["filed_at"] = datetime.fromisoformat(f["filed_at"])
+    return sorted(filings, key=lambda f: f["filed_at"])
+
+
+def shard_by_date(filings: list[dict], n: int) -> list[list[dict]]:
+    """Split time-sorted filings into about `n` shards that never split a calendar day."""
+    if not filings:
+        return []
+    target = max(1, -(-len(filings) // max(1, n)))
+    shards, cur = [], []
+    for f in filings:
+        if len(cur) >= target and f["filed_at"].date() != cur[-1]["filed_at"].date():
+            shards.append(cur)
+            cur = []
+        cur.append(f)
+    shards.append(cur)
+    return shards
+
+
+def run_shard(filings: list[dict], bar_root: str, strategies=DEFAULT_STRATEGIES,
+              record: bool = False) -> list[dict] | tuple[list[dict], list[tuple]]:
+    """Simulate one shard; returns its closed trades (and feature snapshot rows if `record`)."""
+    from bot.strategies import snapshots
+    from bot.utils import trade_history
+    history = trade_history._index = trade_history.TradeHistoryIndex()  # shard-local history
+    mods = [importlib.import_module(f"bot.strategies.{name}") for name in strategies]
+    broker = PointInTimeBroker(BarStore(bar_root))
+    book: dict[str, dict] = {}
+    closed: list[dict] = []
+    rows: list[tuple] = []
+
+    def check_exits(now: datetime):
+        broker.set_time(now)
+        prices = broker.latest_prices(book)
+        for sym, pos in list(book.items()):
+            price = prices.get(sym)
+            if price is None:
+                continue
+            reason = should_exit(pos["entry_price"], price, pos["entry_time"], now=now)
+            if reason:
+                close(sym, price, reason, now)
+
+    def close(sym: str, price: float, reason: str, now: datetime):
+        pos = book.pop(sym)
+        fill = broker.submit_sell_market(sym, pos["qty"])
+        pnl = (fill.filled_avg_price - pos["entry_price"]) * pos["qty"]
+        history.record(sym, pnl, now)
+        closed.append(dict(pos, exit_time=now, exit_price=fill.filled_avg_price,
+                           pnl=pnl, reason=reason))
+
+    day = filings[0]["filed_at"].date()
+    i = 0
+    while i < len(filings) or book:
+        check_at = datetime.combine(day, datetime.min.time()) + EXIT_CHECK_UTC
+        while i < len(filings) and filings[i]["filed_at"] < check_at:
+            filing = filings[i]; i += 1
+            broker.set_time(filing["filed_at"])
+            pipeline.new_cycle(broker)   # memoized features are only valid at this instant
+            for mod in mods:
+                try:
+                    order = mod.decide_trade(filing, broker)
+                except Exception:
+                    order = None
+                if record:
+                    row = snapshots.capture(mod, filing, broker, traded=bool(order))
+                    if row is not None:
+                        rows.append(row)
+                if not order:
+                    continue
+                fill = broker.submit_buy_market(order["symbol"], order["qty"])
+                cur = book.get(order["symbol"])
+                if cur is None:
+                    book[order["symbol"]] = {"symbol": order["symbol"], "qty": order["qty"],
+                                             "entry_price": fill.filled_avg_price,
+                                             "entry_time": filing["filed_at"], "strategy": mod.__name__}
+                else:  # same merge rule as the live PositionBook
+                    qty = cur["qty"] + order["qty"]
+                    cur["entry_price"] = (cur["entry_price"] * cur["qty"] + fill.filled_avg_price * order["qty"]) / qty
+                    cur["qty"] = qty
+        if day.weekday() < 5:
+            check_exits(check_at)
+        if i >= len(filings) and book and check_at - filings[-1]["filed_at"] > timedelta(days=MAX_DAYS + 7):
+            for sym in list(book):  # no more bars to exit on
+                price = broker.current_price(sym)
+                if price is None:
+                    book.pop(sym)
+                else:
+                    close(sym, price, "END", check_at)
+        day += timedelta(days=1)
+    return (closed, rows) if record else closed
+
+
+def summarize(trades: list[dict], capital: float = CAPITAL) -> dict:
+    """PnL curve (by exit day), hit rate and turnover for a list of closed trades."""
+    trades = sorted(trades, key=lambda t: t["exit_time"])
+    curve, total = [], 0.0
+    for t in trades:
+        total += t["pnl"]
+        d = t["exit_time"].date().isoformat()
+        if curve and curve[-1][0] == d:
+            curve[-1] = (d, total)
+        else:
+            curve.append((d, total))
+    notional = sum(t["qty"] * (t["entry_price"] + t["exit_price"]) for t in trades)
+    by_strategy = {}
+    for t in trades:
+        s = by_strategy.setdefault(t["strategy"], {"trades": 0, "wins": 0, "pnl": 0.0})
+        s["trades"] += 1
+        s["wins"] += t["pnl"] > 0
+        s["pnl"] += t["pnl"]
+    return {
+        "trades": len(trades),
+        "hit_rate": sum(t["pnl"] > 0 for t in trades) / len(trades) if trades else None,
+        "total_pnl": total,
+        "turnover": notional / capital,
+        "avg_hold_days": (sum((t["exit_time"] - t["entry_time"]).total_seconds() for t in trades)
+                          / len(trades) / 86400) if trades else None,
+        "by_strategy": by_strategy,
+        "pnl_curve": curve,
+    }
+
+
+def run_backtest(filings: list[dict], bar_root, workers: int | None = None,
+                 strategies=DEFAULT_STRATEGIES, shards: int = SHARDS, record: bool = False) -> dict:
+    workers = workers or os.cpu_count() or 1
+    shards = shard_by_date(filings, shards)
+    trades, snapshots = [], []
+
+    def collect(results):
+        for result in results:
+            if record:
+                result, rows = result
+                snapshots.extend(rows)
+            trades.extend(result)
+
+    n = len(shards)
+    if workers == 1:
+        collect(run_shard(shard, str(bar_root), strategies, record) for shard in shards)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            collect(pool.map(run_shard, shards, [str(bar_root)] * n, [tuple(strategies)] * n, [record] * n))
+    out = summarize(trades)
+    out["closed_trades"] = trades
+    if record:
+        out["snapshots"] = snapshots
+    return out
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Replay archived filings through the strategies.")
+    ap.add_argument("--filings", required=True, help="JSONL archive or directory of atom .xml feeds")
+    ap.add_argument("--bars", required=True, help="BarStore root (day/ and 1Min/ .npy files)")
+    ap.add_argument("--start"); ap.add_argument("--end")
+    ap.add_argument("--workers", type=int, default=None)
+    ap.add_argument("--shards", type=int, default=SHARDS, help="date-range shards (fixes the result)")
+    ap.add_argument("--strategies", default=",".join(DEFAULT_STRATEGIES))
+    ap.add_argument("--trades-out", help="write closed trades as JSONL")
+    ap.add_argument("--features-out", help="write per-evaluation feature snapshots to a journal under this dir")
+    args = ap.parse_args(argv)
+
+    filings = load_filings(args.filings)
+    if args.start:
+        filings = [f for f in filings if f["filed_at"] >= datetime.fromisoformat(args.start)]
+    if args.end:
+        filings = [f for f in filings if f["filed_at"] < datetime.fromisoformat(args.end)]
+    if not filings:
+        print("no filings in range")
+        return None
+    res = run_backtest(filings, args.bars, args.workers, args.strategies.split(","), args.shards,
+                       record=bool(args.features_out))
+    print(f"{len(filings)} filings → {res['trades']} trades, hit rate "
+          f"{(res['hit_rate'] or 0):.1%}, PnL ${res['total_pnl']:.2f}, turnover {res['turnover']:.2f}x, "
+          f"avg hold {(res['avg_hold_days'] or 0):.1f}d")
+    for name, s in res["by_strategy"].items():
+        print(f"  {name}: {s['trades']} trades, {s['wins']} wins, PnL ${s['pnl']:.2f}")
+    if args.trades_out:
+        with open(args.trades_out, "w") as f:
+            for t in res["closed_trades"]:
+                f.write(json.dumps(t, default=str) + "\n")
+    if args.features_out:
+        from bot.utils.journal import Journal
+        journal = Journal("features", root=args.features_out, flush_seconds=0)
+        for row in res["snapshots"]:
+            journal.append(row)
+        journal.compact()   # every replayed day is in the past: leave one segment per day
+        print(f"{len(res['snapshots'])} feature snapshots -> {args.features_out}")
+    return res
+
+
+if __name__ == "__main__":
+    main()
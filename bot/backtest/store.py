@@ -0,0 +1,72 @@
+# bot/backtest/store.py
+"""
+Local bar store for backtests: one structured .npy array per (timeframe, symbol),
+opened memory-mapped so a worker only pages in the bars it touches.
+
+Layout: <root>/<timeframe>/<SYMBOL>.npy with BAR_DTYPE rows sorted by `t`
+(bar start, epoch seconds UTC). Timeframes are "day" and "1Min".
+"""
+import pathlib
+import numpy as np
+
+BAR_DTYPE = np.dtype([("t", "<i8"), ("o", "<f8"), ("h", "<f8"), ("l", "<f8"), ("c", "<f8"), ("v", "<f8")])
+
+# when a bar becomes known: daily bars are stamped 00:00 UTC and final after the close
+AVAILABLE_AFTER = {"day": 21 * 3600, "1Min": 60}
+
+
+class Bar:
+    """Alpaca-style bar record (.t/.o/.h/.l/.c/.v)."""
+    __slots__ = ("t", "o", "h", "l", "c", "v")
+
+    def __init__(self, t, o, h, l, c, v):
+        self.t, self.o, self.h, self.l, self.c, self.v = t, o, h, l, c, v
+
+    def __repr__(self):
+        return f"Bar(t={self.t}, o={self.o}, h={self.h}, l={self.l}, c={self.c}, v={self.v})"
+
+
+class BarStore:
+    def __init__(self, root):
+        self.root = pathlib.Path(root)
+        self._open = {}
+        self._times = {}   # in-memory copy of each opened file's `t` column for searchsorted
+
+    def path(self, timeframe: str, symbol: str) -> pathlib.Path:
+        return self.root / timeframe / f"{symbol}.npy"
+
+    def load(self, timeframe: str, symbol: str) -> np.ndarray | None:
+        key = (timeframe, symbol)
+        if key not in self._open:
+            p = self.path(timeframe, symbol)
+            arr = np.load(p, mmap_mode="r") if p.exists() else None
+            self._open[key] = arr
+            self._times[key] = np.array(arr["t"]) if arr is not None else None
+        return self._open[key]
+
+    def write(self, timeframe: str, symbol: str, rows) -> pathlib.Path:
+        """Store bars given as BAR_DTYPE array or (t, o, h, l, c, v) tuples."""
+        arr = np.asarray(rows, dtype=BAR_DTYPE) if not isinstance(rows, np.ndarray) else rows.astype(BAR_DTYPE)
+        arr = np.sort(arr, order="t")
+        p = self.path(timeframe, symbol)
+        p.parent.mkdir(parents=True, exist_ok=True)
+        np.save(p, arr)
+        self._open.pop((timeframe, symbol), None)
+        self._times.pop((timeframe, symbol), None)
+        return p
+
+    def symbols(self, timeframe: str = "day") -> list[str]:
+        return sorted(p.stem for p in (self.root / timeframe).glob("*.npy"))
+
+    def upto(self, timeframe: str, symbol: str, ts: int, limit: int) -> np.ndarray:
+        """The last `limit` bars already complete at epoch second `ts` (no lookahead)."""
+        arr = self.load(timeframe, symbol)
+        if arr is None or limit <= 0:
+            return np.empty(0, dtype=BAR_DTYPE)
+        times = self._times[(timeframe, symbol)]
+        end = int(np.searchsorted(times, ts - AVAILABLE_AFTER[timeframe], side="right"))
+        return arr[max(0, end - limit):end]
+
+    @staticmethod
+    def to_bars(arr: np.ndarray) -> list[Bar]:
+        return [Bar(*row) for row in arr.tolist()]
@@ -0,0 +1,257 @@
+# bot/backtest/sweep.py
+"""
+Threshold sweep over recorded feature snapshots.
+
+Reads the "features" journal (live runs with RECORD_FEATURES > 0 record a
+row per sampled evaluation, see bot.strategies.snapshots; `engine
+--features-out` records every evaluation of a backtest) and labels every row from a BarStore with what the exit rules
+would have made of buying dollar_position(price) shares at that moment:
+STOP_PCT / PROFIT_PCT / MAX_DAYS checked on daily closes, as in the engine.
+Rows whose exit isn't in the bars yet are left out. Every row counts as its
+own trade (no merging of repeat buys as in the position book).
+
+Then every combination of a strategy's threshold grid is scored at once.
+Each gate value is a boolean mask over the rows, a combination is the AND of
+one mask per gate, and trades / wins / PnL per combination are products of
+that (combinations x rows) mask with the outcome columns. Chunks of
+combinations run in a process pool.
+
+    python -m bot.backtest.sweep --bars data/bars --strategy insider_simple --top 20
+    python -m bot.backtest.sweep --bars data/bars --journal bt_features --strategy momentum --rank hit
+"""
+import argparse, os, time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from bot.backtest.store import AVAILABLE_AFTER, BarStore
+from bot.risk.exit import STOP_PCT, PROFIT_PCT, MAX_DAYS
+from bot.risk.size import TARGET_DOLLARS
+from bot.utils.journal import JOURNAL_ROOT, read
+
+MIN_TRADES = 10         # combinations with fewer labeled trades aren't ranked
+CHUNK_CELLS = 1 << 25   # combinations x rows evaluated per chunk (~32 MB of mask)
+
+INF = float("inf")
+GRIDS = {
+    "insider_simple": {
+        "MIN_AVG_DAILY_VOLUME": [0, 10_000, 25_000, 50_000, 100_000, 250_000, 500_000],
+        "MAX_SPREAD_DOLLARS": [0.01, 0.02, 0.03, 0.05, 0.10, 0.20, INF],
+        "MAX_RISE_SINCE_WEEK_LOW_PCT": [5.0, 10.0, 15.0, 20.0, 30.0, 50.0, INF],
+        "MAX_INTRADAY_VOLATILITY": [0.005, 0.01, 0.015, 0.02, 0.03, 0.05, INF],
+        "MAX_SLIPPAGE_PCT": [0.001, 0.0025, 0.005, 0.01, 0.02, INF],
+    },
+    "momentum": {
+        "MIN_AVG_DAILY_VOLUME": [0, 10_000, 25_000, 50_000, 100_000, 250_000, 500_000],
+        "MIN_RSI": [30, 35, 40, 45, 50, 55],
+        "MAX_RSI": [60, 65, 70, 75, 80, 85],
+        "MA_SHORT,MA_LONG": [(s, l) for s in (5, 10, 20, 30) for l in (50, 100, 200)],
+    },
+}
+
+
+# ---------------- labels -----------------------------------------------------
+
+def _qty(price: np.ndarray) -> np.ndarray:
+    """Vectorized bot.risk.size.dollar_position."""
+    ok = (price > 0) & (price <= TARGET_DOLLARS)
+    return np.where(ok, np.maximum(1, np.floor(TARGET_DOLLARS / np.where(ok, price, 1))), 0)
+
+
+def label(rows: np.ndarray, store: BarStore) -> np.ndarray:
+    """Exit price per snapshot under the should_exit rules on daily closes (NaN = not known yet)."""
+    exit_price = np.full(len(rows), np.nan)
+    ts = rows["utc_time"].astype("int64")
+    price = rows["price"]
+    symbols, inv = np.unique(rows["symbol"], return_inverse=True)
+    order = np.argsort(inv, kind="stable")
+    for symbol, idx in zip(symbols, np.split(order, np.cumsum(np.bincount(inv, minlength=len(symbols)))[:-1])):
+        bars = store.load("day", str(symbol))
+        if bars is None or not len(bars):
+            continue
+        known = bars["t"] + AVAILABLE_AFTER["day"]   # the engine's daily check time
+        closes = np.asarray(bars["c"])
+        for i in idx[price[idx] > 0]:
+            j = int(np.searchsorted(known, ts[i], side="right"))
+            c, age = closes[j:j + MAX_DAYS + 1], known[j:j + MAX_DAYS + 1] - ts[i]
+            hit = ((c <= price[i] * (1 - STOP_PCT)) | (c >= price[i] * (1 + PROFIT_PCT))
+                   | (age >= MAX_DAYS * 86400))
+            if hit.any():
+                exit_price[i] = c[int(np.argmax(hit))]
+    return exit_price
+
+
+# ---------------- gates ------------------------------------------------------
+
+def _at_most(x, v):
+    return np.isnan(x) | (x <= v)       # unavailable passes, like the live filters
+
+
+def gates(strategy: str, rows: np.ndarray, grid: dict) -> tuple[np.ndarray, list]:
+    """(base mask, [(gate name, values, (values x rows) masks), ...]) for one strategy."""
+    f = {name: np.asarray(rows[name], dtype=float) for name in rows.dtype.names[5:]}
+    base = _qty(f["price"]) > 0
+    out = []
+    for name, values in grid.items():
+        if name == "MIN_AVG_DAILY_VOLUME":
+            masks = [np.isnan(f["adv"]) | (f["adv"] >= v) for v in values]
+        elif name == "MAX_SPREAD_DOLLARS":
+            masks = [_at_most(f["spread"], v) for v in values]
+        elif name == "MAX_RISE_SINCE_WEEK_LOW_PCT":
+            masks = [_at_most(f["week_low_rise"], v) for v in values]
+        elif name == "MAX_INTRADAY_VOLATILITY":
+            masks = [_at_most(f["intraday_vol"], v) for v in values]
+        elif name == "MAX_SLIPPAGE_PCT":
+            with np.errstate(invalid="ignore", divide="ignore"):
+                est = np.fmax(np.fmax(f["intraday_vol"] * 1.5, f["spread"] / f["price"]), 0.0)
+            masks = [est <= v for v in values]
+        elif name == "MIN_RSI":
+            masks = [f["rsi"] >= v for v in values]
+        elif name == "MAX_RSI":
+            masks = [f["rsi"] <= v for v in values]
+        elif name == "MA_SHORT,MA_LONG":
+            # score_watchlist's uptrend / multi-timeframe checks and _above_ma, per window pair
+            from bot.strategies.momentum import MULTI_TF_REQUIRED
+            masks = []
+            for short, long_ in values:
+                ma = f[f"sma_{long_}"]
+                tf_up = 1 + (f["sma_5"] > ma) + (f["sma_21"] > ma)
+                masks.append((f["n_bars"] >= long_) & (f[f"sma_{short}"] > ma)
+                             & (tf_up >= MULTI_TF_REQUIRED) & (f["price"] >= ma))
+        else:
+            raise ValueError(f"unknown gate {name}")
+        out.append((name, list(values), np.array(masks, dtype=bool)))
+    if strategy == "momentum":
+        base &= f["macd_hist"] > 0       # the one fixed indicator gate
+    return base, out
+
+
+def current(strategy: str, grid: dict) -> dict:
+    """The live value of every gate in `grid`, read from the strategy module."""
+    import importlib
+    mod = importlib.import_module(f"bot.strategies.{strategy}")
+    return {name: tuple(getattr(mod, n) for n in name.split(",")) if "," in name else getattr(mod, name)
+            for name in grid}
+
+
+# ---------------- scoring ----------------------------------------------------
+_w = {}   # per-worker: masks, base, win, pnl, ret, shape
+
+
+def _init(masks, base, win, pnl, ret):
+    _w.update(masks=masks, base=base, win=win, pnl=pnl, ret=ret,
+              shape=tuple(len(m) for m in masks))
+
+
+def _score(span: tuple[int, int]) -> np.ndarray:
+    """trades, wins, pnl, return sum for combinations [start, stop) (flat index into the grid)."""
+    idx = np.unravel_index(np.arange(*span), _w["shape"])
+    m = np.broadcast_to(_w["base"], (span[1] - span[0], len(_w["base"]))).copy()
+    for g, masks in enumerate(_w["masks"]):
+        m &= masks[idx[g]]
+    mf = m.astype(np.float32)
+    return np.column_stack([m.sum(1), mf @ _w["win"], mf @ _w["pnl"], mf @ _w["ret"]])
+
+
+def sweep(rows: np.ndarray, exit_price: np.ndarray, strategy: str, grid: dict | None = None,
+          workers: int | None = None) -> dict:
+    """Score every combination of `grid` over labeled rows; returns the grid and per-combination stats."""
+    grid = grid or GRIDS[strategy]
+    labeled = ~np.isnan(exit_price)
+    rows, exit_price = rows[labeled], exit_price[labeled]
+    base, gs = gates(strategy, rows, grid)
+    price = np.asarray(rows["price"], dtype=float)
+    pnl = ((exit_price - price) * _qty(price)).astype(np.float32)
+    ret = (exit_price / np.where(price > 0, price, 1) - 1).astype(np.float32)
+    win = (pnl > 0).astype(np.float32)
+    masks = [m for _, _, m in gs]
+    total = int(np.prod([len(m) for m in masks]))
+    step = max(64, CHUNK_CELLS // max(1, len(rows)))
+    spans = [(a, min(a + step, total)) for a in range(0, total, step)]
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(spans) == 1:
+        _init(masks, base, win, pnl, ret)
+        parts = [_score(s) for s in spans]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init,
+                                 initargs=(masks, base, win, pnl, ret)) as pool:
+            parts = list(pool.map(_score, spans))
+    stats = np.concatenate(parts) if parts else np.empty((0, 4))
+    return {"gates": [(name, values) for name, values, _ in gs], "rows": len(rows),
+            "trades": stats[:, 0].astype(int), "wins": stats[:, 1], "pnl": stats[:, 2], "ret": stats[:, 3]}
+
+
+def ranked(res: dict, rank: str = "pnl", min_trades: int = MIN_TRADES) -> list[dict]:
+    """Combinations with at least `min_trades` trades, best first by total PnL or hit rate."""
+    n = res["trades"]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        hit = res["wins"] / n
+    keys = (res["pnl"], hit) if rank == "pnl" else (hit, res["pnl"])
+    ok = np.flatnonzero(n >= min_trades)
+    order = ok[np.lexsort((-keys[1][ok], -keys[0][ok]))]
+    return [_combo(res, int(i), hit) for i in order]
+
+
+def _combo(res: dict, i: int, hit) -> dict:
+    shape = tuple(len(v) for _, v in res["gates"])
+    idx = np.unravel_index(i, shape)
+    params = {name: values[int(j)] for (name, values), j in zip(res["gates"], idx)}
+    n = int(res["trades"][i])
+    return {"params": params, "trades": n, "hit_rate": float(hit[i]) if n else None,
+            "pnl": float(res["pnl"][i]), "avg_ret": float(res["ret"][i]) / n if n else None}
+
+
+def find(res: dict, params: dict) -> dict | None:
+    """Stats of one exact combination (e.g. the live thresholds), None if it's not on the grid."""
+    try:
+        idx = tuple(values.index(params[name]) for name, values in res["gates"])
+    except ValueError:
+        return None
+    i = int(np.ravel_multi_index(idx, tuple(len(v) for _, v in res["gates"])))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return _combo(res, i, res["wins"] / res["trades"])
+
+
+def _fmt(c: dict) -> str:
+    params = " ".join(f"{k}={v}" for k, v in c["params"].items())
+    hit = f"{c['hit_rate']:.1%}" if c["hit_rate"] is not None else "-"
+    ret = f"{c['avg_ret']:+.2%}" if c["avg_ret"] is not None else "-"
+    return f"{c['trades']:5d} trades  hit {hit:>6}  PnL ${c['pnl']:9.2f}  avg {ret:>7}  {params}"
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Rank strategy thresholds over recorded feature snapshots.")
+    ap.add_argument("--bars", required=True, help="BarStore root used to label outcomes")
+    ap.add_argument("--journal", default=str(JOURNAL_ROOT), help="journal root holding features/")
+    ap.add_argument("--strategy", choices=sorted(GRIDS), default="insider_simple")
+    ap.add_argument("--start"); ap.add_argument("--end")
+    ap.add_argument("--rank", choices=("pnl", "hit"), default="pnl")
+    ap.add_argument("--min-trades", type=int, default=MIN_TRADES)
+    ap.add_argument("--top", type=int, default=20)
+    ap.add_argument("--workers", type=int, default=None)
+    args = ap.parse_args(argv)
+
+    t0 = time.perf_counter()
+    rows = read("features", args.start, args.end, root=args.journal)
+    rows = rows[rows["strategy"] == args.strategy]
+    exit_price = label(rows, BarStore(args.bars))
+    t1 = time.perf_counter()
+    grid = {name: list(values) for name, values in GRIDS[args.strategy].items()}
+    live = current(args.strategy, grid)
+    for name, v in live.items():   # make sure the live thresholds are on the grid
+        if v not in grid[name]:
+            grid[name].append(v)
+    res = sweep(rows, exit_price, args.strategy, grid, args.workers)
+    res["snapshots"] = len(rows)
+    t2 = time.perf_counter()
+    combos = len(res["trades"])
+    print(f"{len(rows)} {args.strategy} snapshots, {res['rows']} labeled ({t1 - t0:.2f}s); "
+          f"{combos} combinations scored in {t2 - t1:.2f}s")
+    base = find(res, live)
+    if base:
+        print("live    " + _fmt(base))
+    for i, c in enumerate(ranked(res, args.rank, args.min_trades)[:args.top], 1):
+        print(f"{i:<7} " + _fmt(c))
+    return res
+
+
+if __name__ == "__main__":
+    main()
@@ -1,49 +1,241 @@
 # bot/brokers/alpaca.py
-from dataclasses import dataclass
-import os
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+import heapq, itertools, os, threading, time
 from dotenv import load_dotenv
-import alpaca_trade_api as tradeapi
+from bot.data.intraday import BARS_WINDOW
+from bot.utils import metrics
+from bot.utils.metrics import timed
+from bot.utils.ratelimit import TokenBucket
 
 load_dotenv()  # read .env
 
-@dataclass
-class AlpacaBroker:
-    paper: bool = True
+# market-data cache (tunable)
+DAILY_LOOKBACK = 252     # one daily fetch serves ADV, week-low and momentum
+DAILY_BARS_TTL = 300     # seconds; daily bars barely move inside a poll cycle
+MINUTE_BARS_TTL = 30
+QUOTE_TTL = 5            # collapses repeated price/quote lookups per filing
+LATEST_TRADES_CHUNK = 200  # symbols per multi-symbol latest-trades request
+CACHE_MAX_ENTRIES = 2048
 
-    def __post_init__(self):
-        key = os.getenv("ALPACA_KEY_ID")
-        secret = os.getenv("ALPACA_SECRET_KEY")
-        base_url = os.getenv("ALPACA_BASE_URL", "https://paper-api.alpaca.markets")
-        self.api = tradeapi.REST(key, secret, base_url, api_version="v2")
+# request scheduling (tunable)
+RATE_LIMIT_PER_MIN = int(os.getenv("ALPACA_RATE_LIMIT_PER_MIN", "200"))  # account REST quota; 0 = off
+RATE_BURST = 20          # bucket size; refill is (limit - burst)/min so no 60 s window exceeds the quota
+HTTP_POOL_SIZE = 16      # keep-alive connections kept to the REST endpoint
 
-    # --- public interface ---
-    def account_info(self):
-        return self.api.get_account()
+# priority classes, most urgent first
+PRIORITY_EXIT, PRIORITY_ORDER, PRIORITY_ENTRY, PRIORITY_ANALYTICS = range(4)
+PRIORITY_NAMES = ("exit", "order", "entry", "analytics")
+METHOD_PRIORITY = {
+    "submit_order_sell": PRIORITY_EXIT,
+    "submit_order_exit": PRIORITY_EXIT,    # OCO / trailing-stop protection
+    "cancel_order": PRIORITY_EXIT,
+    "list_orders": PRIORITY_EXIT,          # exit-leg reconciliation
+    "get_order": PRIORITY_EXIT,
+    "list_positions": PRIORITY_EXIT,       # filled shares before arming exits
+    "get_latest_trades": PRIORITY_EXIT,    # bulk prices for the exit pass
+    "submit_order_buy": PRIORITY_ORDER,
+    "submit_order_bracket": PRIORITY_ORDER,
+    "get_latest_trade": PRIORITY_ENTRY,
+    "get_latest_quote": PRIORITY_ENTRY,
+    "get_bars": PRIORITY_ENTRY,
+    "get_account": PRIORITY_ANALYTICS,
+}
 
-    def submit_buy_market(self, symbol: str, qty: int):
-        return self.api.submit_order(symbol=symbol,
-                                     qty=qty,
-                                     side="buy",
-                                     type="market",
-                                     time_in_force="day")
 
-    def submit_sell_market(self, symbol: str, qty: int):
-        return self.api.submit_order(symbol=symbol,
-                                     qty=qty,
-                                     side="sell",
-                                     type="market",
-                                     time_in_force="day")
+def order_price(price: float) -> float:
+    """Round to a price Alpaca accepts: cents from $1 up, 4 decimals below."""
+    return round(price, 2 if price >= 1 else 4)
 
 
-    def current_price(self, symbol: str):
-        bar = self.api.get_latest_trade(symbol)
-        return bar.price
+class _Call:
+    """One in-flight fetch that concurrent callers for the same key wait on."""
+    __slots__ = ("done", "value", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class MarketDataCache:
+    """LRU-evicted, TTL-bounded cache that coalesces concurrent misses per key."""
+
+    def __init__(self, maxsize: int = CACHE_MAX_ENTRIES, clock=time.monotonic):
+        self.maxsize = maxsize
+        self._clock = clock          # TTLs are in this clock's seconds (SimBroker passes its own)
+        self._data = OrderedDict()   # key -> (expires_at, value)
+        self._inflight = {}          # key -> _Call
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def get(self, key, ttl: float, loader):
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and item[0] > self._clock():
+                self._data.move_to_end(key)
+                self.hits += 1
+                return item[1]
+            call = self._inflight.get(key)
+            owner = call is None
+            if owner:
+                call = self._inflight[key] = _Call()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+
+        if not owner:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value
+
+        try:
+            call.value = loader()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+                if call.error is None:
+                    self._data[key] = (self._clock() + ttl, call.value)
+                    self._data.move_to_end(key)
+                    while len(self._data) > self.maxsize:
+                        self._data.popitem(last=False)
+            call.done.set()
+        return call.value
+
+    def put(self, key, ttl: float, value):
+        with self._lock:
+            self._data[key] = (self._clock() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def stats(self, reset: bool = False) -> dict:
+        with self._lock:
+            out = {"hits": self.hits, "misses": self.misses,
+                   "coalesced": self.coalesced, "size": len(self._data)}
+            if reset:
+                self.hits = self.misses = self.coalesced = 0
+        return out
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class RequestScheduler:
+    """Hands out REST tokens from one bucket in priority order, FIFO within a class.
+
+    A call's class comes from METHOD_PRIORITY; inside `with scheduler.priority(level):`
+    every call on that thread is raised to at least `level`, so the exit pass
+    outranks entry lookups of the same method.
+    """
+
+    def __init__(self, per_minute: int = RATE_LIMIT_PER_MIN, burst: int = RATE_BURST):
+        burst = max(1, min(burst, per_minute // 2)) if per_minute else 0
+        self.bucket = TokenBucket((per_minute - burst) / 60, burst) if per_minute else None
+        self._cond = threading.Condition()
+        self._waiting = []                  # heap of (priority, seq) tickets
+        self._seq = itertools.count()
+        self._local = threading.local()
+        self.depth = [0] * len(PRIORITY_NAMES)
+        self.calls = [0] * len(PRIORITY_NAMES)
+        self.delayed = [0] * len(PRIORITY_NAMES)
+        self.wait_max = [0.0] * len(PRIORITY_NAMES)
+        for i, name in enumerate(PRIORITY_NAMES):
+            metrics.set_gauge("bot_broker_queue_depth", lambda i=i: self.depth[i], priority=name)
+
+    @contextmanager
+    def priority(self, level: int):
+        prev = getattr(self._local, "level", None)
+        self._local.level = level if prev is None else min(prev, level)
+        try:
+            yield
+        finally:
+            self._local.level = prev
+
+    def acquire(self, method: str) -> float:
+        """Block until this call may go out; returns the seconds waited."""
+        level = METHOD_PRIORITY.get(method, PRIORITY_ANALYTICS)
+        override = getattr(self._local, "level", None)
+        if override is not None:
+            level = min(level, override)
+        waited = 0.0
+        if self.bucket is not None:
+            t0 = time.monotonic()
+            with self._cond:
+                ticket = (level, next(self._seq))
+                heapq.heappush(self._waiting, ticket)
+                self.depth[level] += 1
+                try:
+                    while True:
+                        if self._waiting[0] == ticket:
+                            delay = self.bucket.take()
+                            if not delay:
+                                break
+                            self._cond.wait(delay)
+                        else:
+                            self._cond.wait()
+                finally:
+                    self._waiting.remove(ticket)
+                    heapq.heapify(self._waiting)
+                    self.depth[level] -= 1
+                    self._cond.notify_all()
+            waited = time.monotonic() - t0
+        with self._cond:
+            self.calls[level] += 1
+            if waited > 0.001:
+                self.delayed[level] += 1
+            self.wait_max[level] = max(self.wait_max[level], waited)
+        metrics.observe("bot_broker_wait_seconds", waited, priority=PRIORITY_NAMES[level])
+        return waited
+
+    def call(self, method: str, fn, *args, **kwargs):
+        """acquire(method), then fn(*args, **kwargs); a 429 empties the bucket."""
+        self.acquire(method)
+        try:
+            return fn(*args, **kwargs)
+        except Exception as e:
+            if getattr(e, "status_code", None) == 429 and self.bucket is not None:
+                self.bucket.drain()
+            raise
+
+    def stats(self, reset: bool = False) -> dict:
+        """Per-class calls, calls that had to wait, max wait (s) and current queue depth."""
+        with self._cond:
+            out = {name: {"calls": self.calls[i], "delayed": self.delayed[i],
+                          "wait_max": self.wait_max[i], "queued": self.depth[i]}
+                   for i, name in enumerate(PRIORITY_NAMES)}
+            if reset:
+                n = len(PRIORITY_NAMES)
+                self.calls, self.delayed, self.wait_max = [0] * n, [0] * n, [0.0] * n
+        return out
+
+
+class MarketDataHelpers:
+    """Derived market-data lookups shared by every broker implementation.
+
+    Subclasses provide daily_bars(symbol, limit), minute_bars(symbol, limit)
+    and latest_quote(symbol); bars expose .o/.h/.l/.c/.v like Alpaca's.
+
+    When `intraday` holds an IntradayBook fed by the tick stream, spread and
+    60-minute volatility for its symbols are answered from its ring buffers
+    without a network call; a REST fallback seeds the buffers for next time.
+    """
+    intraday = None   # bot.data.intraday.IntradayBook, set by the stream run mode
 
     # --- market-data helpers (best-effort, defensive) ---
     def avg_daily_volume(self, symbol: str, days: int = 20):
         """Return average daily volume over `days`. Returns None on failure."""
         try:
-            bars = self.api.get_barset(symbol, 'day', limit=days)[symbol]
+            bars = self.daily_bars(symbol, days)
             if not bars:
                 return None
             vols = [b.v for b in bars if getattr(b, 'v', None) is not None]
@@ -54,7 +246,7 @@ class AlpacaBroker:
     def percent_since_week_low(self, symbol: str, days: int = 7):
         """Percent distance from the lowest close over the last `days` days. None on failure."""
         try:
-            bars = self.api.get_barset(symbol, 'day', limit=days)[symbol]
+            bars = self.daily_bars(symbol, days)
             if not bars:
                 return None
             lows = [b.l for b in bars if getattr(b, 'l', None) is not None]
@@ -71,16 +263,27 @@ class AlpacaBroker:
 
     def bid_ask_spread(self, symbol: str):
         """Return current bid-ask spread (ask - bid) or None on failure."""
+        if self.intraday is not None:
+            spread = self.intraday.spread(symbol)
+            if spread is not None:
+                return spread
         try:
-            q = self.api.get_latest_quote(symbol)
+            q = self.latest_quote(symbol)
             return None if (q is None or q.bidprice is None or q.askprice is None) else (q.askprice - q.bidprice)
         except Exception:
             return None
 
     def intraday_volatility(self, symbol: str, minutes: int = 60):
         """Return a simple intraday volatility estimate (stddev of minute returns); None on failure."""
+        watched = self.intraday is not None and minutes == BARS_WINDOW and symbol in self.intraday
+        if watched:
+            vol = self.intraday.volatility(symbol)
+            if vol is not None:
+                return vol
         try:
-            bars = self.api.get_barset(symbol, '1Min', limit=minutes)[symbol]
+            bars = self.minute_bars(symbol, minutes)
+            if watched and bars:
+                self.intraday.seed(symbol, bars)
             if not bars or len(bars) < 2:
                 return None
             closes = [b.c for b in bars]
@@ -98,3 +301,178 @@ class AlpacaBroker:
             return math.sqrt(var)
         except Exception:
             return None
+
+
+@dataclass
+class AlpacaBroker(MarketDataHelpers):
+    paper: bool = True
+    cache: MarketDataCache = field(default_factory=MarketDataCache, repr=False)
+    scheduler: RequestScheduler = field(default_factory=RequestScheduler, repr=False)
+
+    def __post_init__(self):
+        # imported here: alpaca_trade_api pulls in pandas, ~1 s that tools and the sim never need
+        import alpaca_trade_api as tradeapi
+        from requests.adapters import HTTPAdapter
+        key = os.getenv("ALPACA_KEY_ID")
+        secret = os.getenv("ALPACA_SECRET_KEY")
+        base_url = os.getenv("ALPACA_BASE_URL", "https://paper-api.alpaca.markets")
+        self.api = tradeapi.REST(key, secret, base_url, api_version="v2")
+        # keep-alive pool sized for the evaluation workers (requests defaults to 10)
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=HTTP_POOL_SIZE)
+        self.api._session.mount("https://", adapter)
+        self.api._session.mount("http://", adapter)
+
+    def _rest(self, method: str, *args, **kwargs):
+        """One REST call through the scheduler; `method` is a METHOD_PRIORITY key."""
+        fn = getattr(self.api, "submit_order" if method.startswith("submit_order") else method)
+        return self.scheduler.call(method, fn, *args, **kwargs)
+
+    def priority(self, level: int):
+        """Context manager raising every call on this thread to at least `level`."""
+        return self.scheduler.priority(level)
+
+    def _bars(self, symbol: str, unit: str, limit: int) -> list:
+        """The last `limit` "day" or "1Min" bars, oldest first.
+
+        get_bars pages forward from `start` (default: today's open), so ask
+        newest-first from a window wide enough to span weekends and holidays.
+        """
+        from alpaca_trade_api.rest import Sort, TimeFrame
+        day = unit == "day"
+        days = limit * 365 // 252 + 10 if day else limit // 390 + 5
+        start = (datetime.now(timezone.utc) - timedelta(days=days)).strftime("%Y-%m-%dT%H:%M:%SZ")
+        bars = self._rest("get_bars", symbol, TimeFrame.Day if day else TimeFrame.Minute,
+                          start=start, limit=limit, sort=Sort.Desc)
+        return list(reversed(bars))
+
+    def cache_stats(self, reset: bool = False) -> dict:
+        """Hit/miss/coalesced counters; hits + coalesced = REST calls saved."""
+        return self.cache.stats(reset)
+
+    def scheduler_stats(self, reset: bool = False) -> dict:
+        return self.scheduler.stats(reset)
+
+    # --- public interface ---
+    @timed("broker.account_info")
+    def account_info(self):
+        return self._rest("get_account")
+
+    @timed("broker.submit_buy_market")
+    def submit_buy_market(self, symbol: str, qty: int):
+        return self._rest("submit_order_buy",
+                          symbol=symbol,
+                          qty=qty,
+                          side="buy",
+                          type="market",
+                          time_in_force="day")
+
+    @timed("broker.submit_sell_market")
+    def submit_sell_market(self, symbol: str, qty: int):
+        return self._rest("submit_order_sell",
+                          symbol=symbol,
+                          qty=qty,
+                          side="sell",
+                          type="market",
+                          time_in_force="day")
+
+    # --- server-side exits (see bot.risk.protect) ---
+    @timed("broker.submit_buy_bracket")
+    def submit_buy_bracket(self, symbol: str, qty: int, take_profit: float, stop_loss: float):
+        """Market buy whose take-profit limit and stop legs live on the server (GTC)."""
+        return self._rest("submit_order_bracket",
+                          symbol=symbol,
+                          qty=qty,
+                          side="buy",
+                          type="market",
+                          time_in_force="gtc",
+                          order_class="bracket",
+                          take_profit={"limit_price": order_price(take_profit)},
+                          stop_loss={"stop_price": order_price(stop_loss)})
+
+    @timed("broker.submit_exit_oco")
+    def submit_exit_oco(self, symbol: str, qty: int, take_profit: float, stop_loss: float):
+        """One-cancels-other sell (take-profit limit + stop) for shares already held."""
+        return self._rest("submit_order_exit",
+                          symbol=symbol,
+                          qty=qty,
+                          side="sell",
+                          type="limit",
+                          time_in_force="gtc",
+                          order_class="oco",
+                          take_profit={"limit_price": order_price(take_profit)},
+                          stop_loss={"stop_price": order_price(stop_loss)})
+
+    @timed("broker.submit_trailing_stop")
+    def submit_trailing_stop(self, symbol: str, qty: int, trail_percent: float):
+        return self._rest("submit_order_exit",
+                          symbol=symbol,
+                          qty=qty,
+                          side="sell",
+                          type="trailing_stop",
+                          time_in_force="gtc",
+                          trail_percent=str(trail_percent))
+
+    @timed("broker.cancel_order")
+    def cancel_order(self, order_id: str):
+        return self._rest("cancel_order", order_id)
+
+    @timed("broker.open_order_ids")
+    def open_order_ids(self) -> set:
+        """Ids of every open order; bracket / OCO legs are listed individually."""
+        return {o.id for o in self._rest("list_orders", status="open", limit=500, nested=False)}
+
+    @timed("broker.get_order")
+    def get_order(self, order_id: str):
+        return self._rest("get_order", order_id)
+
+    @timed("broker.position_qtys")
+    def position_qtys(self) -> dict:
+        """Shares held per symbol as the broker has them (filled buys only)."""
+        return {p.symbol: int(float(p.qty)) for p in self._rest("list_positions")}
+
+    @timed("broker.current_price")
+    def current_price(self, symbol: str):
+        bar = self.cache.get(("trade", symbol), QUOTE_TTL,
+                             lambda: self._rest("get_latest_trade", symbol))
+        return bar.price
+
+    @timed("broker.latest_prices")
+    def latest_prices(self, symbols) -> dict:
+        """Latest trade price per symbol via bulk requests of LATEST_TRADES_CHUNK.
+
+        Symbols whose chunk fails (or that have no trade) are absent from the result.
+        """
+        symbols = list(dict.fromkeys(symbols))
+        prices = {}
+        for i in range(0, len(symbols), LATEST_TRADES_CHUNK):
+            chunk = symbols[i:i + LATEST_TRADES_CHUNK]
+            try:
+                trades = self._rest("get_latest_trades", chunk)
+            except Exception as e:
+                print(f"latest_trades failed for {len(chunk)} symbols:", e)
+                continue
+            for sym, trade in trades.items():
+                prices[sym] = trade.price
+                self.cache.put(("trade", sym), QUOTE_TTL, trade)
+        return prices
+
+    # --- raw market data (cached) ---
+    @timed("broker.daily_bars")
+    def daily_bars(self, symbol: str, limit: int = DAILY_LOOKBACK):
+        """Last `limit` daily bars, served from one shared DAILY_LOOKBACK fetch."""
+        if limit > DAILY_LOOKBACK:
+            return self._bars(symbol, "day", limit)
+        bars = self.cache.get(("day", symbol), DAILY_BARS_TTL,
+                              lambda: self._bars(symbol, "day", DAILY_LOOKBACK))
+        return bars[-limit:] if limit > 0 else []
+
+    @timed("broker.minute_bars")
+    def minute_bars(self, symbol: str, limit: int = 60):
+        """Last `limit` one-minute bars (cached briefly)."""
+        return self.cache.get(("1Min", symbol, limit), MINUTE_BARS_TTL,
+                              lambda: self._bars(symbol, "1Min", limit))
+
+    @timed("broker.latest_quote")
+    def latest_quote(self, symbol: str):
+        return self.cache.get(("quote", symbol), QUOTE_TTL,
+                              lambda: self._rest("get_latest_quote", symbol))
@@ -0,0 +1,504 @@
+# bot/brokers/sim.py
+"""
+Deterministic simulated broker for load testing.
+
+SimBroker exposes the AlpacaBroker interface (orders, current_price, the
+market-data helpers, account_info, api.get_bars) over synthetic seeded
+price paths or a recorded BarStore, and injects per-call latency, random
+errors, a per-minute request quota and partial fills. Simulated time runs
+`speed` market minutes per clock second from construction. The clock is the
+wall clock by default (latency is slept); with SIM_CLOCK=replay it is a
+SimClock that only the injected latencies advance, so fills, prices and
+order timestamps of a seeded, single-threaded replay repeat exactly.
+
+Select it with BROKER=sim; SIM_* variables (see SimConfig.from_env) tune it.
+"""
+import itertools, math, os, random, threading, time, zlib
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+import numpy as np
+from bot.brokers.alpaca import (MarketDataHelpers, MarketDataCache, RequestScheduler, DAILY_LOOKBACK,
+                                DAILY_BARS_TTL, MINUTE_BARS_TTL, QUOTE_TTL)
+from bot.backtest.store import Bar
+from bot.utils.ratelimit import TokenBucket
+from bot.utils.metrics import timed
+
+
+SIM_EPOCH = datetime(2024, 1, 2, 14, 30)   # simulated minute 0 unless SimConfig.start says otherwise
+
+
+class SimClock:
+    """Seconds that only move when advanced: replays don't depend on wall time."""
+
+    def __init__(self, t: float = 0.0):
+        self.t = t
+        self._lock = threading.Lock()
+
+    def __call__(self) -> float:
+        return self.t
+
+    def advance(self, seconds: float):
+        with self._lock:
+            self.t += seconds
+
+
+class SimBrokerError(Exception):
+    """Injected API failure."""
+
+
+class SimRateLimited(SimBrokerError):
+    """Injected 429: the per-minute request quota is exhausted."""
+    status_code = 429
+
+
+@dataclass
+class SimConfig:
+    seed: int = 7
+    latency_ms: float = 40.0        # median per-call latency
+    latency_sigma: float = 0.6      # lognormal shape; 0 = fixed latency
+    method_latency_ms: dict = field(default_factory=dict)  # per-method median overrides
+    error_rate: float = 0.0         # probability any call raises SimBrokerError
+    rate_limit_per_min: int = 200   # Alpaca's default quota; 0 = unlimited
+    partial_fill_rate: float = 0.0  # probability a market order fills only partly
+    speed: float = 1.0              # simulated market minutes per wall-clock second
+    bars_root: str | None = None    # replay a recorded BarStore instead of synthetic paths
+    start: datetime | None = None   # simulated start time (minute 0); SIM_EPOCH if unset
+    clock: str = "wall"             # "wall", or "replay": a SimClock advanced by injected latency
+    cash: float = 100_000.0
+
+    @classmethod
+    def from_env(cls) -> "SimConfig":
+        env = os.getenv
+        return cls(
+            seed=int(env("SIM_SEED", cls.seed)),
+            latency_ms=float(env("SIM_LATENCY_MS", cls.latency_ms)),
+            latency_sigma=float(env("SIM_LATENCY_SIGMA", cls.latency_sigma)),
+            error_rate=float(env("SIM_ERROR_RATE", cls.error_rate)),
+            rate_limit_per_min=int(env("SIM_RATE_LIMIT_PER_MIN", cls.rate_limit_per_min)),
+            partial_fill_rate=float(env("SIM_PARTIAL_FILL_RATE", cls.partial_fill_rate)),
+            speed=float(env("SIM_SPEED", cls.speed)),
+            bars_root=env("SIM_BARS_ROOT") or None,
+            start=datetime.fromisoformat(env("SIM_START")) if env("SIM_START") else None,
+            clock=env("SIM_CLOCK", cls.clock),
+        )
+
+
+class SimOrder:
+    __slots__ = ("id", "symbol", "qty", "side", "status", "filled_qty", "filled_avg_price", "submitted_at",
+                 "type", "legs", "limit_price", "stop_price", "trail_percent", "hwm", "checked", "group")
+
+    def __init__(self, id, symbol, qty, side, status, filled_qty, filled_avg_price, submitted_at,
+                 type="market", limit_price=None, stop_price=None, trail_percent=None):
+        self.id, self.symbol, self.qty, self.side = id, symbol, qty, side
+        self.status, self.filled_qty, self.filled_avg_price = status, filled_qty, filled_avg_price
+        self.submitted_at = submitted_at
+        self.type, self.legs = type, None
+        self.limit_price, self.stop_price, self.trail_percent = limit_price, stop_price, trail_percent
+        self.hwm = None          # trailing stop: highest price seen since placement
+        self.checked = None      # last simulated minute swept
+        self.group = ()          # OCO siblings, cancelled when this one fills
+
+    def triggered(self, price: float) -> bool:
+        if self.type == "limit":
+            return price >= self.limit_price
+        if self.type == "stop":
+            return price <= self.stop_price
+        self.hwm = price if self.hwm is None else max(self.hwm, price)
+        return price <= self.hwm * (1 - self.trail_percent / 100)
+
+
+class SimTrade:
+    __slots__ = ("price",)
+
+    def __init__(self, price):
+        self.price = price
+
+
+class SimQuote:
+    __slots__ = ("bidprice", "askprice")
+
+    def __init__(self, bidprice, askprice):
+        self.bidprice, self.askprice = bidprice, askprice
+
+
+class SimAccount:
+    __slots__ = ("cash", "equity")
+
+    def __init__(self, cash, equity):
+        self.cash, self.equity = cash, equity
+
+
+class SyntheticMarket:
+    """Seeded GBM paths: DAILY_LOOKBACK days of history, then minute bars from minute 0."""
+
+    def __init__(self, seed: int):
+        self.seed = seed
+        self._paths = {}
+        self._lock = threading.Lock()
+
+    def _path(self, symbol: str):
+        with self._lock:
+            p = self._paths.get(symbol)
+            if p is None:
+                rng = np.random.default_rng([self.seed, zlib.crc32(symbol.encode())])
+                start = float(rng.uniform(5, 200))
+                daily = start * np.exp(np.cumsum(rng.normal(0.0003, 0.02, DAILY_LOOKBACK)))
+                vol = rng.uniform(2e4, 5e6)
+                p = self._paths[symbol] = {"rng": rng, "daily": daily, "vol": vol,
+                                           "minute": np.array([daily[-1]]), "spread": rng.uniform(0.005, 0.08)}
+            return p
+
+    def _minutes(self, symbol: str, upto: int) -> np.ndarray:
+        p = self._path(symbol)
+        with self._lock:
+            m = p["minute"]
+            if len(m) <= upto:
+                steps = p["rng"].normal(0, 0.0008, upto + 390 - len(m) + 1)
+                p["minute"] = m = np.concatenate([m, m[-1] * np.exp(np.cumsum(steps))])
+            return m
+
+    def daily_bars(self, symbol: str, limit: int, minute: int):
+        p = self._path(symbol)
+        closes = p["daily"][-limit:]
+        t0 = -len(closes)
+        return [Bar(t0 + i, c, c * 1.01, c * 0.99, c, p["vol"]) for i, c in enumerate(closes)]
+
+    def minute_bars(self, symbol: str, limit: int, minute: int):
+        m = self._minutes(symbol, minute)[max(0, minute - limit + 1):minute + 1]
+        vol = self._path(symbol)["vol"] / 390
+        return [Bar(minute - len(m) + 1 + i, c, c, c, c, vol) for i, c in enumerate(m)]
+
+    def price(self, symbol: str, minute: int) -> float:
+        return float(self._minutes(symbol, minute)[minute])
+
+    def spread(self, symbol: str) -> float:
+        return float(self._path(symbol)["spread"])
+
+
+class RecordedMarket:
+    """Recorded bars from a BarStore, replayed through the point-in-time broker."""
+
+    def __init__(self, root: str, start: datetime | None):
+        from bot.backtest.broker import PointInTimeBroker
+        from bot.backtest.store import BarStore
+        self._pit = PointInTimeBroker(BarStore(root))
+        self._start = start or SIM_EPOCH
+        self._lock = threading.Lock()
+
+    def _at(self, minute: int):
+        self._pit.set_time(self._start + timedelta(minutes=minute))
+        return self._pit
+
+    def daily_bars(self, symbol, limit, minute):
+        with self._lock:
+            return self._at(minute).daily_bars(symbol, limit)
+
+    def minute_bars(self, symbol, limit, minute):
+        with self._lock:
+            return self._at(minute).minute_bars(symbol, limit)
+
+    def price(self, symbol, minute):
+        with self._lock:
+            return self._at(minute).current_price(symbol)
+
+    def spread(self, symbol):
+        return None
+
+
+class _SimAPI:
+    """The slice of tradeapi.REST that callers reach through broker.api."""
+
+    def __init__(self, broker):
+        self._b = broker
+
+    def get_bars(self, symbol, timeframe, start=None, limit=DAILY_LOOKBACK, sort=None):
+        """Last `limit` bars up to now; `timeframe` is TimeFrame.Day/Minute or "1Day"/"1Min"."""
+        self._b._call("get_bars")
+        if str(timeframe) == "1Day":
+            bars = self._b.market.daily_bars(symbol, limit, self._b.minute())
+        else:
+            bars = self._b.market.minute_bars(symbol, limit, self._b.minute())
+        return bars[::-1] if getattr(sort, "value", sort) == "desc" else bars
+
+    def get_latest_trade(self, symbol):
+        self._b._call("get_latest_trade")
+        price = self._b.market.price(symbol, self._b.minute())
+        if price is None:
+            raise SimBrokerError(f"no trades for {symbol}")
+        return SimTrade(price)
+
+    def get_latest_trades(self, symbols):
+        self._b._call("get_latest_trades")
+        m = self._b.minute()
+        prices = {s: self._b.market.price(s, m) for s in symbols}
+        return {s: SimTrade(p) for s, p in prices.items() if p is not None}
+
+    def get_latest_quote(self, symbol):
+        self._b._call("get_latest_quote")
+        price, spread = self._b.market.price(symbol, self._b.minute()), self._b.market.spread(symbol)
+        if price is None or spread is None:
+            return None
+        return SimQuote(price - spread / 2, price + spread / 2)
+
+    def get_account(self):
+        self._b._call("get_account")
+        return self._b._account()
+
+
+class SimBroker(MarketDataHelpers):
+    """Drop-in AlpacaBroker replacement driven by SimConfig."""
+
+    def __init__(self, config: SimConfig | None = None, clock=None):
+        self.config = config or SimConfig()
+        self.paper = True
+        self.market = (RecordedMarket(self.config.bars_root, self.config.start)
+                       if self.config.bars_root else SyntheticMarket(self.config.seed))
+        if clock is None:
+            clock = SimClock() if self.config.clock == "replay" else time.monotonic
+        self._clock = clock
+        self._t0 = clock()
+        self.cache = MarketDataCache(clock=clock)
+        self.api = _SimAPI(self)
+        self._rng = random.Random(self.config.seed)
+        self._rng_lock = threading.Lock()
+        rpm = self.config.rate_limit_per_min
+        self._quota = TokenBucket(rpm / 60, rpm, clock) if rpm else None   # the "server" side
+        # the client side, as live; its pacing sleeps in wall time, so a replay leaves
+        # the quota to the server side (deterministic 429s in simulated time)
+        self.scheduler = RequestScheduler(0 if isinstance(clock, SimClock) else rpm)
+        self._ids = itertools.count(1)
+        self._state_lock = threading.Lock()
+        self.cash = self.config.cash
+        self.holdings: dict[str, float] = {}
+        self.orders: list[SimOrder] = []
+        self.exit_orders: dict[str, SimOrder] = {}   # resting sell orders by id
+        self.calls: dict[str, int] = {}
+        self.errors = 0
+        self.throttled = 0
+
+    @classmethod
+    def from_env(cls) -> "SimBroker":
+        return cls(SimConfig.from_env())
+
+    # --- simulation plumbing ---
+    def minute(self) -> int:
+        return int((self._clock() - self._t0) * self.config.speed)
+
+    def now(self) -> datetime:
+        """Simulated time: SimConfig.start (or SIM_EPOCH) plus the elapsed simulated minutes."""
+        elapsed = (self._clock() - self._t0) * self.config.speed
+        return (self.config.start or SIM_EPOCH) + timedelta(minutes=elapsed)
+
+    def _call(self, method: str):
+        """One REST call: client scheduler, then server quota, latency and maybe an injected error."""
+        return self.scheduler.call(method, self._serve, method)
+
+    def priority(self, level: int):
+        return self.scheduler.priority(level)
+
+    def scheduler_stats(self, reset: bool = False) -> dict:
+        return self.scheduler.stats(reset)
+
+    def _serve(self, method: str):
+        with self._state_lock:
+            self.calls[method] = self.calls.get(method, 0) + 1
+        if self._quota is not None and not self._quota.try_acquire():
+            with self._state_lock:
+                self.throttled += 1
+            raise SimRateLimited(f"429 rate limit exceeded ({method})")
+        cfg = self.config
+        median = cfg.method_latency_ms.get(method, cfg.latency_ms)
+        with self._rng_lock:
+            delay = median * (math.exp(self._rng.gauss(0, cfg.latency_sigma)) if cfg.latency_sigma else 1.0)
+            fail = self._rng.random() < cfg.error_rate
+            partial = self._rng.random()
+        if delay > 0:
+            if isinstance(self._clock, SimClock):
+                self._clock.advance(delay / 1000)
+            else:
+                time.sleep(delay / 1000)
+        if fail:
+            with self._state_lock:
+                self.errors += 1
+            raise SimBrokerError(f"injected failure in {method}")
+        return partial
+
+    def sim_stats(self) -> dict:
+        with self._state_lock:
+            return {"calls": dict(self.calls), "errors": self.errors, "throttled": self.throttled,
+                    "orders": len(self.orders), "minute": self.minute()}
+
+    def cache_stats(self, reset: bool = False) -> dict:
+        return self.cache.stats(reset)
+
+    # --- public interface ---
+    def _account(self):
+        m = self.minute()
+        with self._state_lock:
+            equity = self.cash + sum(q * (self.market.price(s, m) or 0.0) for s, q in self.holdings.items())
+            return SimAccount(self.cash, equity)
+
+    @timed("broker.account_info")
+    def account_info(self):
+        return self.api.get_account()
+
+    def _submit(self, symbol: str, qty: int, side: str, method: str | None = None) -> SimOrder:
+        roll = self._call(method or f"submit_order_{side}")
+        price = self.market.price(symbol, self.minute())
+        if price is None:
+            raise SimBrokerError(f"no market for {symbol}")
+        filled = qty
+        if roll < self.config.partial_fill_rate and qty > 1:
+            filled = max(1, int(qty * (0.2 + 0.8 * roll / self.config.partial_fill_rate)))
+        sign = 1 if side == "buy" else -1
+        with self._state_lock:
+            self.cash -= sign * filled * price
+            self.holdings[symbol] = self.holdings.get(symbol, 0) + sign * filled
+            order = SimOrder(f"sim-{next(self._ids)}", symbol, qty, side,
+                             "filled" if filled == qty else "partially_filled",
+                             filled, price, self.now())
+            self.orders.append(order)
+        return order
+
+    @timed("broker.submit_buy_market")
+    def submit_buy_market(self, symbol: str, qty: int):
+        return self._submit(symbol, qty, "buy")
+
+    @timed("broker.submit_sell_market")
+    def submit_sell_market(self, symbol: str, qty: int):
+        return self._submit(symbol, qty, "sell")
+
+    # --- server-side exits: resting sell orders, swept over the simulated minutes ---
+    def _rest_order(self, symbol, qty, type, **kw) -> SimOrder:
+        order = SimOrder(f"sim-{next(self._ids)}", symbol, qty, "sell", "new", 0, None,
+                         self.now(), type=type, **kw)
+        order.checked = self.minute()
+        self.exit_orders[order.id] = order
+        return order
+
+    def _oco(self, symbol, qty, take_profit, stop_loss) -> tuple[SimOrder, SimOrder]:
+        with self._state_lock:
+            tp = self._rest_order(symbol, qty, "limit", limit_price=take_profit)
+            sl = self._rest_order(symbol, qty, "stop", stop_price=stop_loss)
+            tp.group, sl.group = (sl,), (tp,)
+        return tp, sl
+
+    @timed("broker.submit_buy_bracket")
+    def submit_buy_bracket(self, symbol: str, qty: int, take_profit: float, stop_loss: float):
+        order = self._submit(symbol, qty, "buy", "submit_order_bracket")
+        order.legs = list(self._oco(symbol, order.filled_qty, take_profit, stop_loss))
+        return order
+
+    @timed("broker.submit_exit_oco")
+    def submit_exit_oco(self, symbol: str, qty: int, take_profit: float, stop_loss: float):
+        self._call("submit_order_exit")
+        tp, sl = self._oco(symbol, qty, take_profit, stop_loss)
+        tp.legs = [sl]
+        return tp
+
+    @timed("broker.submit_trailing_stop")
+    def submit_trailing_stop(self, symbol: str, qty: int, trail_percent: float):
+        self._call("submit_order_exit")
+        with self._state_lock:
+            return self._rest_order(symbol, qty, "trailing_stop", trail_percent=float(trail_percent))
+
+    def _sweep(self):
+        """Fill resting exit orders at the first simulated minute whose price triggers them."""
+        now = self.minute()
+        with self._state_lock:
+            for order in list(self.exit_orders.values()):
+                if order.status != "new":
+                    continue
+                for m in range(order.checked + 1, now + 1):
+                    price = self.market.price(order.symbol, m)
+                    if price is not None and order.triggered(price):
+                        order.status, order.filled_qty, order.filled_avg_price = "filled", order.qty, price
+                        self.cash += order.qty * price
+                        self.holdings[order.symbol] = self.holdings.get(order.symbol, 0) - order.qty
+                        self.orders.append(order)
+                        for sibling in order.group:
+                            if sibling.status == "new":
+                                sibling.status = "canceled"
+                        break
+                order.checked = now
+
+    @timed("broker.cancel_order")
+    def cancel_order(self, order_id: str):
+        self._call("cancel_order")
+        self._sweep()
+        with self._state_lock:
+            order = self.exit_orders.get(order_id)
+            if order is None or order.status != "new":
+                raise SimBrokerError(f"order {order_id} is not cancelable")
+            order.status = "canceled"
+
+    @timed("broker.open_order_ids")
+    def open_order_ids(self) -> set:
+        self._call("list_orders")
+        self._sweep()
+        with self._state_lock:
+            return {o.id for o in self.exit_orders.values() if o.status == "new"}
+
+    @timed("broker.position_qtys")
+    def position_qtys(self) -> dict:
+        self._call("list_positions")
+        self._sweep()
+        with self._state_lock:
+            return {s: int(q) for s, q in self.holdings.items() if q}
+
+    @timed("broker.get_order")
+    def get_order(self, order_id: str):
+        self._call("get_order")
+        self._sweep()
+        order = self.exit_orders.get(order_id)
+        if order is None:
+            raise SimBrokerError(f"order {order_id} not found")
+        return order
+
+    @timed("broker.current_price")
+    def current_price(self, symbol: str):
+        return self.cache.get(("trade", symbol), QUOTE_TTL,
+                              lambda: self.api.get_latest_trade(symbol)).price
+
+    @timed("broker.latest_prices")
+    def latest_prices(self, symbols) -> dict:
+        symbols = list(dict.fromkeys(symbols))
+        try:
+            trades = self.api.get_latest_trades(symbols)
+        except SimBrokerError as e:
+            print("latest_trades failed:", e)
+            return {}
+        return {s: t.price for s, t in trades.items()}
+
+    # --- raw market data (cached, like AlpacaBroker) ---
+    @timed("broker.daily_bars")
+    def daily_bars(self, symbol: str, limit: int = DAILY_LOOKBACK):
+        bars = self.cache.get(("day", symbol), DAILY_BARS_TTL,
+                              lambda: self.api.get_bars(symbol, "1Day", limit=DAILY_LOOKBACK))
+        return bars[-limit:] if limit > 0 else []
+
+    @timed("broker.minute_bars")
+    def minute_bars(self, symbol: str, limit: int = 60):
+        return self.cache.get(("1Min", symbol, limit), MINUTE_BARS_TTL,
+                              lambda: self.api.get_bars(symbol, "1Min", limit=limit))
+
+    @timed("broker.latest_quote")
+    def latest_quote(self, symbol: str):
+        return self.cache.get(("quote", symbol), QUOTE_TTL,
+                              lambda: self.api.get_latest_quote(symbol))
+
+
+def synthetic_filings(n: int, seed: int = 7, universe: int = 2000, run: str = ""):
+    """`n` Form 4 buy events over a synthetic ticker universe, for stressing the loop.
+    Links/accessions are unique per (run, seed, i), so the seen-set never drops them."""
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    for i in range(n):
+        k = rng.randrange(universe)
+        ticker = "".join(chr(65 + (k // 26 ** j) % 26) for j in range(3))
+        yield {
+            "form": "4", "ticker": ticker, "title": f"Form 4 - SIM{k} ({ticker}) (Issuer)",
+            "link": f"sim://{run}/{seed}/{i}", "filed_at": now, "accession": f"sim-{run}-{seed}-{i}",
+            "officer_role": rng.choice(("CEO", "CFO", "Director", "Officer")),
+            "transaction_type": "BUY", "transaction_shares": rng.randrange(100, 10_000),
+        }
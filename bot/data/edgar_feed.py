@@ -1,35 +1,299 @@
 # bot/data/edgar_feed.py
-import feedparser
-import re
-from datetime import datetime
-from typing import Iterator, Dict
-import requests, os
+import io, re, time
+import xml.etree.ElementTree as ET
+from datetime import datetime, timezone
+from typing import Iterable, Iterator, Dict
+import os
 from dotenv import load_dotenv
+from bot.data import issuers
+from bot.utils.metrics import timed
+from bot.utils.ratelimit import TokenBucket
 
 load_dotenv()
 UA = os.getenv("SEC_USER_AGENT")
+SEC_BASE_URL = os.getenv("SEC_BASE_URL", "https://www.sec.gov")  # point at a local stand-in for tests
+SEC_MAX_RPS = 10   # SEC fair-access limit, for all of this process's requests to sec.gov
 
-FORM_RE = re.compile(r"Form\s+(4|13D|13G)", re.I)
+# EDGAR titles start "<form type> - ", e.g. "4 - Apple Inc. (0000320193) (Issuer)",
+# "SC 13D/A - ..." or, since December 2024, "SCHEDULE 13D/A - ..."; "Form 4 - ..."
+# is accepted too (synthetic feeds)
+FORM_RE = re.compile(r"^\s*(?:Form\s+)?(?:SCHEDULE\s+|SC\s+)?(4|13D|13G)(/A)?\s+-", re.I)
 TICKER_RE = re.compile(r"\((?P<ticker>[A-Z]{1,5})\)")
+ACCESSION_RE = re.compile(r"(?P<acc>\d{10}-\d{2}-\d{6})")
+PATH_RE = re.compile(r"/Archives/edgar/data/(?P<cik>\d+)/(?P<folder>\d{18})/")
+# "<form> - <name> (<10-digit CIK>) (<Issuer|Reporting|...>)"
+ENTITY_RE = re.compile(r"-\s+(?P<name>.+?)\s+\((?P<cik>\d{10})\)\s+\((?P<role>[^)]+)\)\s*$")
+ISSUER_ROLES = ("issuer", "subject")   # entity roles whose CIK is the traded company
 
-FEED_URL = "https://www.sec.gov/cgi-bin/browse-edgar?action=getcurrent&type=&count=100&output=atom"
+FEED_URL = SEC_BASE_URL + "/cgi-bin/browse-edgar?action=getcurrent&type=&count=100&output=atom"
+PAGE_SIZE = 100   # entries per feed page (EDGAR's maximum)
+MAX_PAGES = 10    # how deep a burst is followed in one poll
 
-def latest_filings() -> Iterator[Dict]:
-    headers = {"User-Agent": UA or "GoatTradingBot/0.1"}
-    raw = requests.get(FEED_URL, headers=headers, timeout=10)
-    raw.raise_for_status()
-    feed = feedparser.parse(raw.content)
+ATOM = "{http://www.w3.org/2005/Atom}"
+_ENTRY, _TITLE, _LINK, _UPDATED, _ID = (ATOM + t for t in ("entry", "title", "link", "updated", "id"))
+
+_session = None
+_sec_bucket = TokenBucket(SEC_MAX_RPS)
+# conditional-GET validators and the newest entry already handed out
+_poll = {"etag": None, "last_modified": None, "hwm": None, "hwm_ids": frozenset()}
+_stats = {"pages": 0, "bytes": 0, "parse_s": 0.0, "entries": 0, "not_modified": False, "cik_resolved": 0}
+
+
+def _get_session():
+    """Shared keep-alive requests.Session (requests is imported on first use)."""
+    global _session
+    if _session is None:
+        import requests
+        from requests.adapters import HTTPAdapter
+        _session = requests.Session()
+        _session.headers["User-Agent"] = UA or "GoatTradingBot/0.1"
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=10)
+        _session.mount("https://", adapter)
+        _session.mount("http://", adapter)
+    return _session
+
+
+def _sec_get(url: str, **kwargs):
+    """GET on the shared session, paced by the one SEC token bucket (feed, issuers, Form 4)."""
+    _sec_bucket.acquire()
+    resp = _get_session().get(url, **kwargs)
+    if resp.status_code == 429:
+        _sec_bucket.drain()
+    return resp
+
+
+def feed_stats() -> dict:
+    """Pages, bytes, parse seconds, new entries and CIK-resolved tickers of the last poll."""
+    return dict(_stats)
+
+
+def accession_of(text: str) -> str | None:
+    """Accession number from an entry id or filing link."""
+    m = ACCESSION_RE.search(text or "")
+    if m:
+        return m.group("acc")
+    m = PATH_RE.search(text or "")
+    if m:
+        f = m.group("folder")
+        return f"{f[:10]}-{f[10:12]}-{f[12:]}"
+    return None
 
-    for entry in feed.entries:
-        if not FORM_RE.search(entry.title):
+
+def _parse_time(text: str) -> datetime:
+    """Atom timestamp -> naive UTC datetime."""
+    ts = datetime.fromisoformat(text.strip())
+    return ts.astimezone(timezone.utc).replace(tzinfo=None) if ts.tzinfo else ts
+
+
+def iter_entries(content: bytes) -> Iterator[tuple]:
+    """Stream (updated, entry_id, title, link) per atom entry, newest first.
+
+    Built on iterparse: each entry is read when its end tag arrives and then
+    dropped from the tree, so memory stays flat however large the page is.
+    """
+    root = None
+    for event, elem in ET.iterparse(io.BytesIO(content), events=("start", "end")):
+        if root is None:
+            root = elem
+            continue
+        if event != "end" or elem.tag != _ENTRY:
             continue
-        ticker_match = TICKER_RE.search(entry.title)
-        if not ticker_match:
-            continue  # no ticker symbol → skip
-        yield {
-            "form": FORM_RE.search(entry.title).group(1).upper(),
-            "ticker": ticker_match.group("ticker"),
-            "title": entry.title,
-            "link": entry.link,
-            "filed_at": datetime(*entry.updated_parsed[:6]),
-        }
+        link_el = elem.find(_LINK)
+        link = link_el.get("href", "") if link_el is not None else ""
+        title = elem.findtext(_TITLE, "")
+        updated = _parse_time(elem.findtext(_UPDATED, ""))
+        entry_id = elem.findtext(_ID) or link
+        root.clear()  # frees this entry and everything before it
+        yield updated, entry_id, title, link
+
+
+def _to_entry(entry_id: str, title: str, link: str, filed_at: datetime) -> Dict | None:
+    """Per-entry record for Form 4/13D/13G titles (ticker may be None), else None.
+
+    EDGAR's "<name> (<CIK>) (<role>)" titles only get a ticker for the issuer /
+    subject entity, resolved from its CIK through the issuer index: names hold
+    parentheses of their own ("KKR FUND HOLDINGS (US) LP"), and a reporting
+    owner's entry must never become a trade. Titles without a CIK (synthetic
+    feeds) take a "(XYZ)" ticker unless they are a reporting owner's.
+    """
+    form_match = FORM_RE.search(title)
+    if not form_match:
+        return None
+    entity = ENTITY_RE.search(title)
+    ticker = None
+    if entity:
+        if entity.group("role").lower() in ISSUER_ROLES:
+            ticker = issuers.resolve(entity.group("cik"))
+            _stats["cik_resolved"] += ticker is not None
+    elif "(reporting)" not in title.lower():
+        ticker_match = TICKER_RE.search(title)
+        ticker = ticker_match.group("ticker") if ticker_match else None
+    return {
+        "form": form_match.group(1).upper() + (form_match.group(2) or "").upper(),   # amendments: "4/A"
+        "ticker": ticker,
+        "title": title,
+        "link": link,
+        "filed_at": filed_at,
+        "accession": accession_of(entry_id) or accession_of(link),
+        "entity": entity.groupdict() if entity else None,
+    }
+
+
+def coalesce(entries: Iterable[Dict]) -> Iterator[Dict]:
+    """Merge feed entries that belong to one accession into a single filing event.
+
+    EDGAR lists a Form 4 once for the issuer and once per reporting owner, each
+    with its own link. The merged event keeps the first link, all links and
+    titles, and the reporting owners; one event is yielded per (accession, ticker).
+    Entries for which no ticker is known are dropped.
+    """
+    events: Dict[str, Dict] = {}
+    for e in entries:
+        key = e["accession"] or e["link"]
+        ev = events.get(key)
+        if ev is None:
+            ev = events[key] = {
+                "form": e["form"], "tickers": [], "titles": [], "links": [],
+                "filed_at": e["filed_at"], "accession": e["accession"],
+                "issuer": None, "reporting_owners": [],
+            }
+        if e["ticker"] and e["ticker"] not in ev["tickers"]:
+            ev["tickers"].append(e["ticker"])
+        ev["titles"].append(e["title"])
+        ev["links"].append(e["link"])
+        ev["filed_at"] = min(ev["filed_at"], e["filed_at"])
+        entity = e["entity"]
+        if entity:
+            who = {"name": entity["name"], "cik": entity["cik"]}
+            if entity["role"].lower() == "reporting":
+                if who not in ev["reporting_owners"]:
+                    ev["reporting_owners"].append(who)
+            elif ev["issuer"] is None:
+                ev["issuer"] = who
+
+    for ev in events.values():
+        tickers = ev.pop("tickers")
+        titles = ev.pop("titles")
+        base = dict(ev, title=" | ".join(titles), link=ev["links"][0])
+        for ticker in tickers:
+            yield dict(base, ticker=ticker)
+
+
+def parse_filings(content: bytes) -> Iterator[Dict]:
+    """All filing events in one feed document (no polling state involved)."""
+    entries = (_to_entry(eid, title, link, updated) for updated, eid, title, link in iter_entries(content))
+    return coalesce(e for e in entries if e)
+
+
+@timed("edgar.fetch_page")
+def _fetch_page(start: int, conditional: bool):
+    headers = {}
+    if conditional:
+        if _poll["etag"]:
+            headers["If-None-Match"] = _poll["etag"]
+        if _poll["last_modified"]:
+            headers["If-Modified-Since"] = _poll["last_modified"]
+    url = FEED_URL if start == 0 else f"{FEED_URL}&start={start}"
+    raw = _sec_get(url, headers=headers, timeout=10)
+    if raw.status_code == 304:
+        return None
+    raw.raise_for_status()
+    _stats["pages"] += 1
+    _stats["bytes"] += len(raw.content)
+    return raw
+
+
+def latest_filings() -> Iterator[Dict]:
+    """Yield filing events (see coalesce) newer than the last poll's high-water mark.
+
+    The first page is requested conditionally (ETag / Last-Modified). The feed is
+    newest-first, so iteration stops at the first entry already handed out; if a
+    whole page is new, the next page is fetched (up to MAX_PAGES). Validators and
+    the high-water mark only advance once the generator has been fully consumed.
+    """
+    _stats.update(pages=0, bytes=0, parse_s=0.0, entries=0, not_modified=False, cik_resolved=0)
+    issuers.maybe_refresh()
+    hwm, hwm_ids = _poll["hwm"], _poll["hwm_ids"]
+    newest, newest_ids = None, set()
+    validators = None
+    matched = []
+
+    for page in range(MAX_PAGES):
+        raw = _fetch_page(page * PAGE_SIZE, conditional=page == 0)
+        if raw is None:
+            _stats["not_modified"] = True
+            return
+        if page == 0:
+            validators = (raw.headers.get("ETag"), raw.headers.get("Last-Modified"))
+        entries = iter_entries(raw.content)
+        n_entries = 0
+        reached_hwm = False
+        while True:
+            t0 = time.perf_counter()
+            item = next(entries, None)
+            _stats["parse_s"] += time.perf_counter() - t0
+            if item is None:
+                break
+            n_entries += 1
+            updated, entry_id, title, link = item
+            if hwm is not None and (updated < hwm or (updated == hwm and entry_id in hwm_ids)):
+                reached_hwm = True
+                break
+            if newest is None or updated > newest:
+                newest, newest_ids = updated, {entry_id}
+            elif updated == newest:
+                newest_ids.add(entry_id)
+            _stats["entries"] += 1
+
+            entry = _to_entry(entry_id, title, link, updated)
+            if entry:
+                matched.append(entry)
+
+        # first poll (no mark yet) reads one page; otherwise page deeper on overflow
+        if reached_hwm or hwm is None or n_entries < PAGE_SIZE:
+            break
+
+    # entries of one accession can sit anywhere in the poll, so merge before yielding
+    yield from coalesce(matched)
+
+    if newest is not None:
+        if hwm is not None and newest == hwm:
+            newest_ids |= hwm_ids
+        _poll.update(hwm=newest, hwm_ids=frozenset(newest_ids))
+    if validators:
+        _poll.update(etag=validators[0], last_modified=validators[1])
+
+
+if __name__ == "__main__":
+    # benchmark: python -m bot.data.edgar_feed [recorded_feed.xml ...]
+    import sys, tracemalloc
+    if len(sys.argv) > 1:
+        docs = [open(p, "rb").read() for p in sys.argv[1:]]
+    else:  # synthetic stand-in for an archived feed
+        rows = "".join(
+            f'<entry><title>{"Form 4" if i % 3 else "8-K"} - Co{i} ({chr(65 + i % 26)}{chr(65 + i // 26 % 26)}X) (Issuer)</title>'
+            f'<link rel="alternate" type="text/html" href="https://www.sec.gov/x/{i}-index.htm"/>'
+            f'<summary type="html">Filed: 2024-01-02 AccNo: {i}</summary>'
+            f'<updated>2024-01-02T16:{i % 60:02d}:00-05:00</updated>'
+            f'<category scheme="https://www.sec.gov/" label="form type" term="4"/>'
+            f'<id>urn:tag:sec.gov,2008:accession-number=0000000000-24-{i:06d}</id></entry>'
+            for i in range(5_000))
+        docs = [f'<?xml version="1.0" encoding="ISO-8859-1" ?><feed xmlns="http://www.w3.org/2005/Atom">{rows}</feed>'.encode()]
+    size = sum(len(d) for d in docs) / 1e6
+
+    def run(label, fn):
+        t0 = time.perf_counter(); n = sum(fn(d) for d in docs); dt = time.perf_counter() - t0
+        tracemalloc.start()
+        sum(fn(d) for d in docs)
+        peak = tracemalloc.get_traced_memory()[1] / 1e6
+        tracemalloc.stop()
+        print(f"{label:<11} {size:6.1f} MB  {dt:7.3f}s  peak {peak:7.1f} MB  {n} filings")
+
+    run("iterparse", lambda d: sum(1 for _ in parse_filings(d)))
+    try:
+        import feedparser
+    except ImportError:
+        print("feedparser not installed; skipping comparison")
+    else:
+        run("feedparser", lambda d: sum(1 for e in feedparser.parse(d).entries
+                                        if FORM_RE.search(e.title) and TICKER_RE.search(e.title)))
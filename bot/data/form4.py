@@ -0,0 +1,178 @@
+# bot/data/form4.py
+"""
+Form 4 enrichment: resolve each filing's index link to its ownership XML,
+parse the reporting owner's role and the transaction, and fill the optional
+fields insider_simple.decide_trade reads.
+
+Fetches run in parallel but go through edgar_feed's SEC token bucket, which
+the feed poll and the issuer refresh share, so together they stay under
+SEC's fair-use limit. Parsed documents are cached on disk under a hash of the accession
+number (filings are immutable), so a restart never downloads one twice.
+"""
+import hashlib, json, os, pathlib, re
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable
+from bot.data.edgar_feed import PATH_RE, _sec_get, accession_of
+from bot.utils.metrics import timed
+
+SEC_BASE_URL = os.getenv("SEC_BASE_URL", "https://www.sec.gov")  # point at a local stand-in for tests
+ENRICH_WORKERS = 8
+CACHE_DIR = pathlib.Path("state/form4")
+# filer software names the ownership XML e.g. "wf-form4_171234.xml", "doc4.xml", "primary_doc.xml"
+OWNERSHIP_NAME_RE = re.compile(r"form4|doc4|primary_doc|ownership", re.I)
+
+
+def _cache_path(accession: str) -> pathlib.Path:
+    digest = hashlib.sha256(accession.encode()).hexdigest()
+    return CACHE_DIR / digest[:2] / f"{digest}.json"
+
+
+@timed("form4.get")
+def _get(url: str):
+    resp = _sec_get(url, timeout=10)
+    resp.raise_for_status()
+    return resp
+
+
+def _text(el, path: str) -> str | None:
+    node = el.find(path)
+    if node is None:
+        return None
+    if node.text and node.text.strip():
+        return node.text.strip()
+    return node.findtext("value", "").strip() or None
+
+
+def _flag(el, path: str) -> bool:
+    return (_text(el, path) or "").lower() in ("1", "true")
+
+
+def _role(officer_title: str | None, is_director: bool, is_officer: bool, ten_pct: bool) -> str | None:
+    t = (officer_title or "").lower()
+    if "chief executive" in t or re.search(r"\bceo\b", t):
+        return "CEO"
+    if "chief financial" in t or re.search(r"\bcfo\b", t):
+        return "CFO"
+    if is_director:
+        return "Director"
+    if is_officer:
+        return "Officer"
+    if ten_pct:
+        return "10% Owner"
+    return None
+
+
+def parse_ownership(xml: bytes) -> Dict:
+    """Parse an ownershipDocument into the enrichment fields."""
+    root = ET.fromstring(xml)
+    if root.tag != "ownershipDocument":
+        raise ValueError(f"not an ownership document: <{root.tag}>")
+    owners = []
+    for ro in root.iter("reportingOwner"):
+        rel = ro.find("reportingOwnerRelationship")
+        rel = rel if rel is not None else ET.Element("x")
+        is_dir, is_off, ten = _flag(rel, "isDirector"), _flag(rel, "isOfficer"), _flag(rel, "isTenPercentOwner")
+        title = _text(rel, "officerTitle")
+        owners.append({
+            "name": _text(ro, "reportingOwnerId/rptOwnerName"),
+            "cik": _text(ro, "reportingOwnerId/rptOwnerCik"),
+            "is_director": is_dir, "is_officer": is_off, "is_ten_pct_owner": ten,
+            "officer_title": title,
+            "role": _role(title, is_dir, is_off, ten),
+        })
+
+    bought = sold = 0.0
+    codes = set()
+    owned_after = None
+    for tx in root.iter("nonDerivativeTransaction"):
+        code = _text(tx, "transactionCoding/transactionCode")
+        shares = float(_text(tx, "transactionAmounts/transactionShares") or 0)
+        codes.add(code)
+        if code == "P":
+            bought += shares
+        elif code == "S":
+            sold += shares
+        after = _text(tx, "postTransactionAmounts/sharesOwnedFollowingTransaction")
+        if after is not None:
+            owned_after = float(after)
+
+    if bought and not sold:
+        tx_type, tx_shares = "BUY", bought
+    elif sold and not bought:
+        tx_type, tx_shares = "SELL", sold
+    elif bought and sold:
+        tx_type, tx_shares = "MIXED", bought - sold
+    else:
+        tx_type, tx_shares = ("OTHER:" + ",".join(sorted(c for c in codes if c))) if codes else None, None
+
+    roles = [o["role"] for o in owners if o["role"]]
+    return {
+        "issuer_ticker": _text(root, "issuer/issuerTradingSymbol"),
+        "issuer_cik": _text(root, "issuer/issuerCik"),
+        "reporting_owners": owners,
+        "officer_role": next((r for r in ("CEO", "CFO", "Director", "Officer", "10% Owner") if r in roles), None),
+        "transaction_type": tx_type,
+        "transaction_shares": tx_shares,
+        "shares_owned_after": owned_after,
+    }
+
+
+def _ownership_xml_urls(link: str) -> list[str]:
+    """The filing folder's XML documents, likeliest ownership document first."""
+    m = PATH_RE.search(link)
+    if not m:
+        return []
+    folder = f"{SEC_BASE_URL}/Archives/edgar/data/{m.group('cik')}/{m.group('folder')}"
+    items = _get(f"{folder}/index.json").json()["directory"]["item"]
+    names = [it.get("name", "") for it in items]
+    names = [n for n in names if n.lower().endswith(".xml") and n != "FilingSummary.xml"]
+    names.sort(key=lambda n: not OWNERSHIP_NAME_RE.search(n))
+    return [f"{folder}/{n}" for n in names]
+
+
+def fetch_ownership(link: str) -> Dict | None:
+    """Parsed ownership document for a filing link (disk cache first); None on failure."""
+    accession = accession_of(link)
+    if not accession:
+        return None
+    path = _cache_path(accession)
+    if path.exists():
+        return json.loads(path.read_text())
+    try:
+        doc = None
+        for url in _ownership_xml_urls(link):
+            try:
+                doc = parse_ownership(_get(url).content)
+                break
+            except (ET.ParseError, ValueError):   # an exhibit, not the ownership document
+                continue
+        if doc is None:
+            return None
+    except Exception as e:
+        print(f"form4 fetch failed for {accession}:", e)
+        return None
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(doc))
+    os.replace(tmp, path)
+    return doc
+
+
+def enrich(filings: Iterable[Dict], workers: int = ENRICH_WORKERS) -> list[Dict]:
+    """Fill transaction/owner fields on Form 4 filings in place (best-effort)."""
+    filings = list(filings)
+    todo = [f for f in filings if f.get("form") == "4" and "transaction_type" not in f]
+    if not todo:
+        return filings
+    # one fetch per accession, even if an accession fans out to several tickers
+    links = {}
+    for f in todo:
+        links.setdefault(f.get("accession") or accession_of(f.get("link", "")), f.get("link", ""))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="form4") as pool:
+        docs = dict(zip(links, pool.map(fetch_ownership, links.values())))
+    for f in todo:
+        doc = docs.get(f.get("accession") or accession_of(f.get("link", "")))
+        if doc:
+            f.update({k: v for k, v in doc.items() if v is not None})
+    return filings
@@ -0,0 +1,263 @@
+# bot/data/intraday.py
+"""
+Streaming intraday features per watched symbol: rolling volatility of minute
+returns, bid-ask spread statistics and VWAP, kept in fixed-size ring buffers.
+
+Every buffer is one row of a (symbols x slots) float64 matrix, so a symbol
+costs ~1.9 KB and thousands fit in a few MB; rows are recycled when a symbol
+is dropped. Trades are folded into minute bars as they arrive (a minute is
+closed by the first trade of the next one, like REST bars, empty minutes
+leave no bar). Each update is O(1): the rolling mean / variance use Welford's
+add-and-remove updates over the window, re-derived exactly from the ring once
+per wrap so rounding never accumulates; VWAP keeps running sums, likewise re-derived.
+
+    book = IntradayBook()
+    book.on_trade("AAPL", 189.3, 100, "2024-05-01T14:31:07.1Z")
+    book.on_quote("AAPL", 189.29, 189.31)
+    book.volatility("AAPL")    # None until a full window of minute returns exists
+"""
+import threading
+import numpy as np
+
+BARS_WINDOW = 60         # minute bars behind volatility / VWAP (matches intraday_volatility(minutes=60))
+SPREAD_WINDOW = 50       # quotes behind the spread statistics
+INITIAL_CAPACITY = 256   # symbols; the matrices double when full
+
+_RET = BARS_WINDOW - 1   # returns in a full window of bars
+
+
+def minute_key(t):
+    """Minute bucket of a tick timestamp: RFC 3339 string -> 'YYYY-MM-DDTHH:MM', numbers -> int minute."""
+    if isinstance(t, str):
+        return t[:16]
+    return int(t // 60)
+
+
+class _Welford:
+    """Sliding-window mean / M2 over one ring row per symbol (arrays indexed by row)."""
+
+    def __init__(self, capacity: int, window: int):
+        self.window = window
+        self.ring = np.zeros((capacity, window))
+        self.head = np.zeros(capacity, dtype=np.int64)   # next slot to write
+        self.n = np.zeros(capacity, dtype=np.int64)
+        self.mean = np.zeros(capacity)
+        self.m2 = np.zeros(capacity)
+
+    def grow(self, capacity: int):
+        pad = capacity - len(self.n)
+        self.ring = np.vstack([self.ring, np.zeros((pad, self.window))])
+        for name in ("head", "n", "mean", "m2"):
+            a = getattr(self, name)
+            setattr(self, name, np.concatenate([a, np.zeros(pad, dtype=a.dtype)]))
+
+    def reset(self, row: int):
+        self.head[row] = self.n[row] = 0
+        self.mean[row] = self.m2[row] = 0.0
+
+    def push(self, row: int, x: float):
+        h, n = int(self.head[row]), int(self.n[row])
+        mean, m2 = float(self.mean[row]), float(self.m2[row])
+        if n == self.window:            # slide: remove the oldest sample first
+            y = float(self.ring[row, h])
+            d = y - mean
+            mean -= d / (n - 1)
+            m2 -= d * (y - mean)
+            n -= 1
+        d = x - mean
+        n += 1
+        mean += d / n
+        m2 += d * (x - mean)
+        self.ring[row, h] = x
+        h = (h + 1) % self.window
+        if h == 0 and n == self.window:  # full wrap: re-derive exactly
+            r = self.ring[row]
+            mean = float(r.mean())
+            m2 = float(((r - mean) ** 2).sum())
+        self.head[row], self.n[row] = h, n
+        self.mean[row], self.m2[row] = mean, max(m2, 0.0)
+
+    def std(self, row: int) -> float | None:
+        n = int(self.n[row])
+        return float(np.sqrt(self.m2[row] / (n - 1))) if n > 1 else None
+
+
+class IntradayBook:
+    """Ring-buffered minute bars and quotes for a changing set of symbols (thread-safe)."""
+
+    def __init__(self, capacity: int = INITIAL_CAPACITY):
+        self._lock = threading.Lock()
+        self._rows: dict[str, int] = {}
+        self._free: list[int] = []
+        self._capacity = capacity
+        self._returns = _Welford(capacity, _RET)
+        self._spreads = _Welford(capacity, SPREAD_WINDOW)
+        self._pv = np.zeros((capacity, BARS_WINDOW))      # price x volume per closed minute
+        self._vol = np.zeros((capacity, BARS_WINDOW))
+        self._bar_head = np.zeros(capacity, dtype=np.int64)
+        self._bars = np.zeros(capacity, dtype=np.int64)   # closed minutes seen (saturates at window)
+        self._sum_pv = np.zeros(capacity)
+        self._sum_vol = np.zeros(capacity)
+        self._prev_close = np.full(capacity, np.nan)      # close of the last closed minute
+        self._cur = np.full((capacity, 3), np.nan)        # minute in progress: close, pv, volume
+        self._quote = np.full((capacity, 2), np.nan)      # last bid, ask
+        self._minute = [None] * capacity                  # key of the minute in progress
+
+    def __contains__(self, symbol: str):
+        return symbol in self._rows
+
+    def __len__(self):
+        return len(self._rows)
+
+    def nbytes(self) -> int:
+        arrays = (self._returns.ring, self._spreads.ring, self._pv, self._vol, self._cur, self._quote)
+        return sum(a.nbytes for a in arrays)
+
+    # --- rows ---
+    def _row(self, symbol: str) -> int:
+        row = self._rows.get(symbol)
+        if row is not None:
+            return row
+        if self._free:
+            row = self._free.pop()
+        else:
+            row = len(self._rows)
+            if row == self._capacity:
+                self._grow(self._capacity * 2)
+        self._rows[symbol] = row
+        self._clear(row)
+        return row
+
+    def _grow(self, capacity: int):
+        pad = capacity - self._capacity
+        self._returns.grow(capacity)
+        self._spreads.grow(capacity)
+        self._pv = np.vstack([self._pv, np.zeros((pad, BARS_WINDOW))])
+        self._vol = np.vstack([self._vol, np.zeros((pad, BARS_WINDOW))])
+        self._cur = np.vstack([self._cur, np.full((pad, 3), np.nan)])
+        self._quote = np.vstack([self._quote, np.full((pad, 2), np.nan)])
+        for name, fill in (("_bar_head", 0), ("_bars", 0), ("_sum_pv", 0.0), ("_sum_vol", 0.0),
+                           ("_prev_close", np.nan)):
+            a = getattr(self, name)
+            setattr(self, name, np.concatenate([a, np.full(pad, fill, dtype=a.dtype)]))
+        self._minute += [None] * pad
+        self._capacity = capacity
+
+    def _clear_bars(self, row: int):
+        self._returns.reset(row)
+        self._pv[row] = self._vol[row] = 0.0
+        self._bar_head[row] = self._bars[row] = 0
+        self._sum_pv[row] = self._sum_vol[row] = 0.0
+        self._prev_close[row] = np.nan
+
+    def _clear(self, row: int):
+        self._clear_bars(row)
+        self._spreads.reset(row)
+        self._cur[row] = self._quote[row] = np.nan
+        self._minute[row] = None
+
+    def drop(self, symbol: str):
+        """Stop tracking a symbol and recycle its row."""
+        with self._lock:
+            row = self._rows.pop(symbol, None)
+            if row is not None:
+                self._free.append(row)
+
+    # --- updates ---
+    def _close_minute(self, row: int, close: float, pv: float, vol: float):
+        prev = self._prev_close[row]
+        if prev == prev and prev:        # not NaN, not zero
+            self._returns.push(row, (close - prev) / prev)
+        self._prev_close[row] = close
+        h = int(self._bar_head[row])
+        self._sum_pv[row] += pv - self._pv[row, h]
+        self._sum_vol[row] += vol - self._vol[row, h]
+        self._pv[row, h], self._vol[row, h] = pv, vol
+        self._bar_head[row] = (h + 1) % BARS_WINDOW
+        if h == BARS_WINDOW - 1:         # wrap: re-derive the running sums
+            self._sum_pv[row], self._sum_vol[row] = self._pv[row].sum(), self._vol[row].sum()
+        self._bars[row] = min(self._bars[row] + 1, BARS_WINDOW)
+
+    def on_trade(self, symbol: str, price: float, size: float, t):
+        with self._lock:
+            row = self._row(symbol)
+            key = minute_key(t)
+            cur = self._cur[row]
+            if self._minute[row] != key:
+                if self._minute[row] is not None:
+                    self._close_minute(row, cur[0], cur[1], cur[2])
+                self._minute[row] = key
+                cur[:] = (price, 0.0, 0.0)
+            cur[0] = price
+            cur[1] += price * size
+            cur[2] += size
+
+    def on_bar(self, symbol: str, close: float, volume: float, vwap: float | None = None):
+        """Fold in one completed minute bar (e.g. from a bars stream or a REST seed)."""
+        with self._lock:
+            row = self._row(symbol)
+            self._close_minute(row, close, (vwap or close) * volume, volume)
+
+    def on_quote(self, symbol: str, bid: float, ask: float):
+        if bid is None or ask is None:
+            return
+        with self._lock:
+            row = self._row(symbol)
+            self._quote[row] = (bid, ask)
+            self._spreads.push(row, ask - bid)
+
+    def seed(self, symbol: str, bars):
+        """Replace a symbol's closed minutes with REST minute bars (.c/.v) unless its window is full.
+
+        REST bars already cover the minutes streamed so far; the minute in
+        progress is kept.
+        """
+        with self._lock:
+            row = self._row(symbol)
+            if self._returns.n[row] >= _RET:
+                return
+            self._clear_bars(row)
+            for b in list(bars)[-BARS_WINDOW:]:
+                if b.c is None or b.v is None:
+                    continue
+                self._close_minute(row, b.c, (getattr(b, "vw", None) or b.c) * b.v, b.v)
+
+    # --- queries (None = not enough data yet) ---
+    def volatility(self, symbol: str, full: bool = True) -> float | None:
+        """Sample stddev of minute returns over the window; `full` requires all of it."""
+        with self._lock:
+            row = self._rows.get(symbol)
+            if row is None or (full and self._returns.n[row] < _RET):
+                return None
+            return self._returns.std(row)
+
+    def spread(self, symbol: str) -> float | None:
+        """Latest ask - bid."""
+        with self._lock:
+            row = self._rows.get(symbol)
+            if row is None or self._quote[row, 0] != self._quote[row, 0]:
+                return None
+            bid, ask = self._quote[row]
+            return float(ask - bid)
+
+    def spread_stats(self, symbol: str) -> dict | None:
+        """Last, mean and stddev of ask - bid over the last SPREAD_WINDOW quotes."""
+        with self._lock:
+            row = self._rows.get(symbol)
+            if row is None or not self._spreads.n[row]:
+                return None
+            bid, ask = self._quote[row]
+            return {"last": float(ask - bid), "mean": float(self._spreads.mean[row]),
+                    "std": self._spreads.std(row), "n": int(self._spreads.n[row])}
+
+    def vwap(self, symbol: str) -> float | None:
+        """Volume-weighted price over the window's closed minutes plus the one in progress."""
+        with self._lock:
+            row = self._rows.get(symbol)
+            if row is None:
+                return None
+            pv, vol = self._sum_pv[row], self._sum_vol[row]
+            if self._minute[row] is not None:
+                pv += self._cur[row, 1]
+                vol += self._cur[row, 2]
+            return float(pv / vol) if vol > 0 else None
@@ -0,0 +1,273 @@
+# bot/data/issuers.py
+"""
+CIK -> ticker index, so feed entries that name an issuer only by company name
+and CIK ("4 - Apple Inc. (0000320193) (Issuer)") still resolve to a symbol.
+
+Built from SEC's company_tickers.json and cached as one sorted table of
+(cik uint32, ticker S10) rows under state/, ~14 bytes per issuer. Loading is
+an np.load(mmap_mode="r") plus contiguous copies of the two columns, about a
+millisecond for the full SEC list; a lookup is one binary search over the CIK
+column (~14 probes for 10k issuers, about a microsecond) with no per-row
+Python objects kept alive.
+
+refresh() re-fetches the mapping with a conditional GET (ETag /
+Last-Modified) at most every REFRESH_HOURS; a 304 costs one request and no
+rewrite. A changed mapping is diffed against the current table, written to a
+temp file and swapped in atomically, so readers never see a partial index.
+SEC lists share classes of one CIK separately, primary class first; the
+first ticker per CIK is kept and dashes become dots (BRK-B -> BRK.B, Alpaca's
+spelling).
+
+    python -m bot.data.issuers refresh      # fetch / update state/issuers.npy
+    python -m bot.data.issuers bench        # load and resolve-the-feed timings
+"""
+import bisect, json, os, pathlib, threading, time
+import numpy as np
+
+SEC_BASE_URL = os.getenv("SEC_BASE_URL", "https://www.sec.gov")  # point at a local stand-in for tests
+TICKERS_PATH = "/files/company_tickers.json"
+INDEX_FILE = pathlib.Path(os.getenv("ISSUERS_FILE", "state/issuers.npy"))
+REFRESH_HOURS = float(os.getenv("ISSUERS_REFRESH_HOURS", "24"))
+TICKER_WIDTH = 10            # longest SEC ticker is 9 characters
+
+DTYPE = np.dtype([("cik", "<u4"), ("ticker", f"S{TICKER_WIDTH}")])
+
+
+def build(rows) -> np.ndarray:
+    """(cik, ticker) pairs -> sorted index table, first ticker per CIK kept."""
+    seen = {}
+    for cik, ticker in rows:
+        cik = int(cik)
+        if cik not in seen and ticker:
+            seen[cik] = ticker.strip().upper().replace("-", ".")
+    table = np.empty(len(seen), dtype=DTYPE)
+    table["cik"] = np.fromiter(seen.keys(), dtype=np.uint32, count=len(seen))
+    table["ticker"] = [t.encode()[:TICKER_WIDTH] for t in seen.values()]
+    table.sort(order="cik", kind="stable")
+    return table
+
+
+def parse_company_tickers(content: bytes) -> np.ndarray:
+    """company_tickers.json ({"0": {"cik_str", "ticker", "title"}, ...}) -> index table."""
+    data = json.loads(content)
+    rows = [data[k] for k in sorted(data, key=int)] if isinstance(data, dict) else data
+    return build((r["cik_str"], r["ticker"]) for r in rows)
+
+
+def _cik(cik) -> int | None:
+    try:
+        return int(cik)
+    except (TypeError, ValueError):
+        return None
+
+
+class IssuerIndex:
+    """Memory-mapped CIK -> ticker table with incremental refresh (thread-safe)."""
+
+    def __init__(self, path: pathlib.Path = INDEX_FILE):
+        self.path = pathlib.Path(path)
+        self.meta_path = self.path.with_suffix(".json")
+        self.meta = {}
+        self._lock = threading.Lock()
+        self._set(np.empty(0, dtype=DTYPE))
+
+    def _set(self, table: np.ndarray):
+        # one tuple, swapped in a single assignment, so lookups never mix two tables
+        ciks = np.ascontiguousarray(table["cik"], dtype=np.uint32)
+        self._table = (ciks, memoryview(ciks).cast("B").cast("I"), np.ascontiguousarray(table["ticker"]), table)
+
+    def load(self) -> "IssuerIndex":
+        """Map the cached table, if any; returns self."""
+        try:
+            table = np.load(self.path, mmap_mode="r")
+            self.meta = json.loads(self.meta_path.read_text()) if self.meta_path.exists() else {}
+        except (OSError, ValueError) as e:
+            if self.path.exists():
+                print("issuer index unreadable, will rebuild:", e)
+            return self
+        self._set(table)
+        return self
+
+    def __len__(self):
+        return len(self._table[0])
+
+    def ticker(self, cik) -> str | None:
+        """Ticker for a CIK (int or zero-padded string), None if unknown."""
+        cik = _cik(cik)
+        _, ciks, tickers, _ = self._table
+        if cik is None:
+            return None
+        # bisect over a memoryview: np.searchsorted's per-call setup costs more than the search
+        i = bisect.bisect_left(ciks, cik)
+        if i < len(ciks) and ciks[i] == cik:
+            return tickers[i].decode()
+        return None
+
+    def resolve_many(self, ciks) -> list[str | None]:
+        """Vectorized ticker() over many CIKs."""
+        keys = np.array([_cik(c) or 0 for c in ciks], dtype=np.int64)
+        ciks_, _, tickers, _ = self._table
+        if not len(ciks_):
+            return [None] * len(keys)
+        idx = np.minimum(ciks_.searchsorted(keys), len(ciks_) - 1)
+        hit = ciks_[idx] == keys
+        names = tickers[idx]
+        return [n.decode() if h else None for n, h in zip(names, hit)]
+
+    def stale(self) -> bool:
+        return time.time() - self.meta.get("fetched_at", 0) > REFRESH_HOURS * 3600
+
+    def save(self, table: np.ndarray, meta: dict):
+        """Write table + meta next to the live files and swap them in."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp, "wb") as f:
+            np.save(f, table)
+        os.replace(tmp, self.path)
+        tmp_meta = self.meta_path.with_name(self.meta_path.name + ".tmp")
+        tmp_meta.write_text(json.dumps(meta))
+        os.replace(tmp_meta, self.meta_path)
+        self.meta = meta
+        self._set(np.load(self.path, mmap_mode="r"))
+
+    def diff(self, table: np.ndarray) -> dict:
+        """Counts of CIKs added, removed and re-tickered by `table` vs the current one."""
+        old = self._table[3]
+        common, i_old, i_new = np.intersect1d(old["cik"], table["cik"], assume_unique=True,
+                                              return_indices=True)
+        return {"added": len(table) - len(common), "removed": len(old) - len(common),
+                "changed": int((old["ticker"][i_old] != table["ticker"][i_new]).sum())}
+
+    def refresh(self, force: bool = False) -> dict | None:
+        """Re-fetch the SEC mapping if stale (or forced); returns the diff, None if unchanged."""
+        with self._lock:
+            if not force and not self.stale():
+                return None
+            from bot.data.edgar_feed import _sec_get   # edgar_feed imports this module
+            headers = {}
+            if not force and len(self):
+                if self.meta.get("etag"):
+                    headers["If-None-Match"] = self.meta["etag"]
+                if self.meta.get("last_modified"):
+                    headers["If-Modified-Since"] = self.meta["last_modified"]
+            resp = _sec_get(SEC_BASE_URL + TICKERS_PATH, headers=headers, timeout=20)
+            meta = {"etag": resp.headers.get("ETag"), "last_modified": resp.headers.get("Last-Modified"),
+                    "fetched_at": time.time()}
+            if resp.status_code == 304:
+                meta = dict(self.meta, fetched_at=meta["fetched_at"])
+                self.meta_path.write_text(json.dumps(meta))
+                self.meta = meta
+                return None
+            resp.raise_for_status()
+            table = parse_company_tickers(resp.content)
+            changes = self.diff(table)
+            if not any(changes.values()) and len(self):
+                self.meta_path.write_text(json.dumps(meta))
+                self.meta = meta
+                return None
+            self.save(table, dict(meta, issuers=len(table)))
+            return changes
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def index() -> IssuerIndex:
+    """The process-wide index: the cached table, fetched once if there is none."""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = IssuerIndex().load()
+            if not len(_index):
+                try:
+                    _index.refresh(force=True)
+                except Exception as e:
+                    print("issuer index unavailable (CIK-only filings are skipped):", e)
+                    _index.meta["fetched_at"] = time.time()   # don't retry on every filing
+        return _index
+
+
+def resolve(cik) -> str | None:
+    return index().ticker(cik)
+
+
+def maybe_refresh():
+    """Refresh the process-wide index when it is older than REFRESH_HOURS; never raises."""
+    idx = index()
+    if not idx.stale():
+        return
+    try:
+        changes = idx.refresh()
+    except Exception as e:
+        print("issuer index refresh failed (keeping the cached one):", e)
+        idx.meta["fetched_at"] = time.time()
+        return
+    if changes:
+        print(f"Issuer index: {len(idx)} issuers, +{changes['added']} -{changes['removed']} "
+              f"~{changes['changed']}")
+
+
+def _bench(tickers: str | None, feeds):
+    """Load time, lookup cost and resolving a full feed page, on SEC's list or a synthetic one."""
+    import tempfile
+    from bot.data import edgar_feed
+    if tickers:
+        raw = open(tickers, "rb").read()
+    else:  # synthetic stand-in sized like SEC's list (~10k issuers, some multi-class)
+        rng = np.random.default_rng(1)
+        ciks = rng.choice(2_000_000, 10_500, replace=False)
+        raw = json.dumps({str(i): {"cik_str": int(c), "ticker": f"T{i:04d}" + ("-B" if i % 40 == 0 else ""),
+                                   "title": f"Co{i}"} for i, c in enumerate(ciks)}).encode()
+    t0 = time.perf_counter(); json.loads(raw); t_json = time.perf_counter() - t0
+    table = parse_company_tickers(raw)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        idx = IssuerIndex(pathlib.Path(tmp) / "issuers.npy")
+        idx.save(table, {"fetched_at": time.time()})
+        t0 = time.perf_counter(); idx = IssuerIndex(idx.path).load(); t_load = time.perf_counter() - t0
+        print(f"index      {len(idx)} issuers, {idx.path.stat().st_size / 1024:.0f} KB on disk; "
+              f"load {t_load * 1e3:.2f} ms (json.loads of the source: {t_json * 1e3:.1f} ms)")
+
+        known = table["cik"]
+        probe = np.concatenate([known, np.arange(1, len(known) // 4) * 7 + 3_000_000])
+        t0 = time.perf_counter(); hits = sum(idx.ticker(int(c)) is not None for c in probe)
+        t_one = time.perf_counter() - t0
+        t0 = time.perf_counter(); idx.resolve_many(probe); t_many = time.perf_counter() - t0
+        print(f"lookups    {len(probe)} CIKs ({hits} known): ticker() {t_one / len(probe) * 1e6:.2f} µs each, "
+              f"resolve_many {t_many / len(probe) * 1e9:.0f} ns each")
+
+        if feeds:
+            docs = [open(p, "rb").read() for p in feeds]
+        else:  # a full feed page of Form 4s whose titles carry only name + CIK
+            rows = "".join(
+                f'<entry><title>4 - Co{i} ({int(known[i * 7 % len(known)]) if i % 10 else 9_999_999:010d}) '
+                f'(Issuer)</title>'
+                f'<link rel="alternate" type="text/html" href="https://www.sec.gov/x/{i}-index.htm"/>'
+                f'<updated>2024-01-02T16:{i % 60:02d}:00-05:00</updated>'
+                f'<id>urn:tag:sec.gov,2008:accession-number=0000000000-24-{i:06d}</id></entry>'
+                for i in range(5_000))
+            docs = [f'<?xml version="1.0" encoding="ISO-8859-1" ?><feed xmlns="http://www.w3.org/2005/Atom">'
+                    f'{rows}</feed>'.encode()]
+        edgar_feed.issuers._index = idx
+        entries = sum(1 for d in docs for _ in edgar_feed.iter_entries(d))
+        t0 = time.perf_counter(); n = sum(1 for d in docs for _ in edgar_feed.parse_filings(d))
+        dt = time.perf_counter() - t0
+        st = edgar_feed.feed_stats()
+        print(f"feed       {entries} entries -> {n} filings ({st['cik_resolved']} via CIK) "
+              f"in {dt * 1e3:.1f} ms")
+
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="Maintain or benchmark the CIK -> ticker index.")
+    ap.add_argument("cmd", choices=("refresh", "bench"))
+    ap.add_argument("--tickers", help="bench: a company_tickers.json to use instead of a synthetic one")
+    ap.add_argument("--feeds", nargs="*", default=(), help="bench: recorded feed XML to resolve")
+    args = ap.parse_args()
+
+    if args.cmd == "refresh":
+        idx = IssuerIndex().load()
+        print(idx.refresh(force=True) or "unchanged", f"({len(idx)} issuers in {idx.path})")
+    else:
+        _bench(args.tickers, args.feeds)
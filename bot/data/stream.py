@@ -0,0 +1,271 @@
+# bot/data/stream.py
+"""
+Real-time trades and quotes over Alpaca's market-data WebSocket (JSON
+protocol), plus a local stand-in server that replays recorded ticks.
+
+    stream = TickStream()
+    await stream.subscribe(["AAPL", "MSFT"])
+    async for tick in stream.ticks():      # Trade(.price) / Quote(.bidprice, .askprice)
+        ...
+
+ticks() reconnects with exponential backoff and re-subscribes every symbol;
+subscribe()/unsubscribe() may be called from other tasks while it runs.
+With `record=path` every raw message is appended to a JSONL file as
+{"at": <unix seconds>, "msg": {...}}, which is what the replay server reads:
+
+    python -m bot.data.stream record ticks.jsonl AAPL MSFT     # live, needs ALPACA_* keys
+    python -m bot.data.stream replay ticks.jsonl --speed 10    # ws://127.0.0.1:8765
+    ALPACA_STREAM_URL=ws://127.0.0.1:8765 python -m bot run --mode stream
+"""
+import argparse, asyncio, json, os, time
+import websockets
+from dotenv import load_dotenv
+
+load_dotenv()
+
+STREAM_URL = os.getenv("ALPACA_STREAM_URL", "wss://stream.data.alpaca.markets/v2/iex")
+REPLAY_PORT = 8765
+RECONNECT_MAX_S = 30
+PRICE_MAX_AGE = 30   # seconds a streamed last price stands in for a REST lookup
+
+
+class StreamAuthError(Exception):
+    """The stream rejected our credentials (not retried)."""
+
+
+class Trade:
+    """Last-sale tick; .price matches the REST latest-trade entity."""
+    __slots__ = ("symbol", "price", "size", "t")
+
+    def __init__(self, symbol: str, price: float, size: float, t: str):
+        self.symbol, self.price, self.size, self.t = symbol, price, size, t
+
+    def __repr__(self):
+        return f"Trade({self.symbol!r}, {self.price}, size={self.size})"
+
+
+class Quote:
+    """NBBO tick; .bidprice/.askprice match the REST latest-quote entity."""
+    __slots__ = ("symbol", "bidprice", "askprice", "bidsize", "asksize", "t")
+
+    def __init__(self, symbol: str, bidprice: float, askprice: float, bidsize: float, asksize: float, t: str):
+        self.symbol, self.bidprice, self.askprice = symbol, bidprice, askprice
+        self.bidsize, self.asksize, self.t = bidsize, asksize, t
+
+    def __repr__(self):
+        return f"Quote({self.symbol!r}, {self.bidprice}x{self.askprice})"
+
+
+class LastPrices:
+    """symbol -> last streamed trade price; entries older than `max_age` seconds don't count.
+
+    A quiet symbol, or one whose ticks stopped with a dropped connection, falls
+    out of fresh() instead of being priced from a tick that may be minutes old.
+    """
+    __slots__ = ("max_age", "_prices")
+
+    def __init__(self, max_age: float = PRICE_MAX_AGE):
+        self.max_age = max_age
+        self._prices = {}   # symbol -> (price, monotonic receive time)
+
+    def update(self, symbol: str, price: float):
+        self._prices[symbol] = (price, time.monotonic())
+
+    def fresh(self) -> dict:
+        """{symbol: price} of every price received within max_age."""
+        cutoff = time.monotonic() - self.max_age
+        return {s: p for s, (p, at) in self._prices.items() if at >= cutoff}
+
+    def discard(self, symbol: str):
+        self._prices.pop(symbol, None)
+
+
+def parse_message(m: dict) -> Trade | Quote | None:
+    if m.get("T") == "t":
+        return Trade(m["S"], m["p"], m.get("s", 0), m.get("t"))
+    if m.get("T") == "q":
+        return Quote(m["S"], m["bp"], m["ap"], m.get("bs", 0), m.get("as", 0), m.get("t"))
+    return None
+
+
+class TickStream:
+    """Trades and quotes for a changing symbol set, over one reconnecting WebSocket."""
+
+    def __init__(self, url: str = STREAM_URL, key: str | None = None, secret: str | None = None,
+                 record: str | None = None):
+        self.url = url
+        self.key = key or os.getenv("ALPACA_KEY_ID")
+        self.secret = secret or os.getenv("ALPACA_SECRET_KEY")
+        self.symbols: set[str] = set()
+        self.record = record
+        self.messages = 0
+        self.reconnects = 0
+        self._ws = None
+        self._closed = False
+
+    async def _send(self, action: str, symbols):
+        if self._ws is not None and symbols:
+            syms = sorted(symbols)
+            try:
+                await self._ws.send(json.dumps({"action": action, "trades": syms, "quotes": syms}))
+            except websockets.ConnectionClosed:
+                pass   # ticks() re-subscribes self.symbols after reconnecting
+
+    async def subscribe(self, symbols):
+        new = set(symbols) - self.symbols
+        self.symbols |= new
+        await self._send("subscribe", new)
+
+    async def unsubscribe(self, symbols):
+        gone = set(symbols) & self.symbols
+        self.symbols -= gone
+        await self._send("unsubscribe", gone)
+
+    async def _connect(self):
+        ws = await websockets.connect(self.url, max_size=None)
+        json.loads(await ws.recv())   # [{"T": "success", "msg": "connected"}]
+        await ws.send(json.dumps({"action": "auth", "key": self.key, "secret": self.secret}))
+        for m in json.loads(await ws.recv()):
+            if m.get("T") == "error":
+                await ws.close()
+                raise StreamAuthError(f"stream auth failed: {m.get('msg')}")
+        self._ws = ws
+        await self._send("subscribe", self.symbols)
+
+    async def ticks(self):
+        """Yield Trade / Quote objects until close(), reconnecting on failure."""
+        backoff = 1.0
+        rec = open(self.record, "a") if self.record else None
+        try:
+            while not self._closed:
+                try:
+                    await self._connect()
+                    backoff = 1.0
+                    async for raw in self._ws:
+                        now = time.time()
+                        for m in json.loads(raw):
+                            self.messages += 1
+                            if rec is not None:
+                                rec.write(json.dumps({"at": now, "msg": m}) + "\n")
+                            tick = parse_message(m)
+                            if tick is not None:
+                                yield tick
+                            elif m.get("T") == "error":
+                                print("stream error:", m.get("msg"))
+                except (OSError, websockets.WebSocketException) as e:
+                    if self._closed:
+                        break
+                    print(f"stream disconnected ({e}); reconnecting in {backoff:.0f}s")
+                finally:
+                    self._ws = None
+                if not self._closed:
+                    self.reconnects += 1
+                    await asyncio.sleep(backoff)
+                    backoff = min(backoff * 2, RECONNECT_MAX_S)
+        finally:
+            if rec is not None:
+                rec.close()
+
+    async def close(self):
+        self._closed = True
+        if self._ws is not None:
+            await self._ws.close()
+
+
+# ---------------- local stand-in ---------------------------------------------
+
+def load_recording(path) -> list[tuple[float, list]]:
+    """Recorded JSONL -> [(at, [msg, ...]), ...], messages that arrived together grouped."""
+    frames = []
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            r = json.loads(line)
+            if frames and frames[-1][0] == r["at"]:
+                frames[-1][1].append(r["msg"])
+            else:
+                frames.append((r["at"], [r["msg"]]))
+    return frames
+
+
+async def replay_server(path, host: str = "127.0.0.1", port: int = REPLAY_PORT, speed: float = 1.0):
+    """Serve a recording over the stream protocol; each connection replays it from the start.
+
+    Any credentials are accepted. Replay starts with the first subscription; only ticks for symbols the client has
+    subscribed to ("*" = all) are sent, paced by their recorded spacing / speed.
+    """
+    frames = load_recording(path)
+
+    async def session(ws, *_):
+        subs = set()
+        subscribed = asyncio.Event()
+
+        async def control():
+            try:
+                async for raw in ws:
+                    m = json.loads(raw)
+                    action = m.get("action")
+                    if action == "auth":
+                        await ws.send(json.dumps([{"T": "success", "msg": "authenticated"}]))
+                    elif action in ("subscribe", "unsubscribe"):
+                        syms = set(m.get("trades", ())) | set(m.get("quotes", ()))
+                        if action == "subscribe":
+                            subs.update(syms)
+                        else:
+                            subs.difference_update(syms)
+                        await ws.send(json.dumps([{"T": "subscription", "trades": sorted(subs),
+                                                   "quotes": sorted(subs), "bars": []}]))
+                        subscribed.set()
+            finally:
+                subscribed.set()   # client gone: let the replay loop notice and stop
+
+        await ws.send(json.dumps([{"T": "success", "msg": "connected"}]))
+        ctl = asyncio.create_task(control())
+        try:
+            await subscribed.wait()   # the replay clock starts at the first subscription
+            t0, start = (frames[0][0] if frames else 0.0), time.monotonic()
+            for at, msgs in frames:
+                if ctl.done():
+                    break
+                delay = (at - t0) / speed - (time.monotonic() - start)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                out = [m for m in msgs if "*" in subs or m.get("S") in subs]
+                if out:
+                    await ws.send(json.dumps(out))
+            await ctl   # recording done: stay connected until the client leaves
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            ctl.cancel()
+
+    async with websockets.serve(session, host, port):
+        print(f"Replaying {len(frames)} frames from {path} on ws://{host}:{port} ({speed}x)")
+        await asyncio.Future()
+
+
+async def _record(path, symbols):
+    stream = TickStream(record=path)
+    await stream.subscribe(symbols)
+    n = 0
+    async for _ in stream.ticks():
+        n += 1
+        if n % 1000 == 0:
+            print(f"{n} ticks recorded")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Record live ticks or replay a recording locally.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    r = sub.add_parser("record"); r.add_argument("path"); r.add_argument("symbols", nargs="+")
+    p = sub.add_parser("replay"); p.add_argument("path")
+    p.add_argument("--port", type=int, default=REPLAY_PORT); p.add_argument("--speed", type=float, default=1.0)
+    args = ap.parse_args()
+    try:
+        if args.cmd == "record":
+            asyncio.run(_record(args.path, args.symbols))
+        else:
+            asyncio.run(replay_server(args.path, port=args.port, speed=args.speed))
+    except KeyboardInterrupt:
+        pass
@@ -1,75 +1,478 @@
 # bot/main.py
-import time, hashlib, datetime as dt
-from bot.brokers.alpaca import AlpacaBroker
-from bot.data.edgar_feed import latest_filings
-from bot.strategies import insider_simple, momentum
+import asyncio, os, time, hashlib, threading, datetime as dt
+from collections import OrderedDict
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, wait
+from bot.brokers.alpaca import AlpacaBroker, RequestScheduler, PRIORITY_EXIT, QUOTE_TTL, RATE_LIMIT_PER_MIN
+from bot.data.edgar_feed import latest_filings, feed_stats
+from bot.data.form4 import enrich
+from bot.strategies import insider_simple, momentum, pipeline, snapshots
 from bot.utils.logger import log_trade, log_close
 from bot.utils.state import load_seen, save_seen
-from bot.utils.positions import load_open, add_position, remove_position
-from bot.risk.exit import should_exit
+from bot.utils.positions import get_book
+from bot.utils.trade_history import get_index
+from bot.utils.journal import get_journal
+from bot.risk.exit import exits_batch, ExitWatcher
+from bot.risk import protect
+from bot.utils import metrics
+from bot.utils.metrics import span
+from bot.workers import WORKERS, WorkerPool
 
-# ---------------- startup ----------------------------------------------------
-broker = AlpacaBroker(paper=True)
-print("Account equity:", broker.account_info().equity)
+STRATEGIES = (insider_simple, momentum)
+EVAL_WORKERS = int(os.getenv("EVAL_WORKERS", "8"))  # 1 = evaluate sequentially
+BROKER = os.getenv("BROKER", "alpaca")               # "alpaca" or "sim" (load testing)
+SIM_FILINGS = int(os.getenv("SIM_FILINGS", "0"))     # sim only: synthetic filings per cycle
+POLL_SECONDS = int(os.getenv("POLL_SECONDS", "180"))
+RUN_MODE = os.getenv("RUN_MODE", "poll")             # "poll", or "stream": tick-driven exits
+STREAM_CANDIDATES = 200     # stream mode: recent filing symbols kept subscribed besides the book
+TIME_EXIT_SECONDS = 60      # stream mode: how often quiet positions are checked for TIME exits
+
+_symbol_locks = defaultdict(threading.Lock)  # serializes order submission per symbol
+_locks_guard = threading.Lock()
+
+
+def _symbol_lock(symbol: str) -> threading.Lock:
+    with _locks_guard:
+        return _symbol_locks[symbol]
 
-seen = load_seen()
-print(f"Loaded {len(seen)} previously-seen filings")
 
-print("Bot started — polling every 3 min")
-# ---------------------------------------------------------------------------
+def _evaluate(strat, filing, fetched_at: float):
+    """Run one strategy on one filing, submit its order, then snapshot its features (worker thread)."""
+    traded = _trade(strat, filing, fetched_at)
+    if not DRY_RUN:
+        snapshots.record(strat, filing, broker, traded)   # after the order: never delays it
 
-while True:
+
+def _trade(strat, filing, fetched_at: float) -> bool:
+    """decide_trade and, on a signal, submit and book the order; True if it was placed."""
+    name = strat.__name__.rsplit(".", 1)[-1]
     try:
-        # ---------- 1. Check for new filings & open entries  ----------
-        for filing in latest_filings():
-            fid = hashlib.sha1(filing["link"].encode()).hexdigest()
-            if fid in seen:
-                continue
-            seen.add(fid); save_seen(seen)
-            # Run all strategies; each strategy exposes decide_trade(filing, broker)
-            for strat in (insider_simple, momentum):
-                try:
-                    order = strat.decide_trade(filing, broker)
-                except Exception as e:
-                    print(f"strategy {strat.__name__} error:", e)
-                    order = None
-
-                if not order:
-                    continue
-
-                try:
-                    resp = broker.submit_buy_market(order["symbol"], order["qty"])
-                    log_trade(filing, resp)
-                    add_position({
-                        "symbol": order["symbol"],
-                        "qty": order["qty"],
-                        "entry_price": order["entry_price"],
-                        "entry_time": dt.datetime.utcnow()
-                    })
-                    print(f"BUY {order['symbol']} {order['qty']} @ {order['entry_price']} by {strat.__name__}")
-                except Exception as e:
-                    print("order failed:", e)
-
-        # ---------- 2. Check exits for every open position  ----------
-        for pos in load_open():
-            cur_price = broker.current_price(pos["symbol"])
-            reason = should_exit(pos["entry_price"], cur_price, pos["entry_time"])
-            if reason:
-                try:
-                    broker.submit_sell_market(pos["symbol"], pos["qty"])
-                    log_close(pos, cur_price, reason)
-                    remove_position(pos["symbol"])
-                    print(f"EXIT {pos['symbol']} via {reason} @ {cur_price}")
-                except Exception as e:
-                    print("exit failed:", e)
-
-        # ---------- 3. Sleep until next cycle  ----------
-        print("Polling cycle complete — sleeping")
-        time.sleep(180)       # 3-minute poll
-
-    except KeyboardInterrupt:
-        print("Manual stop — goodbye")
-        break
+        with span("decide_trade", strategy=name):
+            order = strat.decide_trade(filing, broker)
     except Exception as e:
-        print("loop error:", e)
-        time.sleep(60)
+        print(f"strategy {strat.__name__} error:", e)
+        return False
+    if not order:
+        return False
+    return _place(strat, filing, order, fetched_at)
+
+
+def _place(strat, filing, order: dict, fetched_at: float) -> bool:
+    """Submit and book a strategy's order; True if it was placed."""
+    name = strat.__name__.rsplit(".", 1)[-1]
+    if DRY_RUN:
+        print(f"DRY RUN: would BUY {order['symbol']} {order['qty']} @ {order['entry_price']} by {strat.__name__}")
+        return False
+
+    with _symbol_lock(order["symbol"]):
+        try:
+            resp, exit_ids = protect.submit_entry(broker, order["symbol"], order["qty"], order["entry_price"])
+        except Exception as e:
+            print("order failed:", e)
+            return False
+        metrics.observe("bot_order_latency_seconds", time.monotonic() - fetched_at, strategy=name)
+        if isinstance(filing.get("filed_at"), dt.datetime):
+            lag = (dt.datetime.utcnow() - filing["filed_at"]).total_seconds()
+            metrics.observe("bot_signal_latency_seconds", max(0.0, lag), strategy=name)
+        qty = order["qty"]
+        if getattr(resp, "status", None) == "partially_filled":
+            qty = int(float(resp.filled_qty))
+        try:
+            log_trade(filing, resp)
+            pos = book.add({
+                "symbol": order["symbol"],
+                "qty": qty,
+                "entry_price": order["entry_price"],
+                "entry_time": dt.datetime.utcnow(),
+                "exit_orders": exit_ids,
+            })
+            print(f"BUY {order['symbol']} {qty} @ {order['entry_price']} by {strat.__name__}")
+            # the trail needs the shares: armed here (under the symbol lock) if the buy
+            # filled at once, else by protect.reconcile once the broker holds them
+            if protect.EXIT_ORDERS == "trailing" and getattr(resp, "status", None) == "filled":
+                protect.arm(broker, book, pos, qty)
+        except Exception as e:
+            print("order bookkeeping failed:", e)
+    return True
+
+
+def _close(pos, cur_price: float, reason: str) -> bool:
+    """Sell a position and book the close (exit-priority broker calls)."""
+    if DRY_RUN:
+        print(f"DRY RUN: would EXIT {pos['symbol']} via {reason} @ {cur_price}")
+        return False
+    with _symbol_lock(pos["symbol"]), broker.priority(PRIORITY_EXIT):
+        try:
+            broker.submit_sell_market(pos["symbol"], pos["qty"])
+            log_close(pos, cur_price, reason)
+            book.remove(pos["symbol"])
+            print(f"EXIT {pos['symbol']} via {reason} @ {cur_price}")
+            return True
+        except Exception as e:
+            print("exit failed:", e)
+            return False
+
+
+def _exit_pass():
+    """Check exits for every open position (own thread, exit-priority broker calls).
+
+    Runs alongside the entry evaluations so a filing burst can't delay it: its
+    REST calls jump the broker scheduler's queue.
+    """
+    with span("exit_pass"), broker.priority(PRIORITY_EXIT):
+        due = []
+        if protect.enabled() and not DRY_RUN:
+            # stops / take-profits are resting orders: book their fills, then only
+            # MAX_DAYS (and positions the broker wouldn't protect) is polled here
+            protect.reconcile(broker, book, _symbol_lock)
+            due = protect.time_exits(broker, book)
+        # one bulk latest-trades lookup, then one vectorized pass over the book
+        local = [p for p in book.positions() if not p.exit_orders and p not in due]
+        prices = broker.latest_prices(p["symbol"] for p in local + due)
+        for pos, cur_price, reason in exits_batch(local, prices):
+            _close(pos, cur_price, reason)
+        for pos in due:
+            if prices.get(pos["symbol"]) is not None:
+                _close(pos, prices[pos["symbol"]], "TIME")
+
+
+def _is_seen(filing: dict, fid: str) -> bool:
+    """fid is in the seen-set, or one of the filing's entries is under its legacy key.
+
+    Older releases keyed each feed entry by sha1(link); a legacy hit records
+    fid so the filing is not traded again. Legacy rows age out with retention.
+    """
+    if fid in seen:
+        return True
+    links = filing.get("links") or [filing.get("link", "")]
+    if not any(hashlib.sha1(link.encode()).hexdigest() in seen for link in links):
+        return False
+    if not DRY_RUN:
+        seen.add(fid)
+    return True
+
+
+def _entry_pass() -> list:
+    """Fetch new filings, enrich them and fan (filing, strategy) pairs out to the pool.
+
+    seen-set bookkeeping stays on this thread; orders are serialized per
+    symbol. Returns the new filings.
+    """
+    global cycle
+    jobs = []
+    fresh = []
+    cycle += 1
+    pipeline.new_cycle()   # strategies share per-symbol features within a cycle
+    synthetic = BROKER == "sim" and SIM_FILINGS > 0
+    if synthetic:
+        from bot.brokers.sim import synthetic_filings
+        feed = synthetic_filings(SIM_FILINGS, seed=cycle, run=run_id)
+    else:
+        feed = latest_filings()
+    with span("feed"):
+        for filing in feed:
+            # one event per (accession, ticker); copies of a Form 4 share the accession
+            key = f"{filing.get('accession') or filing['link']}|{filing['ticker']}"
+            fid = hashlib.sha1(key.encode()).hexdigest()
+            if _is_seen(filing, fid):
+                continue
+            if not DRY_RUN:   # a dry run leaves them to be traded for real later
+                seen.add(fid); save_seen(seen)
+            fresh.append((filing, time.monotonic()))
+
+    # fill transaction type / shares / officer role from the Form 4 XML
+    with span("enrich"):
+        enrich(f for f, _ in fresh)
+
+    with span("evaluate"):
+        if workers:   # each filing goes to the process owning its symbol
+            workers.new_cycle()
+            for filing, fetched_at in fresh:
+                workers.submit(filing, fetched_at)
+            workers.wait()
+        else:
+            for filing, fetched_at in fresh:
+                # Run all strategies; each strategy exposes decide_trade(filing, broker)
+                for strat in STRATEGIES:
+                    jobs.append(pool.submit(_evaluate, strat, filing, fetched_at))
+            wait(jobs)
+    if synthetic:
+        print(f"Synthetic feed: {len(fresh)} new filings")
+    else:
+        fs = feed_stats()
+        pages = "not modified" if fs["not_modified"] else f"{fs['pages']} page(s)"
+        print(f"EDGAR feed: {pages}, {fs['bytes'] / 1024:.1f} KB, "
+              f"parse {fs['parse_s'] * 1e3:.1f} ms, {fs['entries']} new entries "
+              f"({fs['cik_resolved']} resolved by CIK)")
+
+    filed = {r["labels"]["strategy"]: r for r in metrics.cycle_summary("bot_signal_latency_seconds")}
+    for r in metrics.cycle_summary("bot_order_latency_seconds"):
+        strategy, f = r["labels"]["strategy"], filed.get(r["labels"]["strategy"])
+        print(f"Filing→order latency [{strategy}]: {r['n']} orders, fetch→order "
+              f"median {r['p50']:.2f}s, p99 {r['p99']:.2f}s"
+              + (f"; filed→order median {f['p50']:.1f}s, p99 {f['p99']:.1f}s" if f else ""))
+    return [f for f, _ in fresh]
+
+
+def _report():
+    """Per-cycle filter, scheduler, cache and span summaries."""
+    if workers:
+        ws = workers.stats(reset=True)
+        print("Strategy filters (evals, pass rate, mean cost):", pipeline.format_stats(ws["filters"]))
+        print(f"Strategy workers: {ws['workers']} processes, {sum(ws['filings'])} filings "
+              f"({min(ws['filings'])}–{max(ws['filings'])} per shard), dispatcher blocked "
+              f"{ws['blocked']}× ({ws['blocked_s']:.2f}s) on full queues")
+    else:
+        print("Strategy filters (evals, pass rate, mean cost):",
+              pipeline.format_stats(pipeline.stats(reset=True)))
+    ss = broker.scheduler_stats(reset=True)
+    print("Broker scheduler: " + ", ".join(
+        f"{name} {st['calls']} calls/{st['delayed']} waited/max {st['wait_max']:.2f}s"
+        for name, st in ss.items() if st["calls"]))
+    cs = broker.cache_stats(reset=True)
+    print(f"Market-data cache: {cs['hits']} hits, {cs['coalesced']} coalesced, "
+          f"{cs['misses']} misses — saved {cs['hits'] + cs['coalesced']} REST calls")
+    if BROKER == "sim":
+        ss = broker.sim_stats()
+        print(f"Sim broker: {sum(ss['calls'].values())} calls, {ss['errors']} errors, "
+              f"{ss['throttled']} throttled, {ss['orders']} orders")
+    print("Cycle spans (n× p50/p95/p99):", metrics.format_summary(metrics.cycle_summary()))
+
+
+async def _run_stream():
+    """Event-driven mode: exits fire on the tick that crosses a level.
+
+    Trades and quotes for every open position and the most recent filing
+    symbols arrive over one WebSocket. Each trade is checked against the
+    position's precomputed stop / take-profit levels and also lands in the
+    broker's market-data cache and its IntradayBook, so strategies price and
+    gate (spread, volatility) candidates without REST.
+    Filings are still polled every POLL_SECONDS (EDGAR has no push feed);
+    TIME exits of quiet symbols are checked every TIME_EXIT_SECONDS from the
+    last streamed prices (REST for any older than stream.PRICE_MAX_AGE), together with reconciling server-side exit orders
+    (bot.risk.protect) when EXIT_ORDERS asks for them.
+    """
+    from bot.data.intraday import IntradayBook
+    from bot.data.stream import LastPrices, TickStream, Trade
+    stream = TickStream(record=os.getenv("STREAM_RECORD") or None)
+    broker.intraday = intraday = IntradayBook()   # spread / volatility gates read from here
+    watcher = ExitWatcher()
+    candidates = OrderedDict()   # recent filing symbols, oldest first
+    last = LastPrices()          # symbol -> last streamed trade price, aged out after PRICE_MAX_AGE
+    exiting = set()
+    tasks = set()                # in-flight exit tasks (held so they aren't collected)
+
+    def watch():
+        # positions with resting exit orders only need the TIME rule
+        watcher.sync([p for p in book.positions() if not p.exit_orders])
+
+    async def resubscribe():
+        watch()
+        held = {p["symbol"] for p in book.positions()}
+        while len(candidates) > STREAM_CANDIDATES:
+            candidates.popitem(last=False)
+        wanted = held | set(candidates)
+        for symbol in stream.symbols - wanted:
+            intraday.drop(symbol)
+            last.discard(symbol)
+        await stream.unsubscribe(stream.symbols - wanted)
+        await stream.subscribe(wanted)
+
+    async def exit_now(pos, price, reason, seen_at):
+        symbol = pos["symbol"]
+        exiting.add(symbol)
+        try:
+            if await asyncio.to_thread(_close, pos, price, reason):
+                metrics.observe("bot_exit_reaction_seconds", time.monotonic() - seen_at, reason=reason)
+                await resubscribe()
+            else:
+                watch()   # still held: watch it again
+        finally:
+            exiting.discard(symbol)
+
+    async def on_ticks():
+        async for tick in stream.ticks():
+            if isinstance(tick, Trade):
+                intraday.on_trade(tick.symbol, tick.price, tick.size, tick.t)
+                last.update(tick.symbol, tick.price)
+                broker.cache.put(("trade", tick.symbol), QUOTE_TTL, tick)
+                hit = watcher.check(tick.symbol, tick.price)
+                if hit and tick.symbol not in exiting:
+                    watcher.discard(tick.symbol)
+                    task = asyncio.create_task(exit_now(hit[0], tick.price, hit[1], time.monotonic()))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+            else:
+                intraday.on_quote(tick.symbol, tick.bidprice, tick.askprice)
+                broker.cache.put(("quote", tick.symbol), QUOTE_TTL, tick)
+
+    async def filings():
+        while True:
+            try:
+                for f in await asyncio.to_thread(_entry_pass):
+                    if f.get("ticker"):
+                        candidates[f["ticker"]] = None
+                        candidates.move_to_end(f["ticker"])
+                await resubscribe()
+                _report()
+                print(f"Stream: {len(stream.symbols)} symbols, {stream.messages} messages, "
+                      f"{stream.reconnects} reconnects, intraday buffers {intraday.nbytes() / 1024:.0f} KB"
+                      f" — next filings poll in {POLL_SECONDS}s")
+            except Exception as e:
+                print("loop error:", e)
+            await asyncio.sleep(POLL_SECONDS)
+
+    async def time_exit_pass():
+        due = []
+        if protect.enabled():
+            await asyncio.to_thread(protect.reconcile, broker, book, _symbol_lock)
+            due = await asyncio.to_thread(protect.time_exits, broker, book)
+            await resubscribe()
+        open_pos = [p for p in book.positions()
+                    if p["symbol"] not in exiting and not p.exit_orders and p not in due]
+        prices = last.fresh()
+        missing = [p["symbol"] for p in open_pos + due if p["symbol"] not in prices]
+        if missing:   # no recent tick (quiet, or lost to a reconnect): one bulk REST lookup
+            prices.update(await asyncio.to_thread(broker.latest_prices, missing))
+        exits = exits_batch(open_pos, prices) + [(p, prices[p["symbol"]], "TIME")
+                                                 for p in due if prices.get(p["symbol"]) is not None]
+        for pos, cur_price, reason in exits:
+            watcher.discard(pos["symbol"])
+            await exit_now(pos, cur_price, reason, time.monotonic())
+
+    async def time_exits():
+        while True:
+            await asyncio.sleep(TIME_EXIT_SECONDS)
+            try:
+                await time_exit_pass()
+            except Exception as e:
+                print("time-exit error:", e)
+
+    await resubscribe()
+    try:
+        await asyncio.gather(on_ticks(), filings(), time_exits())
+    finally:
+        await stream.close()
+
+
+# ---------------- startup ----------------------------------------------------
+# Nothing above touches the network or the disk; start() builds the broker and
+# loads state, so importing this module (tools, tests, the CLI) stays cheap.
+broker = book = seen = pool = exit_pool = workers = None
+cycle = 0
+run_id = None
+DRY_RUN = False     # evaluate and print orders / exits without submitting or recording them
+
+
+def new_broker(per_minute: int | None = None):
+    """A BROKER broker; `per_minute` overrides its REST quota (a share of it, with WORKERS)."""
+    if BROKER == "sim":
+        # all state/ and logs/ paths are relative: run load tests from a scratch directory
+        import dataclasses
+        from bot.brokers.sim import SimBroker, SimConfig
+        cfg = SimConfig.from_env()
+        if per_minute is not None and cfg.rate_limit_per_min:
+            cfg = dataclasses.replace(cfg, rate_limit_per_min=max(1, per_minute))
+        return SimBroker(cfg)
+    if per_minute is None:
+        return AlpacaBroker(paper=True)
+    return AlpacaBroker(paper=True, scheduler=RequestScheduler(per_minute))
+
+
+def _place_async(name: str, filing, order: dict, fetched_at: float):
+    # WorkerPool callback: a worker's order, placed on the eval pool
+    strat = next(s for s in STRATEGIES if s.__name__ == name)
+    return pool.submit(_place, strat, filing, order, fetched_at)
+
+
+def start(dry_run: bool = False, n_workers: int = WORKERS):
+    """Build the broker, load persisted state and start the worker pools and metrics.
+
+    With n_workers > 0, strategies run in that many symbol-sharded processes
+    (bot.workers) and this process coordinates: feed, seen-set, book, orders
+    and exits. The REST quota is split evenly between all of them.
+    """
+    global broker, book, seen, pool, exit_pool, workers, run_id, DRY_RUN
+    DRY_RUN = dry_run
+    metrics.describe("bot_span_seconds", "Wall time of instrumented spans (feed, strategies, filters, broker calls, exits).")
+    metrics.describe("bot_order_latency_seconds", "Filing fetched from the feed -> order submitted.")
+    metrics.describe("bot_signal_latency_seconds", "Filing filed_at (EDGAR timestamp) -> order submitted.")
+    metrics.describe("bot_broker_wait_seconds", "Time a broker REST call waited on the request scheduler's token bucket.")
+    metrics.describe("bot_exit_reaction_seconds", "Stream mode: exit-triggering tick received -> sell submitted and booked.")
+    metrics.describe("bot_broker_queue_depth", "Broker REST calls currently queued for a token, by priority class.")
+    if metrics.serve():
+        print(f"Metrics on http://127.0.0.1:{metrics.METRICS_PORT}/metrics")
+    pool = ThreadPoolExecutor(max_workers=max(1, EVAL_WORKERS), thread_name_prefix="eval")
+    exit_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="exits")
+    share = RATE_LIMIT_PER_MIN // (n_workers + 1) if n_workers > 0 and RATE_LIMIT_PER_MIN else None
+    broker = new_broker(share)
+    print("Account equity:", broker.account_info().equity)
+
+    seen = load_seen()
+    print(f"Loaded {len(seen)} previously-seen filings")
+
+    book = get_book()
+    print(f"Loaded {len(book)} open positions")
+
+    print(f"Indexed closed-trade history for {len(get_index())} symbols")
+
+    if n_workers > 0:
+        record = not DRY_RUN and snapshots.RECORD_FEATURES > 0
+        workers = WorkerPool(n_workers, _place_async, get_journal("features").append if record else None,
+                             broker_kind=BROKER, per_minute=share or 0)
+        workers.start()
+        get_index().subscribe(workers.forward_close)   # closes booked here reach the owning shard
+
+    print(f"Bot started ({BROKER}, {RUN_MODE} mode{', dry run' if DRY_RUN else ''}) — polling filings every "
+          f"{POLL_SECONDS}s, " + (f"{n_workers} strategy worker processes" if workers
+                                  else f"{max(1, EVAL_WORKERS)} evaluation workers"))
+    run_id = dt.datetime.utcnow().strftime("%Y%m%d%H%M%S")
+
+
+def stop():
+    if workers:
+        workers.stop()
+    pool.shutdown(cancel_futures=True)
+    exit_pool.shutdown(cancel_futures=True)
+
+
+def run_cycle():
+    """One poll cycle: exits (concurrently) and new filings, then the report."""
+    # ---------- 1. Check exits for every open position (concurrently)  ----------
+    exits = exit_pool.submit(_exit_pass)
+
+    # ---------- 2. Check for new filings & open entries  ----------
+    _entry_pass()
+    exits.result()
+    _report()
+
+
+def run():
+    """Run until interrupted, in RUN_MODE."""
+    if RUN_MODE == "stream":
+        try:
+            asyncio.run(_run_stream())
+        except KeyboardInterrupt:
+            print("Manual stop — goodbye")
+            stop()
+        return
+    while True:
+        try:
+            run_cycle()
+
+            # ---------- 3. Sleep until next cycle  ----------
+            print("Polling cycle complete — sleeping")
+            time.sleep(POLL_SECONDS)       # 3-minute poll by default
+
+        except KeyboardInterrupt:
+            print("Manual stop — goodbye")
+            stop()
+            break
+        except Exception as e:
+            print("loop error:", e)
+            time.sleep(60)
+
+
+if __name__ == "__main__":
+    start()
+    run()
@@ -1,15 +1,84 @@
 # bot/risk/exit.py
 from datetime import datetime, timedelta
+import numpy as np
 
 STOP_PCT   = 0.10   # sell if –10 %
 PROFIT_PCT = 0.15   # sell if +15 %
 MAX_DAYS   = 30     # sell after 30 days
 
-def should_exit(entry_price: float, current_price: float, entry_time: datetime) -> str | None:
+def should_exit(entry_price: float, current_price: float, entry_time: datetime,
+                now: datetime | None = None) -> str | None:
     if current_price <= entry_price * (1 - STOP_PCT):
         return "STOP"
     if current_price >= entry_price * (1 + PROFIT_PCT):
         return "TP"
-    if datetime.utcnow() - entry_time >= timedelta(days=MAX_DAYS):
+    if (now or datetime.utcnow()) - entry_time >= timedelta(days=MAX_DAYS):
         return "TIME"
     return None
+
+def exits_batch(positions: list[dict], prices: dict, now: datetime | None = None) -> list[tuple]:
+    """Apply the should_exit rules to the whole book at once.
+
+    Returns [(pos, current_price, reason), ...] for every triggered exit.
+    Positions without a price in `prices` are skipped this round.
+    """
+    book = [p for p in positions if prices.get(p["symbol"]) is not None]
+    if not book:
+        return []
+    now = now or datetime.utcnow()
+    entry = np.array([p["entry_price"] for p in book], dtype=float)
+    cur = np.array([prices[p["symbol"]] for p in book], dtype=float)
+    age = np.array([(now - p["entry_time"]).total_seconds() for p in book])
+
+    # same precedence as should_exit: STOP, then TP, then TIME
+    reason = np.select(
+        [cur <= entry * (1 - STOP_PCT),
+         cur >= entry * (1 + PROFIT_PCT),
+         age >= timedelta(days=MAX_DAYS).total_seconds()],
+        ["STOP", "TP", "TIME"], default="")
+    return [(book[i], float(cur[i]), str(reason[i])) for i in np.flatnonzero(reason)]
+
+
+class ExitWatcher:
+    """should_exit precomputed as per-symbol price levels, for tick-by-tick checks.
+
+    sync() rebuilds the levels from the position book; check() is then a
+    dict lookup and two comparisons per tick, with the same STOP / TP / TIME
+    precedence as should_exit.
+    """
+
+    def __init__(self):
+        self._levels = {}   # symbol -> (stop, take_profit, deadline, pos)
+
+    def __contains__(self, symbol: str):
+        return symbol in self._levels
+
+    def __len__(self):
+        return len(self._levels)
+
+    def sync(self, positions) -> tuple[set, set]:
+        """Track exactly `positions`; returns the (added, removed) symbols."""
+        old = set(self._levels)
+        self._levels = {
+            p["symbol"]: (p["entry_price"] * (1 - STOP_PCT), p["entry_price"] * (1 + PROFIT_PCT),
+                          p["entry_time"] + timedelta(days=MAX_DAYS), p)
+            for p in positions}
+        return set(self._levels) - old, old - set(self._levels)
+
+    def discard(self, symbol: str):
+        """Stop watching a symbol (its exit is in flight); the next sync restores it if still held."""
+        self._levels.pop(symbol, None)
+
+    def check(self, symbol: str, price: float, now: datetime | None = None):
+        """(pos, reason) if `price` triggers an exit for `symbol`, else None."""
+        lv = self._levels.get(symbol)
+        if lv is None:
+            return None
+        stop, tp, deadline, pos = lv
+        if price <= stop:
+            return pos, "STOP"
+        if price >= tp:
+            return pos, "TP"
+        if (now or datetime.utcnow()) >= deadline:
+            return pos, "TIME"
+        return None
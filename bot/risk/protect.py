@@ -0,0 +1,165 @@
+# bot/risk/protect.py
+"""
+Server-side exits: the stop / take-profit rules of bot.risk.exit as resting
+broker orders, so an exit fills when the price gets there rather than when
+the loop next looks.
+
+EXIT_ORDERS picks how positions are protected:
+  local     - no exit orders; the exit pass polls should_exit (default)
+  bracket   - entries go out as bracket orders (market buy + take-profit
+              limit + stop legs); held shares without legs get an OCO sell
+  trailing  - entries are plain market buys followed by a trailing stop of
+              TRAIL_PCT; there is no take-profit, the trail lets winners run
+
+Each position keeps the ids of its exit legs in the position book. Once per
+exit pass reconcile() fetches the open orders (one call); a leg that is no
+longer open is looked up, its fill is booked as a close (reason TP / STOP /
+TRAIL) and it is dropped from the position. A position left without legs
+(cancelled, expired, bought before the switch, or a trailing-mode entry
+that wasn't filled when it was booked) is armed once the broker holds its
+shares; until then, or if arming fails, the polled rules apply. Each
+position is updated under the caller's per-symbol order lock, so a
+concurrent entry and reconcile never arm it twice. MAX_DAYS stays a local, polled rule:
+time_exits() cancels the legs before the caller sells at market.
+"""
+import contextlib, os
+from datetime import datetime, timedelta
+from bot.risk.exit import STOP_PCT, PROFIT_PCT, MAX_DAYS
+from bot.utils.logger import log_close
+
+EXIT_ORDERS = os.getenv("EXIT_ORDERS", "local")       # "local", "bracket" or "trailing"
+TRAIL_PCT = float(os.getenv("TRAIL_PCT", STOP_PCT * 100))
+
+_REASONS = {"limit": "TP", "stop": "STOP", "stop_limit": "STOP", "trailing_stop": "TRAIL"}
+_TERMINAL = ("filled", "canceled", "expired", "rejected", "replaced", "done_for_day")
+
+
+def enabled() -> bool:
+    return EXIT_ORDERS in ("bracket", "trailing")
+
+
+def levels(entry_price: float) -> tuple[float, float]:
+    """(take_profit, stop_loss) prices, the same levels should_exit applies."""
+    return entry_price * (1 + PROFIT_PCT), entry_price * (1 - STOP_PCT)
+
+
+def _leg_ids(order) -> list[str]:
+    legs = getattr(order, "legs", None) or ()
+    return [str(leg["id"] if isinstance(leg, dict) else leg.id) for leg in legs]
+
+
+def submit_entry(broker, symbol: str, qty: int, entry_price: float):
+    """Buy `qty` the way EXIT_ORDERS asks; returns (order, exit-order ids)."""
+    if EXIT_ORDERS == "bracket":
+        tp, sl = levels(entry_price)
+        order = broker.submit_buy_bracket(symbol, qty, tp, sl)
+        return order, _leg_ids(order)
+    return broker.submit_buy_market(symbol, qty), []
+
+
+def arm(broker, book, pos, qty: int | None = None) -> bool:
+    """Place exit orders for `qty` shares (default: all) of a position; False if the broker refused."""
+    qty = qty or pos["qty"]
+    try:
+        if EXIT_ORDERS == "trailing":
+            ids = [str(broker.submit_trailing_stop(pos["symbol"], qty, TRAIL_PCT).id)]
+        else:
+            tp, sl = levels(pos["entry_price"])
+            order = broker.submit_exit_oco(pos["symbol"], qty, tp, sl)
+            ids = [str(order.id)] + _leg_ids(order)
+    except Exception as e:
+        print(f"arming exits for {pos['symbol']} failed (polled rules apply):", e)
+        return False
+    book.set_exit_orders(pos["symbol"], list(pos["exit_orders"]) + ids)
+    return True
+
+
+def _no_lock(symbol):
+    return contextlib.nullcontext()
+
+
+def reconcile(broker, book, lock=_no_lock) -> int:
+    """Book fills / cancels of exit legs and arm bare positions; returns shares closed.
+
+    `lock(symbol)` is the caller's per-symbol order lock (main._symbol_lock).
+    """
+    protected = [p for p in book.positions() if p.exit_orders]
+    open_ids = broker.open_order_ids() if protected else set()
+    closed = 0
+    for pos in protected:
+        with lock(pos.symbol):
+            if book.get(pos.symbol) is pos:   # not closed or replaced meanwhile
+                closed += _settle(broker, book, pos, open_ids)
+    due = datetime.utcnow() - timedelta(days=MAX_DAYS)
+    # time-expired positions are sold, not armed
+    bare = [p for p in book.positions() if not p.exit_orders and p.entry_time > due]
+    held = broker.position_qtys() if bare else {}
+    for pos in bare:
+        with lock(pos.symbol):
+            cur = book.get(pos.symbol)
+            if cur is None or cur.exit_orders:   # closed, or armed by the entry meanwhile
+                continue
+            if held.get(cur.symbol, 0) < cur.qty:
+                continue                         # entry not filled yet: never sell unheld shares
+            arm(broker, book, cur)
+    return closed
+
+
+def _settle(broker, book, pos, open_ids: set) -> int:
+    # book the fills of one position's exit legs that are no longer open
+    closed = 0
+    remaining = list(pos.exit_orders)
+    for oid in pos.exit_orders:
+        if oid in open_ids:
+            continue
+        try:
+            order = broker.get_order(oid)
+        except Exception as e:
+            print(f"order {oid} lookup failed:", e)
+            continue
+        if order.status not in _TERMINAL:
+            continue              # e.g. held / pending_new between listing and lookup
+        remaining.remove(oid)
+        filled = int(float(order.filled_qty or 0))
+        if filled and order.side == "sell":
+            qty = min(filled, pos.qty)
+            price = float(order.filled_avg_price)
+            reason = _REASONS.get(getattr(order, "type", None) or getattr(order, "order_type", None), "EXIT")
+            log_close({"symbol": pos.symbol, "qty": qty, "entry_price": pos.entry_price},
+                      price, reason)
+            print(f"EXIT {pos.symbol} via {reason} @ {price} (server-side, {qty} sh)")
+            closed += qty
+            book.reduce(pos.symbol, qty)
+            if pos.symbol not in book:
+                break
+    if pos.symbol in book and remaining != pos.exit_orders:
+        book.set_exit_orders(pos.symbol, remaining)
+    return closed
+
+
+def time_exits(broker, book, now: datetime | None = None) -> list:
+    """Protected positions past MAX_DAYS, with their exit legs cancelled, ready to sell.
+
+    A position whose legs already (partly) filled stays out of this round;
+    reconcile() books the fill next time.
+    """
+    now = now or datetime.utcnow()
+    due = []
+    for pos in book.positions():
+        if not pos.exit_orders or now - pos.entry_time < timedelta(days=MAX_DAYS):
+            continue
+        for oid in pos.exit_orders:
+            try:
+                broker.cancel_order(oid)
+            except Exception:
+                pass          # already closed, e.g. cancelled with its OCO sibling
+        try:
+            filled = any(int(float(broker.get_order(oid).filled_qty or 0)) for oid in pos.exit_orders)
+        except Exception as e:
+            print(f"checking exits for {pos.symbol} failed:", e)
+            continue
+        if filled:
+            continue
+        book.set_exit_orders(pos.symbol, [])
+        due.append(pos)
+    return due
@@ -0,0 +1,186 @@
+# bot/strategies/indicators.py
+"""
+Array-backed technical indicators.
+
+Every function works along the last axis, so it accepts either one series of
+closes (1-D) or a whole watchlist as a 2-D (symbols x bars) matrix. Rows that
+are shorter than the matrix are left-padded with NaN by `closes_matrix`; each
+row starts at its first real bar (`first_valid`), so a padded row gives the
+same values as the unpadded series, and any indicator that would need a
+missing bar comes back as NaN for that row.
+
+`rsi` and `macd` reproduce the historical pure-Python results of
+momentum.py exactly (including its gain/loss bookkeeping and the 31-bar
+re-seeded EMA windows), just without the per-index re-computation. The
+re-seeded windows of a short row start at its first real bar, so `macd` runs
+each group of equally long rows on their unpadded tail; tests/ compares
+both functions against golden values of the old implementation.
+"""
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+def closes_matrix(series, length: int | None = None) -> np.ndarray:
+    """Right-align close series into a float matrix, NaN-padding short rows."""
+    if length is None:
+        length = max((len(s) for s in series), default=0)
+    out = np.full((len(series), length), np.nan)
+    for row, s in enumerate(series):
+        tail = list(s)[-length:] if length else []
+        if tail:
+            out[row, length - len(tail):] = tail
+    return out
+
+
+def valid_count(x) -> np.ndarray:
+    """Number of non-NaN bars per row."""
+    return np.count_nonzero(~np.isnan(np.asarray(x, dtype=float)), axis=-1)
+
+
+def last_mean(x, n: int) -> np.ndarray:
+    """Mean of the last `n` bars per row (NaN if fewer than `n` are present)."""
+    x = np.asarray(x, dtype=float)
+    if n <= 0 or x.shape[-1] < n:
+        return np.full(x.shape[:-1], np.nan)
+    return x[..., -n:].mean(axis=-1)
+
+
+def first_valid(x) -> np.ndarray:
+    """Index of each row's first non-NaN bar (the row length if it has none)."""
+    valid = ~np.isnan(np.asarray(x, dtype=float))
+    return np.where(valid.any(axis=-1), valid.argmax(axis=-1), valid.shape[-1])
+
+
+def sma(x, window: int) -> np.ndarray:
+    """Rolling simple moving average; NaN until a row has `window` real bars."""
+    x = np.asarray(x, dtype=float)
+    out = np.full(x.shape, np.nan)
+    if window <= 0 or x.shape[-1] < window:
+        return out
+    valid = ~np.isnan(x)
+    c = np.cumsum(np.where(valid, x, 0.0), axis=-1)   # padding adds exact zeros
+    n = np.cumsum(valid, axis=-1)
+    out[..., window - 1] = c[..., window - 1]
+    out[..., window:] = c[..., window:] - c[..., :-window]
+    full = np.zeros(x.shape, dtype=bool)
+    full[..., window - 1] = n[..., window - 1] == window
+    full[..., window:] = n[..., window:] - n[..., :-window] == window
+    out[..., window - 1:] /= window
+    return np.where(full, out, np.nan)
+
+
+def ema(x, span: int) -> np.ndarray:
+    """Exponential moving average seeded with each row's first real bar (k = 2 / (span + 1))."""
+    x = np.asarray(x, dtype=float)
+    out = np.full(x.shape, np.nan)
+    if x.shape[-1] == 0:
+        return out
+    k = 2 / (span + 1)
+    start = first_valid(x)
+    acc = out[..., 0].copy()
+    for t in range(x.shape[-1]):
+        acc = np.where(t == start, x[..., t], x[..., t] * k + acc * (1 - k))
+        out[..., t] = acc
+    return out
+
+
+def rolling_std(x, window: int, ddof: int = 1) -> np.ndarray:
+    """Rolling standard deviation over `window` bars; the first window-1 bars are NaN."""
+    x = np.asarray(x, dtype=float)
+    out = np.full(x.shape, np.nan)
+    if window <= ddof or x.shape[-1] < window:
+        return out
+    win = sliding_window_view(x, window, axis=-1)
+    out[..., window - 1:] = win.std(axis=-1, ddof=ddof)
+    return out
+
+
+def _ema_weights(length: int, span: int) -> np.ndarray:
+    """Weights that turn a dot product over `length` bars into a first-bar-seeded EMA."""
+    k = 2 / (span + 1)
+    w = k * (1 - k) ** np.arange(length - 1, -1, -1, dtype=float)
+    w[0] = (1 - k) ** (length - 1)
+    return w
+
+
+def rsi(closes, period: int = 14) -> np.ndarray:
+    """RSI of the latest bar: mean of the last `period` gains / losses."""
+    x = np.asarray(closes, dtype=float)
+    d = np.diff(x, axis=-1)
+    valid = ~np.isnan(d)
+    gain = valid & (d > 0)
+    loss = valid & ~(d > 0)
+
+    def recent_mean(mask, values):
+        # keep only the last `period` entries of each mask, counted from the end
+        rank = np.cumsum(mask[..., ::-1], axis=-1)[..., ::-1]
+        keep = mask & (rank <= period)
+        return np.where(keep, values, 0.0).sum(axis=-1) / period
+
+    avg_gain = recent_mean(gain, d)
+    avg_loss = recent_mean(loss, -d)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out = 100.0 - 100.0 / (1 + avg_gain / avg_loss)
+    out = np.where(avg_loss == 0, np.where(avg_gain > 0, 100.0, 50.0), out)
+    return np.where(valid_count(x) < period + 1, np.nan, out)
+
+
+def macd(closes, fast: int = 12, slow: int = 26, signal: int = 9):
+    """(macd_line, signal_line, histogram) for the latest bar of each row."""
+    x = np.asarray(closes, dtype=float)
+    n = x.shape[-1]
+    lengths = valid_count(x)
+    if (lengths == n).all():
+        return _macd_dense(x, fast, slow, signal)
+    # NaN-padded rows: one dense pass per distinct row length, over just its bars
+    flat, lengths = x.reshape(-1, n), np.reshape(lengths, -1)
+    out = tuple(np.full(flat.shape[0], np.nan) for _ in range(3))
+    for length in np.unique(lengths):
+        if length < slow + signal:
+            continue
+        rows = lengths == length
+        for dst, src in zip(out, _macd_dense(flat[rows, n - length:], fast, slow, signal)):
+            dst[rows] = src
+    return tuple(o.reshape(x.shape[:-1]) for o in out)
+
+
+def _macd_dense(x: np.ndarray, fast: int, slow: int, signal: int):
+    # macd() for rows whose every bar is present
+    n = x.shape[-1]
+    nan = np.full(x.shape[:-1], np.nan)
+    if n < slow + signal:
+        return nan, nan.copy(), nan.copy()
+
+    span_w = slow + 5
+    # MACD values for bars n-slow-1 .. n-1, each from an EMA pair re-seeded span_w bars back
+    cols = []
+    first_full = max(n - slow - 1, span_w - 1)
+    for i in range(n - slow - 1, first_full):
+        if i + 1 < slow:
+            continue
+        w = _ema_weights(i + 1, fast) - _ema_weights(i + 1, slow)
+        cols.append(x[..., :i + 1] @ w)
+    w = _ema_weights(span_w, fast) - _ema_weights(span_w, slow)
+    full = sliding_window_view(x[..., first_full - span_w + 1:], span_w, axis=-1) @ w
+    series = np.concatenate([np.stack(cols, axis=-1), full], axis=-1) if cols else full
+
+    macd_line = series[..., -1]
+    signal_line = series @ _ema_weights(series.shape[-1], signal)
+    hist = macd_line - signal_line
+    return macd_line, signal_line, hist
+
+
+if __name__ == "__main__":
+    # micro-benchmark: python -m bot.strategies.indicators [symbols] [bars]
+    import sys, time
+    n_sym = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    n_bar = int(sys.argv[2]) if len(sys.argv) > 2 else 252
+    rng = np.random.default_rng(0)
+    m = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, (n_sym, n_bar)), axis=1))
+    for name, fn in (("sma(50)", lambda: sma(m, 50)), ("ema(26)", lambda: ema(m, 26)),
+                     ("rolling_std(20)", lambda: rolling_std(m, 20)),
+                     ("rsi(14)", lambda: rsi(m)), ("macd", lambda: macd(m))):
+        t0 = time.perf_counter()
+        fn()
+        dt = time.perf_counter() - t0
+        print(f"{name:<16} {dt * 1e3:8.2f} ms total  {dt / n_sym * 1e6:8.2f} us/symbol")
@@ -0,0 +1,235 @@
+# bot/strategies/pipeline.py
+"""
+Declarative filter pipelines over lazily computed, per-cycle symbol features.
+
+A strategy is a Pipeline of named Filters. A filter reads what it needs as
+ctx["price"], ctx["adv"], ...; each feature is computed on first use from the
+FEATURES registry and memoized per (broker, symbol) until new_cycle(), so
+insider_simple and momentum share one price / ADV / bars lookup per filing.
+Concurrent first uses of a feature are coalesced.
+
+Filters are ANDed and side-effect free, so their order only changes cost.
+Each pipeline measures every filter's wall time (including the features it
+had to compute) and how often it rejects, and every REORDER_EVERY evaluations
+re-sorts the filters by expected cost per rejection (cost / P(reject)), so
+cheap, selective checks run first and expensive broker lookups are skipped
+for filings an earlier check already rules out.
+
+    PIPELINE = Pipeline("example", [
+        Filter("price", lambda ctx: (ctx["price"] or 0) > 0),
+        Filter("adv", lambda ctx: ctx["adv"] is None or ctx["adv"] >= 50_000),
+    ])
+    ctx = PIPELINE.run(filing, broker)      # None = rejected; else ctx["price"] is memoized
+"""
+import itertools, threading, time
+from bot.brokers.alpaca import MarketDataCache
+from bot.utils import metrics
+from bot.utils.metrics import span
+
+REORDER_EVERY = 50      # evaluations between re-sorts
+MIN_SAMPLES = 20        # per filter, before its measured stats override the declared order
+EWMA_ALPHA = 0.05       # weight of the newest sample in the cost / reject-rate estimates
+FEATURES_MAX_ENTRIES = 8192
+FEATURE_TTL = float("inf")   # memoized until new_cycle()
+
+FEATURES = {}   # name -> fn(broker, symbol)
+
+
+def feature(name: str):
+    """Register fn(broker, symbol) as feature `name`; it should return None on failure."""
+    def deco(fn):
+        FEATURES[name] = fn
+        return fn
+    return deco
+
+
+@feature("price")
+def _price(broker, symbol):
+    try:
+        return broker.current_price(symbol)
+    except Exception:
+        return None
+
+
+@feature("adv")
+def _adv(broker, symbol):
+    return broker.avg_daily_volume(symbol)
+
+
+@feature("spread")
+def _spread(broker, symbol):
+    return broker.bid_ask_spread(symbol)
+
+
+@feature("week_low_rise")
+def _week_low_rise(broker, symbol):
+    return broker.percent_since_week_low(symbol)
+
+
+@feature("intraday_vol")
+def _intraday_vol(broker, symbol):
+    return broker.intraday_volatility(symbol, minutes=60)
+
+
+class FeatureStore:
+    """Memoized features for one broker's current cycle."""
+
+    def __init__(self, broker):
+        self.broker = broker
+        self.cache = MarketDataCache(FEATURES_MAX_ENTRIES)
+
+    def get(self, symbol: str, name: str):
+        return self.cache.get((symbol, name), FEATURE_TTL,
+                              lambda: FEATURES[name](self.broker, symbol))
+
+
+_stores = {}    # id(broker) -> FeatureStore
+_stores_lock = threading.Lock()
+
+
+def features(broker) -> FeatureStore:
+    with _stores_lock:
+        store = _stores.get(id(broker))
+        if store is None or store.broker is not broker:
+            store = _stores[id(broker)] = FeatureStore(broker)
+        return store
+
+
+def new_cycle(broker=None):
+    """Forget memoized features (for one broker, or all); call when market data moves on."""
+    with _stores_lock:
+        stores = list(_stores.values()) if broker is None else [_stores.get(id(broker))]
+    for store in stores:
+        if store is not None:
+            store.cache.clear()
+
+
+class Context:
+    """What a filter sees: the filing, its symbol and lazily fetched features."""
+    __slots__ = ("filing", "symbol", "_store")
+
+    def __init__(self, filing: dict, symbol: str, store: FeatureStore):
+        self.filing, self.symbol, self._store = filing, symbol, store
+
+    def __getitem__(self, name: str):
+        return self._store.get(self.symbol, name)
+
+
+class Filter:
+    """A named predicate over a Context; returning False rejects the filing."""
+    __slots__ = ("name", "check", "evals", "rejects", "cost_sum", "samples", "cost", "reject_rate")
+
+    def __init__(self, name: str, check):
+        self.name, self.check = name, check
+        self.evals = self.rejects = 0       # since the last stats(reset=True)
+        self.cost_sum = 0.0
+        self.samples = 0                    # lifetime evaluations
+        self.cost = 0.0                     # EWMA seconds per evaluation
+        self.reject_rate = 0.0              # EWMA of P(reject)
+
+    def record(self, seconds: float, rejected: bool):
+        self.evals += 1
+        self.rejects += rejected
+        self.cost_sum += seconds
+        self.samples += 1
+        a = 1.0 if self.samples == 1 else EWMA_ALPHA
+        self.cost += a * (seconds - self.cost)
+        self.reject_rate += a * (rejected - self.reject_rate)
+
+    def rank(self) -> float:
+        # expected cost per rejection: the optimal order for independent AND-filters
+        return self.cost / max(self.reject_rate, 1e-3)
+
+
+class Pipeline:
+    """Ordered, self-tuning chain of Filters for one strategy."""
+
+    def __init__(self, name: str, filters: list[Filter]):
+        self.name = name
+        self.filters = list(filters)
+        self.order = list(self.filters)     # current evaluation order
+        self._runs = itertools.count(1)
+        self._lock = threading.Lock()
+        _pipelines.append(self)
+
+    def run(self, filing: dict, broker, symbol: str | None = None) -> Context | None:
+        """Context of a filing every filter accepts, else None (stops at the first reject)."""
+        symbol = symbol or filing.get("ticker")
+        ctx = Context(filing, symbol, features(broker))
+        with self._lock:
+            order = self.order
+        ok = True
+        for f in order:
+            t0 = time.perf_counter()
+            try:
+                with span("filter", strategy=self.name, filter=f.name):
+                    ok = bool(f.check(ctx))
+            except Exception:
+                ok = False
+            dt = time.perf_counter() - t0
+            with self._lock:
+                f.record(dt, not ok)
+            if not ok:
+                metrics.inc("bot_filter_rejections_total", strategy=self.name, filter=f.name)
+                break
+        if next(self._runs) % REORDER_EVERY == 0:
+            self.reorder()
+        return ctx if ok else None
+
+    def reorder(self):
+        """Measured filters by cost per rejection, then the rest in declared order."""
+        with self._lock:
+            measured = sorted((f for f in self.filters if f.samples >= MIN_SAMPLES), key=Filter.rank)
+            self.order = measured + [f for f in self.filters if f.samples < MIN_SAMPLES]
+
+    def stats(self, reset: bool = False) -> list[dict]:
+        """Per filter, in current order: evaluations, rejections, pass rate, mean/EWMA cost."""
+        with self._lock:
+            out = [{"filter": f.name, "evals": f.evals, "rejects": f.rejects,
+                    "pass_rate": 1 - f.rejects / f.evals if f.evals else None,
+                    "mean_ms": f.cost_sum / f.evals * 1e3 if f.evals else None,
+                    "cost_ms": f.cost * 1e3, "reject_rate": f.reject_rate}
+                   for f in self.order]
+            if reset:
+                for f in self.filters:
+                    f.evals = f.rejects = 0
+                    f.cost_sum = 0.0
+        return out
+
+
+_pipelines: list[Pipeline] = []
+
+
+def stats(reset: bool = False) -> dict:
+    """{pipeline name: per-filter stats} for every pipeline defined so far."""
+    return {p.name: p.stats(reset) for p in _pipelines}
+
+
+def merge_stats(parts) -> dict:
+    """Sum stats() dicts taken in several processes (bot.workers) into one."""
+    out = {}
+    for st in parts:
+        for name, filters in st.items():
+            acc = out.setdefault(name, {})
+            for f in filters:
+                a = acc.setdefault(f["filter"], {"filter": f["filter"], "evals": 0, "rejects": 0, "cost_s": 0.0})
+                a["evals"] += f["evals"]
+                a["rejects"] += f["rejects"]
+                a["cost_s"] += (f["mean_ms"] or 0.0) * f["evals"] / 1e3
+    for name, acc in out.items():
+        out[name] = [{"filter": a["filter"], "evals": a["evals"], "rejects": a["rejects"],
+                      "pass_rate": 1 - a["rejects"] / a["evals"] if a["evals"] else None,
+                      "mean_ms": a["cost_s"] / a["evals"] * 1e3 if a["evals"] else None}
+                     for a in acc.values()]
+    return out
+
+
+def format_stats(st: dict) -> str:
+    """'name: filter ×evals pass% ms, ...' per pipeline, skipping idle filters."""
+    parts = []
+    for name, filters in st.items():
+        rows = [f"{f['filter']} {f['evals']}× {f['pass_rate']:.0%} {f['mean_ms']:.1f}ms"
+                for f in filters if f["evals"]]
+        if rows:
+            parts.append(f"{name}: " + ", ".join(rows))
+    return "; ".join(parts) or "no evaluations"
@@ -0,0 +1,90 @@
+# bot/strategies/snapshots.py
+"""
+Per-evaluation feature snapshots, the raw material of threshold sweeps
+(python -m bot.backtest.sweep).
+
+After a strategy has evaluated a filing, record() appends one row to the
+"features" journal: the inputs of the strategy's tunable gates at that
+instant (its SNAPSHOT_FEATURES; the rest of the row is NaN) and whether the
+live thresholds traded it. Rows are only written for filings that pass the
+strategy's fixed gates (SNAPSHOT_GATES, e.g. insider role / buy), and
+features are memoized per cycle, so a row costs broker calls only for
+inputs the pipeline short-circuited. Every live evaluation is recorded by
+default; those extra calls are entry-priority REST requests, so a quota-bound
+deployment can lower RECORD_FEATURES to the fraction of filings snapshotted
+(chosen by accession, the same for every strategy; 0 = off). Backtests
+(engine --features-out) always capture every evaluation.
+
+Outcomes are not recorded here; the sweep labels each row later from bars.
+"""
+import datetime as dt, os, zlib
+import numpy as np
+from bot.strategies import indicators as ind
+from bot.strategies.pipeline import Context, feature, features
+from bot.utils.journal import SCHEMAS, get_journal
+
+RECORD_FEATURES = float(os.getenv("RECORD_FEATURES", "1"))   # live sample rate: 1 = all, 0 = off
+SMA_WINDOWS = (5, 10, 20, 21, 30, 50, 100, 200)   # every MA window a sweep may pick
+
+_VALUES = SCHEMAS["features"].names[5:]           # after utc_time, symbol, strategy, accession, traded
+
+
+@feature("daily_profile")
+def _daily_profile(broker, symbol):
+    # daily_closes is registered by bot.strategies.momentum
+    closes = features(broker).get(symbol, "daily_closes")
+    if not closes:
+        return None
+    x = np.array([closes], dtype=float)
+    out = {"rsi": ind.rsi(x)[0], "macd_hist": ind.macd(x)[2][0], "n_bars": ind.valid_count(x)[0]}
+    for w in SMA_WINDOWS:
+        out[f"sma_{w}"] = ind.last_mean(x, w)[0]
+    return out
+
+
+def _now(broker) -> dt.datetime:
+    now = getattr(broker, "now", None)   # point-in-time brokers carry a simulated clock
+    return now if isinstance(now, dt.datetime) else dt.datetime.utcnow()
+
+
+def capture(strat, filing: dict, broker, traded: bool) -> tuple | None:
+    """Snapshot row for one evaluation by strategy module `strat`, None if its fixed gates reject the filing."""
+    symbol = filing.get("ticker")
+    if filing.get("form") != "4" or not symbol:
+        return None
+    ctx = Context(filing, symbol, features(broker))
+    gates = getattr(strat, "SNAPSHOT_GATES", ())
+    for f in strat.PIPELINE.filters:
+        if f.name in gates and not f.check(ctx):
+            return None
+    values = {}
+    for name in getattr(strat, "SNAPSHOT_FEATURES", ()):
+        v = ctx[name]
+        if isinstance(v, dict):
+            values.update(v)
+        else:
+            values[name] = v
+    row = [np.nan if values.get(k) is None else float(values[k]) for k in _VALUES]
+    row[_VALUES.index("n_bars")] = int(values.get("n_bars") or 0)
+    return (_now(broker).replace(microsecond=0), symbol, strat.__name__.rsplit(".", 1)[-1],
+            filing.get("accession") or "", bool(traded), *row)
+
+
+def sampled(filing: dict) -> bool:
+    """Whether live evaluations of this filing are snapshotted (RECORD_FEATURES)."""
+    if RECORD_FEATURES <= 0:
+        return False
+    key = filing.get("accession") or filing.get("link") or ""
+    return RECORD_FEATURES >= 1 or zlib.crc32(key.encode()) < RECORD_FEATURES * 2 ** 32
+
+
+def record(strat, filing: dict, broker, traded: bool):
+    """Append the evaluation's snapshot to the features journal if sampled (never raises)."""
+    if not sampled(filing):
+        return
+    try:
+        row = capture(strat, filing, broker, traded)
+        if row is not None:
+            get_journal("features").append(row)
+    except Exception as e:
+        print(f"feature snapshot for {filing.get('ticker')} failed:", e)
@@ -0,0 +1,301 @@
+# bot/utils/journal.py
+"""
+Buffered columnar trade journal.
+
+Rows are held in memory and flushed when FLUSH_ROWS accumulate, every
+FLUSH_SECONDS (daemon thread) and at interpreter exit. A flush writes one chunk,
+logs/journal/<kind>/<YYYY-MM-DD>/<seq>.npy (a structured numpy array, one
+column per field). Once a UTC day is over and a flush no longer writes to it,
+its chunks are compacted: the chunk directory is renamed to the sealed
+<kind>/<YYYY-MM-DD>.<k>/, then the day's segment <kind>/<YYYY-MM-DD>.<k>.npy
+is written with the rows of the previous segment plus every sealed
+directory up to k. The newest segment supersedes older segments and sealed
+directories up to its k, which are deleted afterwards. Rows stamped for a
+past day and flushed late just start a new chunk directory, merged by the
+next compaction; a crash at any step neither drops nor double-counts rows.
+Every file is written to a temp name and renamed. Readers open files
+memory-mapped; export_csv() writes the old CSV layout.
+
+    python -m bot.utils.journal export closed closed_export.csv [--start D] [--end D]
+"""
+import atexit, csv, datetime as dt, os, pathlib, shutil, threading, time
+import numpy as np
+
+JOURNAL_ROOT = pathlib.Path("logs") / "journal"
+FLUSH_ROWS = 500
+FLUSH_SECONDS = 10
+
+SCHEMAS = {
+    "trades": np.dtype([("utc_time", "datetime64[s]"), ("ticker", "U10"), ("form", "U6"),
+                        ("qty", "<i8"), ("alpaca_id", "U40")]),
+    "closed": np.dtype([("utc_exit", "datetime64[s]"), ("symbol", "U10"), ("qty", "<i8"),
+                        ("entry_price", "<f8"), ("exit_price", "<f8"), ("pnl_dollars", "<f8"),
+                        ("reason", "U12")]),
+    # per-evaluation gate inputs for threshold sweeps (bot.strategies.snapshots); NaN = unavailable
+    "features": np.dtype([("utc_time", "datetime64[s]"), ("symbol", "U10"), ("strategy", "U16"),
+                          ("accession", "U20"), ("traded", "?"),
+                          ("price", "<f8"), ("adv", "<f8"), ("spread", "<f8"), ("week_low_rise", "<f8"),
+                          ("intraday_vol", "<f8"), ("rsi", "<f8"), ("macd_hist", "<f8"), ("n_bars", "<i8"),
+                          ("sma_5", "<f8"), ("sma_10", "<f8"), ("sma_20", "<f8"), ("sma_21", "<f8"),
+                          ("sma_30", "<f8"), ("sma_50", "<f8"), ("sma_100", "<f8"), ("sma_200", "<f8")]),
+}
+TIME_FIELD = {kind: dtype.names[0] for kind, dtype in SCHEMAS.items()}
+
+
+class Journal:
+    """Append-only, day-segmented journal for one record kind."""
+
+    def __init__(self, kind: str, root: pathlib.Path = JOURNAL_ROOT,
+                 flush_rows: int = FLUSH_ROWS, flush_seconds: float = FLUSH_SECONDS):
+        self.kind = kind
+        self.dtype = SCHEMAS[kind]
+        self.dir = pathlib.Path(root) / kind
+        self.flush_rows = flush_rows
+        self.flush_seconds = flush_seconds
+        self._buf: list[tuple] = []
+        self._lock = threading.Lock()        # guards _buf
+        self._io_lock = threading.Lock()     # one flush at a time
+        self._flusher = None
+
+    def append(self, row: tuple):
+        """Buffer one row (fields in schema order; the first is a UTC datetime)."""
+        with self._lock:
+            self._buf.append(row)
+            full = len(self._buf) >= self.flush_rows
+            if self._flusher is None and self.flush_seconds:
+                self._flusher = threading.Thread(target=self._flush_loop, daemon=True,
+                                                 name=f"journal-{self.kind}")
+                self._flusher.start()
+        if full:
+            self.flush()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_seconds)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"journal {self.kind} flush failed:", e)
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._buf)
+
+    def flush(self) -> int:
+        """Write buffered rows into their daily segments; returns rows written."""
+        with self._io_lock:
+            with self._lock:
+                rows, self._buf = self._buf, []
+            if not rows:
+                return 0
+            try:
+                arr = np.array(rows, dtype=self.dtype)
+                days = arr[TIME_FIELD[self.kind]].astype("datetime64[D]")
+                written = set()
+                for day in np.unique(days):
+                    self._write_chunk(str(day), arr[days == day])
+                    written.add(str(day))
+            except Exception:
+                with self._lock:  # keep the rows for the next attempt
+                    self._buf[:0] = rows
+                raise
+            # days this flush wrote to are still being written (a replay, a late
+            # row): they are compacted by a later flush that moves past them
+            self._compact(before=dt.datetime.utcnow().date().isoformat(), skip=written)
+            return len(rows)
+
+    def compact(self):
+        """Flush, then compact every day before today (call when done writing, e.g. a replay)."""
+        self.flush()
+        with self._io_lock:
+            self._compact(before=dt.datetime.utcnow().date().isoformat())
+
+    def _write_chunk(self, day: str, arr: np.ndarray):
+        d = self.dir / day
+        d.mkdir(parents=True, exist_ok=True)
+        seq = max((int(p.stem) for p in d.glob("*.npy")), default=0) + 1
+        _save(d / f"{seq:06d}.npy", arr)
+
+    def _compact(self, before: str, skip=()):
+        """Merge the chunks of days before `before` (except `skip`) into their daily segments."""
+        if not self.dir.exists():
+            return
+        for day, parts in sorted(_layout(self.dir).items()):
+            if day >= before or day in skip:
+                continue
+            seg_k, sealed = parts["segment"], parts["sealed"]
+            if parts["open"] is not None:   # seal: later chunks of the day start a new directory
+                k = max([seg_k or 0, *sealed], default=0) + 1
+                parts["open"].rename(self.dir / f"{day}.{k}")
+                sealed = {**sealed, k: self.dir / f"{day}.{k}"}
+            live = {k: d for k, d in sealed.items() if seg_k is None or k > seg_k}
+            k = seg_k
+            if live:
+                k = max(live)
+                arrays = [np.load(parts["segments"][seg_k])] if seg_k is not None else []
+                arrays += [np.load(p) for i in sorted(live) for p in sorted(live[i].glob("*.npy"))]
+                _save(self.dir / f"{day}.{k}.npy",
+                      np.concatenate(arrays) if arrays else np.empty(0, dtype=self.dtype))
+            # segment k supersedes older segments and every sealed directory
+            # (also leftovers of a compaction interrupted after its segment was written)
+            for i, path in parts["segments"].items():
+                if i < k:
+                    path.unlink()
+            for d in sealed.values():
+                shutil.rmtree(d)
+
+
+def _save(path: pathlib.Path, arr: np.ndarray):
+    tmp = path.with_suffix(".tmp")
+    with tmp.open("wb") as f:
+        np.save(f, arr)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+# --- readers -----------------------------------------------------------------
+def _layout(base: pathlib.Path) -> dict:
+    """day -> {"segments": {k: file}, "segment": newest k, "sealed": {k: dir}, "open": dir}.
+
+    <day>.npy is the k=0 segment of journals compacted before sealing existed.
+    """
+    days = {}
+    for p in base.iterdir():
+        name = p.name[:-4] if p.suffix == ".npy" and p.is_file() else p.name if p.is_dir() else None
+        if name is None:
+            continue
+        day, _, k = name.partition(".")
+        parts = days.setdefault(day, {"segments": {}, "segment": None, "sealed": {}, "open": None})
+        if p.is_dir():
+            if k:
+                parts["sealed"][int(k)] = p
+            else:
+                parts["open"] = p
+        else:
+            parts["segments"][int(k or 0)] = p
+    for parts in days.values():
+        parts["segment"] = max(parts["segments"], default=None)
+    return days
+
+
+def _day(d) -> str | None:
+    if d is None:
+        return None
+    return d.isoformat()[:10] if isinstance(d, (dt.date, dt.datetime)) else str(d)[:10]
+
+
+def segments(kind: str, start=None, end=None, root: pathlib.Path = JOURNAL_ROOT):
+    """Yield (day, memory-mapped array) per segment or live chunk with start <= day < end."""
+    lo, hi = _day(start), _day(end)
+    base = pathlib.Path(root) / kind
+    if not base.exists():
+        return
+    for day, parts in sorted(_layout(base).items()):
+        if (lo and day < lo) or (hi and day >= hi):
+            continue
+        seg_k = parts["segment"]
+        files = [parts["segments"][seg_k]] if seg_k is not None else []
+        dirs = [d for k, d in sorted(parts["sealed"].items()) if seg_k is None or k > seg_k]
+        if parts["open"] is not None:
+            dirs.append(parts["open"])
+        for d in dirs:
+            files += sorted(d.glob("*.npy"))
+        for p in files:
+            yield day, np.load(p, mmap_mode="r")
+
+
+def read(kind: str, start=None, end=None, root: pathlib.Path = JOURNAL_ROOT) -> np.ndarray:
+    """All rows of `kind` in [start, end) as one structured array (flushed rows only)."""
+    parts = [arr for _, arr in segments(kind, start, end, root)]
+    return np.concatenate(parts) if parts else np.empty(0, dtype=SCHEMAS[kind])
+
+
+def export_csv(kind: str, out, start=None, end=None, root: pathlib.Path = JOURNAL_ROOT) -> int:
+    """Write rows in the legacy CSV layout (same header as logs/<kind>.csv); returns row count."""
+    n = 0
+    with open(out, "w", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(SCHEMAS[kind].names)
+        for _, arr in segments(kind, start, end, root):
+            for row in arr.tolist():
+                w.writerow([v.isoformat() if isinstance(v, dt.datetime) else v for v in row])
+                n += 1
+    return n
+
+
+_journals: dict[str, Journal] = {}
+_journals_guard = threading.Lock()
+
+
+def get_journal(kind: str) -> Journal:
+    with _journals_guard:
+        j = _journals.get(kind)
+        if j is None:
+            j = _journals[kind] = Journal(kind)
+        return j
+
+
+def flush_all():
+    for j in list(_journals.values()):
+        try:
+            j.flush()
+        except Exception as e:
+            print(f"journal {j.kind} flush failed:", e)
+
+
+atexit.register(flush_all)
+
+
+if __name__ == "__main__":
+    import argparse, random, sys, tempfile
+    ap = argparse.ArgumentParser(description="Trade journal tools.")
+    sub = ap.add_subparsers(dest="cmd")
+    ex = sub.add_parser("export", help="export a journal kind to CSV")
+    ex.add_argument("kind", choices=sorted(SCHEMAS)); ex.add_argument("out")
+    ex.add_argument("--start"); ex.add_argument("--end")
+    bench = sub.add_parser("bench", help="write/read benchmark against per-row CSV appends")
+    bench.add_argument("--rows", type=int, default=200_000)
+    args = ap.parse_args()
+
+    if args.cmd == "export":
+        print(f"{export_csv(args.kind, args.out, args.start, args.end)} rows -> {args.out}")
+        sys.exit(0)
+    if args.cmd != "bench":
+        ap.print_help()
+        sys.exit(1)
+
+    n, rng = args.rows, random.Random(0)
+    base = dt.datetime(2024, 1, 2, 14, 30)
+    rows = [(base + dt.timedelta(minutes=i // 20), f"S{rng.randrange(3000):04d}", 10, 10.0, 10.5,
+             round(rng.gauss(0, 5), 2), "TP") for i in range(n)]
+    with tempfile.TemporaryDirectory() as tmp:
+        t0 = time.perf_counter()
+        for r in rows[:20_000]:  # the old logger: open, exists-check, one row, close
+            p = pathlib.Path(tmp, "closed_trades.csv")
+            new = not p.exists()
+            with p.open("a", newline="") as f:
+                w = csv.writer(f)
+                if new:
+                    w.writerow(SCHEMAS["closed"].names)
+                w.writerow([r[0].isoformat(), *r[1:]])
+        csv_us = (time.perf_counter() - t0) / 20_000 * 1e6
+
+        j = Journal("closed", root=tmp, flush_seconds=0)
+        t0 = time.perf_counter()
+        for r in rows:
+            j.append(r)
+        j.flush()
+        jr_us = (time.perf_counter() - t0) / n * 1e6
+        t0 = time.perf_counter()
+        arr = read("closed", root=tmp)
+        _, inv = np.unique(arr["symbol"], return_inverse=True)
+        wins = np.bincount(inv, weights=arr["pnl_dollars"] > 0)
+        t1 = time.perf_counter()
+        with open(pathlib.Path(tmp, "closed_trades.csv"), newline="") as f:
+            sum(1 for r in csv.DictReader(f) if float(r["pnl_dollars"]) > 0)
+        t2 = time.perf_counter()
+        days = len(list(segments("closed", root=tmp)))
+        print(f"append: csv {csv_us:.1f} us/row, journal {jr_us:.1f} us/row ({n:,} rows, {days} segments)")
+        print(f"per-symbol win counts over {n:,} rows: {(t1 - t0) * 1e3:.0f} ms "
+              f"(csv re-parse of 20,000 rows: {(t2 - t1) * 1e3:.0f} ms)")
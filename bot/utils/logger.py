@@ -1,33 +1,26 @@
-import csv, pathlib, datetime as dt
+import datetime as dt
+from bot.utils.journal import get_journal
+from bot.utils.trade_history import get_index
 
-LOG_PATH = pathlib.Path("logs"); LOG_PATH.mkdir(exist_ok=True)
+# rows go to the buffered columnar journal (logs/journal/<kind>/); CSV is an export:
+#   python -m bot.utils.journal export closed closed_export.csv
 
 def log_trade(filing, order):
-    path = LOG_PATH / "trades.csv"
-    is_new = not path.exists()
-    with path.open("a", newline="") as f:
-        writer = csv.writer(f)
-        if is_new:
-            writer.writerow(["utc_time", "ticker", "form", "qty", "alpaca_id"])
-        writer.writerow([
-            dt.datetime.utcnow().isoformat(timespec="seconds"),
-            filing["ticker"],
-            filing["form"],
-            order.qty,
-            order.id,
-        ])
+    get_journal("trades").append((
+        dt.datetime.utcnow().replace(microsecond=0),
+        filing["ticker"],
+        filing["form"],
+        int(float(order.qty)),
+        str(order.id),
+    ))
 
 def log_close(entry, exit_price, reason):
-    path = LOG_PATH / "closed_trades.csv"
-    is_new = not path.exists()
-    with path.open("a", newline="") as f:
-        writer = csv.writer(f)
-        if is_new:
-            writer.writerow(["utc_exit", "symbol", "qty",
-                             "entry_price", "exit_price", "pnl_dollars", "reason"])
-        pnl = (exit_price - entry["entry_price"]) * entry["qty"]
-        writer.writerow([
-            dt.datetime.utcnow().isoformat(timespec="seconds"),
-            entry["symbol"], entry["qty"],
-            entry["entry_price"], exit_price, round(pnl, 2), reason
-        ])
+    index = get_index()  # build before appending so the new row isn't counted twice
+    now = dt.datetime.utcnow().replace(microsecond=0)
+    pnl = round((exit_price - entry["entry_price"]) * entry["qty"], 2)
+    get_journal("closed").append((
+        now,
+        entry["symbol"], entry["qty"],
+        entry["entry_price"], exit_price, pnl, reason
+    ))
+    index.record(entry["symbol"], pnl, now)
@@ -0,0 +1,288 @@
+# bot/utils/metrics.py
+"""
+In-process metrics: latency histograms fed by timing spans, plus counters and
+gauges, rendered as Prometheus text on a local HTTP endpoint.
+
+    with span("decide_trade", strategy="momentum"):
+        ...
+
+    @timed("broker.current_price")
+    def current_price(self, symbol): ...
+
+Histograms use fixed log-spaced buckets (ratio √2), so an observation is a
+bisect and a few increments under a lock. Quantiles are interpolated inside a
+bucket, which keeps them within one bucket width of the true value. Besides the
+cumulative counts every histogram keeps a window that cycle_summary() reads
+and resets, for the per-cycle log line.
+"""
+import bisect, functools, os, threading, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9108"))  # 0 = no endpoint
+BUCKETS = tuple(1e-4 * 2 ** (k / 2) for k in range(48))  # 100 µs .. ~20 min, then +Inf
+SPAN_FAMILY = "bot_span_seconds"
+INF_LABEL = 'le="+Inf"'
+
+_lock = threading.Lock()
+_histograms = {}   # (family, labels) -> Histogram
+_counters = {}     # (family, labels) -> float
+_gauges = {}       # (family, labels) -> float or zero-arg callable
+_help = {}
+
+
+def _key(family: str, labels: dict) -> tuple:
+    return family, tuple(sorted(labels.items()))
+
+
+class Histogram:
+    __slots__ = ("family", "labels", "counts", "window", "window_sum", "sum", "count", "_lock")
+
+    def __init__(self, family: str, labels: tuple):
+        self.family, self.labels = family, labels
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.window = [0] * (len(BUCKETS) + 1)
+        self.window_sum = 0.0
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        i = bisect.bisect_left(BUCKETS, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.window[i] += 1
+            self.window_sum += value
+            self.sum += value
+            self.count += 1
+
+    @staticmethod
+    def _quantile(counts: list, q: float) -> float | None:
+        total = sum(counts)
+        if not total:
+            return None
+        rank = q * total
+        seen = 0
+        for i, n in enumerate(counts):
+            if n and seen + n >= rank:
+                lo = BUCKETS[i - 1] if i else 0.0
+                hi = BUCKETS[i] if i < len(BUCKETS) else BUCKETS[-1]
+                return lo + (hi - lo) * (rank - seen) / n
+            seen += n
+        return BUCKETS[-1]
+
+    def quantile(self, q: float) -> float | None:
+        with self._lock:
+            counts = list(self.counts)
+        return self._quantile(counts, q)
+
+    def take_window(self) -> tuple[list, float]:
+        """(counts, sum) observed since the last call; resets the window."""
+        with self._lock:
+            counts, total = self.window, self.window_sum
+            self.window, self.window_sum = [0] * len(counts), 0.0
+        return counts, total
+
+
+def histogram(family: str, **labels) -> Histogram:
+    key = _key(family, labels)
+    h = _histograms.get(key)
+    if h is None:
+        with _lock:
+            h = _histograms.setdefault(key, Histogram(family, key[1]))
+    return h
+
+
+def observe(family: str, value: float, **labels):
+    histogram(family, **labels).observe(value)
+
+
+def inc(family: str, value: float = 1, **labels):
+    key = _key(family, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def set_gauge(family: str, value, **labels):
+    """Set a gauge to a number, or to a zero-arg callable read at scrape time."""
+    with _lock:
+        _gauges[_key(family, labels)] = value
+
+
+def describe(family: str, text: str):
+    _help[family] = text
+
+
+class span:
+    """Times a block into bot_span_seconds{span=name, ...}; exceptions also count
+    into bot_span_errors_total and propagate."""
+    __slots__ = ("_hist", "_t0")
+
+    def __init__(self, name: str, **labels):
+        self._hist = histogram(SPAN_FAMILY, span=name, **labels)
+
+    def __enter__(self):
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._hist.observe(time.perf_counter() - self._t0)
+        if exc_type is not None:
+            inc("bot_span_errors_total", **dict(self._hist.labels))
+        return False
+
+
+def timed(name: str):
+    """Decorator form of span for functions and methods."""
+    def wrap(fn):
+        hist = histogram(SPAN_FAMILY, span=name)
+
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            except Exception:
+                inc("bot_span_errors_total", span=name)
+                raise
+            finally:
+                hist.observe(time.perf_counter() - t0)
+        return inner
+    return wrap
+
+
+# --- reporting ---------------------------------------------------------------
+def _fmt_labels(labels, extra: str = "") -> str:
+    parts = ['%s="%s"' % (k, str(v).replace('"', '\\"')) for k, v in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    with _lock:
+        hists = sorted(_histograms.values(), key=lambda h: (h.family, h.labels))
+        counters = sorted(_counters.items())
+        gauges = sorted(_gauges.items())
+    out, typed = [], set()
+
+    def header(family, kind):
+        if family not in typed:
+            typed.add(family)
+            if family in _help:
+                out.append(f"# HELP {family} {_help[family]}")
+            out.append(f"# TYPE {family} {kind}")
+
+    for h in hists:
+        with h._lock:
+            counts, total, n = list(h.counts), h.sum, h.count
+        header(h.family, "histogram")
+        cum = 0
+        for le, c in zip(BUCKETS, counts):
+            cum += c
+            le_label = 'le="%.6g"' % le
+            out.append(f"{h.family}_bucket{_fmt_labels(h.labels, le_label)} {cum}")
+        out.append(f"{h.family}_bucket{_fmt_labels(h.labels, INF_LABEL)} {n}")
+        out.append(f"{h.family}_sum{_fmt_labels(h.labels)} {total}")
+        out.append(f"{h.family}_count{_fmt_labels(h.labels)} {n}")
+    for (family, labels), v in counters:
+        header(family, "counter")
+        out.append(f"{family}{_fmt_labels(labels)} {v}")
+    for (family, labels), v in gauges:
+        header(family, "gauge")
+        try:
+            v = v() if callable(v) else v
+        except Exception:
+            continue
+        out.append(f"{family}{_fmt_labels(labels)} {v}")
+    return "\n".join(out) + "\n"
+
+
+def cycle_summary(family: str = SPAN_FAMILY) -> list[dict]:
+    """Per-series count, p50/p95/p99 and total seconds since the last call,
+    slowest total first; resets the windows of `family`."""
+    with _lock:
+        hists = [h for h in _histograms.values() if h.family == family]
+    rows = []
+    for h in hists:
+        counts, total = h.take_window()
+        n = sum(counts)
+        if not n:
+            continue
+        q = Histogram._quantile
+        rows.append({"labels": dict(h.labels), "n": n, "total": total,
+                     "p50": q(counts, 0.5), "p95": q(counts, 0.95), "p99": q(counts, 0.99)})
+    return sorted(rows, key=lambda r: r["total"], reverse=True)
+
+
+def format_summary(rows: list[dict], top: int = 6) -> str:
+    """One line: 'name[labels] n× p50/p95/p99 ms' for the `top` rows."""
+    parts = []
+    for r in rows[:top]:
+        labels = dict(r["labels"])
+        name = labels.pop("span", "")
+        extra = ",".join(str(v) for _, v in sorted(labels.items()))
+        parts.append(f"{name}{f'[{extra}]' if extra else ''} {r['n']}× "
+                     f"{r['p50'] * 1e3:.1f}/{r['p95'] * 1e3:.1f}/{r['p99'] * 1e3:.1f}ms")
+    return "; ".join(parts)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def serve(port: int = METRICS_PORT, host: str = "127.0.0.1"):
+    """Serve /metrics from a daemon thread; returns the server, or None if disabled/failed."""
+    if not port:
+        return None
+    try:
+        server = ThreadingHTTPServer((host, port), _Handler)
+    except OSError as e:
+        print(f"metrics endpoint disabled ({host}:{port}):", e)
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    # overhead benchmark: python -m bot.utils.metrics
+    n = 200_000
+    t0 = time.perf_counter()
+    for _ in range(n):
+        pass
+    base = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    for _ in range(n):
+        with span("bench"):
+            pass
+    print(f"span:  {(time.perf_counter() - t0 - base) / n * 1e6:.2f} µs per block")
+
+    @timed("bench.fn")
+    def f():
+        return None
+    t0 = time.perf_counter()
+    for _ in range(n):
+        f()
+    print(f"timed: {(time.perf_counter() - t0 - base) / n * 1e6:.2f} µs per call")
+    h = histogram("bench_exact")
+    import random
+    vals = [random.lognormvariate(-4, 1) for _ in range(100_000)]
+    for v in vals:
+        h.observe(v)
+    vals.sort()
+    for q in (0.5, 0.95, 0.99):
+        print(f"p{int(q * 100)}: histogram {h.quantile(q) * 1e3:.2f} ms vs exact {vals[int(q * len(vals)) - 1] * 1e3:.2f} ms")
+    print(f"render: {len(render().splitlines())} lines")
@@ -1,30 +1,239 @@
-import json, pathlib
+import json, os, pathlib, threading
 from datetime import datetime
 
-POS_FILE = pathlib.Path("state/open_positions.json")
-POS_FILE.parent.mkdir(exist_ok=True)
+POS_FILE = pathlib.Path("state/open_positions.json")       # compacted snapshot
+JOURNAL_FILE = pathlib.Path("state/open_positions.journal")  # mutations since snapshot
+
+COMPACT_EVERY = 200  # journal records before the snapshot is rewritten
 
 def _convert(dt):  # helper for json default
     return dt.isoformat()
 
+
+class Position:
+    """One open position. Supports pos["field"] so older dict-based callers keep working.
+    `exit_orders` holds the ids of server-side exit orders protecting it (bot.risk.protect)."""
+    __slots__ = ("symbol", "qty", "entry_price", "entry_time", "exit_orders")
+
+    def __init__(self, symbol: str, qty: int, entry_price: float, entry_time: datetime,
+                 exit_orders: list | None = None):
+        self.symbol = symbol
+        self.qty = qty
+        self.entry_price = entry_price
+        self.entry_time = entry_time
+        self.exit_orders = list(exit_orders or ())
+
+    def __getitem__(self, key):
+        return getattr(self, key)
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+    def __repr__(self):
+        return f"Position({self.symbol!r}, qty={self.qty}, entry_price={self.entry_price}, entry_time={self.entry_time})"
+
+    def as_dict(self) -> dict:
+        return {k: getattr(self, k) for k in self.__slots__}
+
+
+class PositionBook:
+    """Resident, symbol-keyed position book with a write-ahead journal.
+
+    Every mutation is appended (and fsync'd) to JOURNAL_FILE before it is
+    applied; startup loads the snapshot and replays the journal. The snapshot
+    is rewritten only every `compact_every` journal records. Records carry a
+    sequence number, so a crash between snapshot and journal truncation
+    never replays a mutation twice.
+    A second buy of a held symbol is merged: quantities add up, the entry
+    price becomes the quantity-weighted average, the earliest entry time is
+    kept and both buys' exit orders are tracked.
+    """
+
+    def __init__(self, snapshot: pathlib.Path = POS_FILE, journal: pathlib.Path = JOURNAL_FILE,
+                 compact_every: int = COMPACT_EVERY):
+        self.snapshot = pathlib.Path(snapshot)
+        self.journal = pathlib.Path(journal)
+        self.compact_every = compact_every
+        self._lock = threading.RLock()
+        self._book: dict[str, Position] = {}
+        self._pending = 0
+        self._seq = 0      # sequence number of the last applied journal record
+        for d in {self.snapshot.parent, self.journal.parent}:
+            d.mkdir(parents=True, exist_ok=True)
+        torn = self._load()
+        self._fh = self.journal.open("a")
+        if torn:
+            self.compact()  # drop the partial record before appending after it
+
+    # --- queries ---
+    def __len__(self):
+        return len(self._book)
+
+    def __contains__(self, symbol: str):
+        return symbol in self._book
+
+    def __iter__(self):
+        return iter(self.positions())
+
+    def get(self, symbol: str) -> Position | None:
+        return self._book.get(symbol)
+
+    def positions(self) -> list[Position]:
+        with self._lock:
+            return list(self._book.values())
+
+    # --- mutations ---
+    def add(self, pos) -> Position:
+        rec = {"op": "add", "symbol": pos["symbol"], "qty": pos["qty"],
+               "entry_price": pos["entry_price"], "entry_time": pos["entry_time"].isoformat(),
+               "exit_orders": list(pos.get("exit_orders") or ())}
+        with self._lock:
+            self._append(rec)
+            pos = self._apply(rec)
+            self._maybe_compact()
+            return pos
+
+    def remove(self, symbol: str) -> Position | None:
+        with self._lock:
+            if symbol not in self._book:
+                return None
+            self._append({"op": "remove", "symbol": symbol})
+            pos = self._book.pop(symbol)
+            self._maybe_compact()
+            return pos
+
+    def reduce(self, symbol: str, qty: int) -> Position | None:
+        """Take `qty` shares off a position (a partial close); removes it at zero."""
+        with self._lock:
+            pos = self._book.get(symbol)
+            if pos is None:
+                return None
+            if qty >= pos.qty:
+                return self.remove(symbol)
+            self._append({"op": "reduce", "symbol": symbol, "qty": qty})
+            pos.qty -= qty
+            self._maybe_compact()
+            return pos
+
+    def set_exit_orders(self, symbol: str, order_ids) -> Position | None:
+        with self._lock:
+            pos = self._book.get(symbol)
+            if pos is None:
+                return None
+            rec = {"op": "exit_orders", "symbol": symbol, "exit_orders": list(order_ids)}
+            self._append(rec)
+            pos = self._apply(rec)
+            self._maybe_compact()
+            return pos
+
+    def replace(self, positions):
+        """Swap the whole book (e.g. after reconciling with the broker) and compact."""
+        with self._lock:
+            self._book = {}
+            for p in positions:
+                self._apply({"op": "add", "symbol": p["symbol"], "qty": p["qty"],
+                             "entry_price": p["entry_price"], "entry_time": p["entry_time"],
+                             "exit_orders": p.get("exit_orders") or []})
+            self.compact()
+
+    def compact(self):
+        with self._lock:
+            tmp = self.snapshot.with_suffix(".tmp")
+            data = {"seq": self._seq, "positions": [p.as_dict() for p in self._book.values()]}
+            tmp.write_text(json.dumps(data, default=_convert, indent=2))
+            os.replace(tmp, self.snapshot)
+            self._fh.close()
+            self._fh = self.journal.open("w")
+            self._pending = 0
+
+    def close(self):
+        with self._lock:
+            self._fh.close()
+
+    # --- internals ---
+    def _append(self, rec: dict):
+        self._seq += 1
+        rec["seq"] = self._seq
+        self._fh.write(json.dumps(rec) + "\n")
+        self._fh.flush()
+        os.fsync(self._fh.fileno())
+        self._pending += 1
+
+    def _maybe_compact(self):
+        if self._pending >= self.compact_every:
+            self.compact()
+
+    def _apply(self, rec: dict) -> Position | None:
+        sym = rec["symbol"]
+        if rec["op"] == "remove":
+            return self._book.pop(sym, None)
+        if rec["op"] in ("reduce", "exit_orders"):
+            cur = self._book.get(sym)
+            if cur is not None:
+                if rec["op"] == "reduce":
+                    cur.qty -= rec["qty"]
+                else:
+                    cur.exit_orders = list(rec["exit_orders"])
+            return cur
+        entry_time = rec["entry_time"]
+        if isinstance(entry_time, str):
+            entry_time = datetime.fromisoformat(entry_time)
+        cur = self._book.get(sym)
+        if cur is None:
+            cur = self._book[sym] = Position(sym, rec["qty"], rec["entry_price"], entry_time,
+                                             rec.get("exit_orders"))
+        else:
+            cur.exit_orders += rec.get("exit_orders") or []
+            qty = cur.qty + rec["qty"]
+            cur.entry_price = (cur.entry_price * cur.qty + rec["entry_price"] * rec["qty"]) / qty
+            cur.qty = qty
+            cur.entry_time = min(cur.entry_time, entry_time)
+        return cur
+
+    def _load(self) -> bool:
+        """Load snapshot + journal; True if the journal ended in a torn record."""
+        if self.snapshot.exists():
+            data = json.loads(self.snapshot.read_text())
+            if isinstance(data, list):  # pre-journal format
+                data = {"seq": 0, "positions": data}
+            for d in data["positions"]:
+                self._apply({"op": "add", **d})
+            self._seq = data["seq"]
+        if self.journal.exists():
+            with self.journal.open() as f:
+                for line in f:
+                    try:
+                        rec = json.loads(line)
+                    except ValueError:
+                        return True  # torn final write from a crash
+                    if rec.get("seq", 0) <= self._seq:
+                        continue     # already folded into the snapshot
+                    self._apply(rec)
+                    self._seq = rec["seq"]
+                    self._pending += 1
+        return False
+
+
+_book: PositionBook | None = None
+_book_guard = threading.Lock()
+
+def get_book() -> PositionBook:
+    """Process-wide position book, loaded on first use."""
+    global _book
+    with _book_guard:
+        if _book is None:
+            _book = PositionBook()
+        return _book
+
+# --- legacy helpers, now thin wrappers over the resident book ---
 def load_open() -> list[dict]:
-    if POS_FILE.exists():
-        data = json.loads(POS_FILE.read_text())
-        for d in data:
-            d["entry_time"] = datetime.fromisoformat(d["entry_time"])
-        return data
-    return []
+    return [p.as_dict() for p in get_book().positions()]
 
 def save_open(open_pos: list[dict]):
-    for d in open_pos:
-        d["entry_time"] = d["entry_time"].isoformat()
-    POS_FILE.write_text(json.dumps(open_pos, default=_convert, indent=2))
+    get_book().replace(open_pos)
 
 def add_position(pos):
-    open_pos = load_open()
-    open_pos.append(pos)
-    save_open(open_pos)
+    get_book().add(pos)
 
 def remove_position(symbol):
-    open_pos = [p for p in load_open() if p["symbol"] != symbol]
-    save_open(open_pos)
+    get_book().remove(symbol)
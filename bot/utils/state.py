@@ -1,12 +1,112 @@
 # bot/utils/state.py
-import json, pathlib
-STATE_FILE = pathlib.Path("state/seen.json")
-STATE_FILE.parent.mkdir(exist_ok=True)
+import json, pathlib, sqlite3, threading, time
+STATE_FILE = pathlib.Path("state/seen.json")   # legacy store, migrated on first load
+DB_FILE = pathlib.Path("state/seen.db")
 
-def load_seen() -> set[str]:
+RETENTION_DAYS = 14      # EDGAR's current feed only reaches back a few days
+PRUNE_EVERY = 5_000      # inserts between retention sweeps
+
+
+class SeenStore:
+    """Set-like store of seen filing hashes backed by an indexed SQLite table.
+
+    Nothing is loaded at startup: membership is a primary-key lookup and an
+    insert is one row in the WAL, so both stay flat as the table grows.
+    Rows older than `retention_days` are dropped periodically.
+    """
+
+    def __init__(self, path: pathlib.Path = DB_FILE, retention_days: float = RETENTION_DAYS):
+        self.path = pathlib.Path(path)
+        self.retention = retention_days * 86400
+        self._lock = threading.Lock()
+        self._inserts = 0
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS seen ("
+                         "fid TEXT PRIMARY KEY, seen_at REAL NOT NULL) WITHOUT ROWID")
+        self._db.execute("CREATE INDEX IF NOT EXISTS seen_age ON seen(seen_at)")
+        self._db.commit()
+        self.prune()
+
+    def __contains__(self, fid: str) -> bool:
+        with self._lock:
+            return self._db.execute("SELECT 1 FROM seen WHERE fid = ?", (fid,)).fetchone() is not None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM seen").fetchone()[0]
+
+    def add(self, fid: str, seen_at: float | None = None):
+        with self._lock:
+            self._db.execute("INSERT OR IGNORE INTO seen VALUES (?, ?)", (fid, seen_at or time.time()))
+            self._inserts += 1
+            due = self._inserts % PRUNE_EVERY == 0
+        if due:
+            self.prune()
+
+    def update(self, fids, seen_at: float | None = None):
+        ts = seen_at or time.time()
+        with self._lock:
+            self._db.executemany("INSERT OR IGNORE INTO seen VALUES (?, ?)", ((f, ts) for f in fids))
+            self._db.commit()
+
+    def commit(self):
+        with self._lock:
+            self._db.commit()
+
+    def prune(self):
+        with self._lock:
+            self._db.execute("DELETE FROM seen WHERE seen_at < ?", (time.time() - self.retention,))
+            self._db.commit()
+
+    def close(self):
+        with self._lock:
+            self._db.commit()
+            self._db.close()
+
+
+def load_seen() -> SeenStore:
+    store = SeenStore()
     if STATE_FILE.exists():
-        return set(json.loads(STATE_FILE.read_text()))
-    return set()
+        # one-time migration from the old rewrite-everything JSON file
+        store.update(json.loads(STATE_FILE.read_text()))
+        STATE_FILE.rename(STATE_FILE.with_suffix(".json.migrated"))
+    return store
+
+
+def save_seen(seen):
+    if isinstance(seen, SeenStore):
+        seen.commit()
+        return
+    store = SeenStore()   # plain set from older callers
+    store.update(seen)
+    store.close()
+
+
+if __name__ == "__main__":
+    # benchmark: python -m bot.utils.state [n_hashes]
+    import hashlib, sys, tempfile
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    hashes = [hashlib.sha1(str(i).encode()).hexdigest() for i in range(n)]
+    fresh = [hashlib.sha1(f"new{i}".encode()).hexdigest() for i in range(200)]
+    with tempfile.TemporaryDirectory() as tmp:
+        js = pathlib.Path(tmp, "seen.json")
+        js.write_text(json.dumps(hashes))
+        t0 = time.perf_counter(); seen = set(json.loads(js.read_text())); t1 = time.perf_counter()
+        for h in fresh[:20]:
+            seen.add(h); js.write_text(json.dumps(list(seen)))
+        t2 = time.perf_counter()
+        print(f"json   n={n:,}: load {t1 - t0:8.3f}s  insert {(t2 - t1) / 20 * 1e3:9.3f} ms")
 
-def save_seen(seen: set[str]):
-    STATE_FILE.write_text(json.dumps(list(seen)))
+        store = SeenStore(pathlib.Path(tmp, "seen.db"))
+        store.update(hashes); store.close()
+        t0 = time.perf_counter(); store = SeenStore(pathlib.Path(tmp, "seen.db")); t1 = time.perf_counter()
+        for h in fresh:
+            store.add(h); store.commit()
+        t2 = time.perf_counter()
+        _ = [h in store for h in hashes[:1000]]
+        t3 = time.perf_counter()
+        print(f"sqlite n={n:,}: load {t1 - t0:8.3f}s  insert {(t2 - t1) / len(fresh) * 1e3:9.3f} ms"
+              f"  lookup {(t3 - t2) / 1000 * 1e6:6.1f} us")
@@ -0,0 +1,178 @@
+# bot/utils/trade_history.py
+"""Per-symbol aggregates over closed trades, built once and updated in place."""
+import csv, pathlib, threading, datetime as dt
+import numpy as np
+
+CLOSED_TRADES = pathlib.Path("logs") / "closed_trades.csv"   # legacy per-row log, read if present
+
+# The journal replaced closed_trades.csv, so only CSV rows older than its first row are
+# history it lacks; later ones (e.g. `journal export closed logs/closed_trades.csv`) are
+# copies of journal rows and are skipped instead of counted twice.
+
+
+class SymbolStats:
+    __slots__ = ("count", "wins", "pnl_sum", "last_exit")
+
+    def __init__(self):
+        self.count = 0
+        self.wins = 0
+        self.pnl_sum = 0.0
+        self.last_exit = None
+
+    @property
+    def win_rate(self) -> float:
+        return self.wins / self.count
+
+    @property
+    def mean_pnl(self) -> float:
+        return self.pnl_sum / self.count
+
+    def as_dict(self) -> dict:
+        return {"count": self.count, "wins": self.wins, "win_rate": self.win_rate,
+                "mean_pnl": self.mean_pnl, "pnl_sum": self.pnl_sum, "last_exit": self.last_exit}
+
+
+def _row_pnl(r: dict):
+    try:
+        return float(r.get("pnl_dollars", r.get("pnl", "0")))
+    except Exception:
+        # some files use different headers — try to compute
+        try:
+            entry = float(r.get("entry_price", 0))
+            exit_p = float(r.get("exit_price", 0))
+            qty = float(r.get("qty", 1))
+            return (exit_p - entry) * qty
+        except Exception:
+            return None
+
+
+class TradeHistoryIndex:
+    """O(1) win/loss/PnL lookups per symbol; fed by logger.log_close."""
+
+    def __init__(self):
+        self._stats: dict[str, SymbolStats] = {}
+        self._lock = threading.Lock()
+        self._listeners = []
+        self.journal_start = None   # utc_exit of the journal's first row, once loaded
+
+    def record(self, symbol: str, pnl: float, exit_time: dt.datetime | None = None):
+        with self._lock:
+            s = self._stats.get(symbol)
+            if s is None:
+                s = self._stats[symbol] = SymbolStats()
+            s.count += 1
+            s.wins += pnl > 0
+            s.pnl_sum += pnl
+            if exit_time is not None and (s.last_exit is None or exit_time > s.last_exit):
+                s.last_exit = exit_time
+        for fn in self._listeners:
+            fn(symbol, pnl, exit_time)
+
+    def subscribe(self, fn):
+        """Call fn(symbol, pnl, exit_time) after every record() (bot.workers keeps shard copies)."""
+        self._listeners.append(fn)
+
+    def stats(self, symbol: str) -> SymbolStats | None:
+        return self._stats.get(symbol)
+
+    def win_rate(self, symbol: str) -> float | None:
+        s = self._stats.get(symbol)
+        return s.win_rate if s else None
+
+    def __len__(self):
+        return len(self._stats)
+
+    @classmethod
+    def from_csv(cls, path: pathlib.Path = CLOSED_TRADES) -> "TradeHistoryIndex":
+        return cls().load_csv(path)
+
+    def load_csv(self, path: pathlib.Path = CLOSED_TRADES, before: dt.datetime | None = None
+                 ) -> "TradeHistoryIndex":
+        """Fold in a per-row closed-trades CSV, only rows that exited before `before` if given."""
+        if not path.exists():
+            return self
+        try:
+            with path.open(newline="") as f:
+                for r in csv.DictReader(f):
+                    symbol = r.get("symbol")
+                    pnl = _row_pnl(r)
+                    if not symbol or pnl is None:
+                        continue
+                    try:
+                        when = dt.datetime.fromisoformat(r.get("utc_exit", ""))
+                    except ValueError:
+                        when = None
+                    if before is not None and when is not None and when >= before:
+                        continue
+                    self.record(symbol, pnl, when)
+        except Exception as e:
+            print("trade history index build failed:", e)
+        return self
+
+    def load_journal(self, root=None) -> "TradeHistoryIndex":
+        """Fold the closed-trade journal in, one vectorized group-by over its segments."""
+        from bot.utils import journal
+        try:
+            arr = journal.read("closed", root=root or journal.JOURNAL_ROOT)
+        except Exception as e:
+            print("trade history journal load failed:", e)
+            return self
+        if not len(arr):
+            return self
+        self.journal_start = arr["utc_exit"].min().item()
+        syms, inv = np.unique(arr["symbol"], return_inverse=True)
+        pnl = arr["pnl_dollars"]
+        counts = np.bincount(inv, minlength=len(syms))
+        wins = np.bincount(inv, weights=pnl > 0, minlength=len(syms))
+        sums = np.bincount(inv, weights=pnl, minlength=len(syms))
+        last = np.full(len(syms), arr["utc_exit"].min())
+        np.maximum.at(last, inv, arr["utc_exit"])
+        with self._lock:
+            for i, sym in enumerate(syms.tolist()):
+                s = self._stats.get(sym)
+                if s is None:
+                    s = self._stats[sym] = SymbolStats()
+                s.count += int(counts[i])
+                s.wins += int(wins[i])
+                s.pnl_sum += float(sums[i])
+                when = last[i].item()
+                if s.last_exit is None or when > s.last_exit:
+                    s.last_exit = when
+        return self
+
+
+_index: TradeHistoryIndex | None = None
+_index_guard = threading.Lock()
+
+def get_index() -> TradeHistoryIndex:
+    """Process-wide index, built on first use from the journal plus the legacy closed_trades.csv."""
+    global _index
+    with _index_guard:
+        if _index is None:
+            idx = TradeHistoryIndex().load_journal()
+            _index = idx.load_csv(CLOSED_TRADES, before=idx.journal_start)
+        return _index
+
+
+if __name__ == "__main__":
+    # benchmark: python -m bot.utils.trade_history [rows]
+    import random, sys, tempfile, time
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    rng = random.Random(0)
+    syms = [f"S{i:04d}" for i in range(3000)]
+    with tempfile.TemporaryDirectory() as tmp:
+        path = pathlib.Path(tmp, "closed_trades.csv")
+        with path.open("w", newline="") as f:
+            w = csv.writer(f)
+            w.writerow(["utc_exit", "symbol", "qty", "entry_price", "exit_price", "pnl_dollars", "reason"])
+            for i in range(n):
+                w.writerow(["2024-01-02T15:00:00", rng.choice(syms), 1, 10, 10.5, round(rng.gauss(0, 5), 2), "TP"])
+        t0 = time.perf_counter(); idx = TradeHistoryIndex.from_csv(path); t1 = time.perf_counter()
+        for _ in range(10_000):
+            idx.stats(rng.choice(syms))
+        t2 = time.perf_counter()
+        with path.open(newline="") as f:  # the old per-filing full scan, for comparison
+            sum(1 for r in csv.DictReader(f) if r["symbol"] == syms[0])
+        t3 = time.perf_counter()
+        print(f"rows={n:,}: build {t1 - t0:.2f}s once, lookup {(t2 - t1) / 10_000 * 1e6:.2f} us"
+              f" (full-scan lookup {t3 - t2:.2f}s)")
@@ -0,0 +1,379 @@
+# bot/workers.py
+"""
+Symbol-sharded strategy workers (WORKERS=N, or python -m bot run --workers N).
+
+The coordinator (bot.main) keeps everything stateful: the EDGAR feed, the
+seen-set, the position book, order placement and exits. Each new filing is
+routed to worker crc32(ticker) % N, a separate process that owns that slice
+of symbols: its own broker for market data (with its share of the REST
+quota), its per-cycle feature memo and the closed-trade history of its
+symbols, kept current by forward_close(). A worker runs every strategy's
+decide_trade on the filing and sends orders back for the coordinator to
+place, then the filing's feature snapshots.
+
+Filings travel in batches of up to WORKER_BATCH (one pickle and one pipe
+write per batch). Task queues are bounded (WORKER_QUEUE_DEPTH batches per
+worker), so a burst blocks the dispatcher instead of piling up in memory;
+results return on one pipe per worker, drained by a collector thread, so a
+worker never waits on the coordinator (and a worker killed mid-message only
+breaks its own pipe). A blocked dispatch rechecks its worker every
+PUT_POLL seconds and respawns it if it died (filings its queue held are
+dropped, the blocked batch goes to the replacement); closed trades are handed to an
+outbox thread, so the exit path never waits on a busy shard. Workers are spawned, not forked (the coordinator runs threads).
+
+Benchmark (synthetic filings, sim broker, no latency or quota):
+
+    python -m bot.workers [filings] [workers ...]
+"""
+import os, queue, threading, time, zlib
+import multiprocessing as mp
+from multiprocessing.connection import wait as wait_readable
+from concurrent.futures import wait
+
+WORKERS = int(os.getenv("WORKERS", "0"))                          # 0 = evaluate in-process
+WORKER_QUEUE_DEPTH = int(os.getenv("WORKER_QUEUE_DEPTH", "8"))    # batches in flight per worker
+WORKER_BATCH = int(os.getenv("WORKER_BATCH", "16"))               # filings per queue message
+START_TIMEOUT = 60.0    # seconds for a worker to import the bot and build its broker
+PUT_POLL = 1.0          # seconds between liveness checks while a dispatch waits on a full queue
+
+
+def shard_of(symbol: str, n: int) -> int:
+    """Worker owning `symbol`; stable across processes and runs (unlike hash())."""
+    return zlib.crc32(symbol.encode()) % n
+
+
+def _worker(shard: int, tasks, results, broker_kind: str, per_minute: int, record: bool):
+    """Worker process: evaluate filings of one symbol shard until a None task."""
+    from bot import main as bot
+    from bot.strategies import pipeline, snapshots
+    from bot.utils.trade_history import get_index
+    bot.BROKER = broker_kind
+    broker = bot.new_broker(per_minute)
+    history = get_index()
+    results.send(("ready", shard))
+    while True:
+        msg = tasks.get()
+        if msg is None:
+            return
+        kind = msg[0]
+        if kind == "filings":
+            signalled = []
+            for seq, filing, fetched_at in msg[1]:
+                for strat in bot.STRATEGIES:
+                    try:
+                        order = strat.decide_trade(filing, broker)
+                    except Exception as e:
+                        print(f"strategy {strat.__name__} error:", e)
+                        order = None
+                    if order:   # sent at once: orders don't wait for the rest of the batch
+                        results.send(("order", seq, strat.__name__, filing, order, fetched_at))
+                    signalled.append((seq, filing, strat, bool(order)))
+            results.send(("done", [seq for seq, _, _ in msg[1]]))
+            if record:   # after "done": snapshots never hold up the cycle
+                rows = []
+                for seq, filing, strat, traded in signalled:
+                    if not snapshots.sampled(filing):
+                        continue
+                    try:
+                        row = snapshots.capture(strat, filing, broker, traded)
+                    except Exception as e:
+                        print(f"feature snapshot for {filing.get('ticker')} failed:", e)
+                        row = None
+                    if row is not None:
+                        rows.append((seq, strat.__name__, row))
+                if rows:
+                    results.send(("snapshots", rows))
+        elif kind == "cycle":
+            pipeline.new_cycle(broker)
+        elif kind == "close":
+            history.record(*msg[1:])
+        elif kind == "stats":
+            results.send(("stats", shard, pipeline.stats(reset=True)))
+
+
+class WorkerPool:
+    """N strategy worker processes plus the coordinator-side dispatch and collection.
+
+    on_order(strategy_name, filing, order, fetched_at) runs on the collector
+    thread and returns a Future resolving to True once the order is placed;
+    on_snapshot(row) gets each feature snapshot, its traded flag taken from
+    that Future.
+    """
+
+    def __init__(self, n: int, on_order, on_snapshot=None, broker_kind: str = "alpaca",
+                 per_minute: int = 0, depth: int = WORKER_QUEUE_DEPTH):
+        self.n = n
+        self.on_order, self.on_snapshot = on_order, on_snapshot
+        self.broker_kind, self.per_minute, self.depth = broker_kind, per_minute, depth
+        self._ctx = mp.get_context("spawn")
+        self._readers = [None] * n   # per shard, the result pipe of its current process
+        self._stopping = False
+        self._tasks = [None] * n
+        self._procs = [None] * n
+        self._gen = [0] * n     # per shard, bumped by every (re)spawn
+        self._cond = threading.Condition()
+        self._pending = {}      # seq -> (shard, generation of the worker whose queue took it, or None)
+        self._placing = {}      # (seq, strategy) -> placement Future
+        self._ready = set()
+        self._shard_stats = {}  # shard -> pipeline.stats() of its last "stats" reply
+        self._seq = 0
+        self._outbox = queue.SimpleQueue()   # (shard, msg) for the outbox thread
+        self._batches = [[] for _ in range(n)]   # per shard, filings not yet queued
+        self._collector = self._sender = None
+        self._reset_counters()
+
+    def _reset_counters(self):
+        self.filings = [0] * self.n
+        self.blocked = 0          # dispatches that found their worker's queue full
+        self.blocked_s = 0.0
+
+    # --- lifecycle ---
+    def start(self):
+        """Spawn the workers and wait until each has built its broker."""
+        self._collector = threading.Thread(target=self._collect, name="worker-results", daemon=True)
+        self._collector.start()
+        self._sender = threading.Thread(target=self._send, name="worker-outbox", daemon=True)
+        self._sender.start()
+        for shard in range(self.n):
+            self._spawn(shard)
+        with self._cond:
+            if not self._cond.wait_for(lambda: len(self._ready) == self.n, START_TIMEOUT):
+                raise RuntimeError(f"{self.n - len(self._ready)} strategy worker(s) failed to start")
+
+    def _spawn(self, shard: int):
+        record = self.on_snapshot is not None
+        if self._tasks[shard] is not None:   # a dead worker's queue: don't wait to flush it at exit
+            self._tasks[shard].cancel_join_thread()
+        self._tasks[shard] = self._ctx.Queue(self.depth)
+        self._gen[shard] += 1
+        reader, writer = self._ctx.Pipe(duplex=False)
+        p = self._procs[shard] = self._ctx.Process(
+            target=_worker, name=f"strategy-worker-{shard}", daemon=True,
+            args=(shard, self._tasks[shard], writer, self.broker_kind, self.per_minute, record))
+        p.start()
+        writer.close()   # the worker holds the only write end: its death reads as EOF
+        self._readers[shard] = reader
+
+    def stop(self):
+        self._outbox.put(None)
+        self._sender.join(timeout=5.0)
+        for q in self._tasks:
+            try:
+                q.put(None, timeout=1.0)
+            except queue.Full:
+                pass
+        for p in self._procs:
+            p.join(timeout=5.0)
+            if p.is_alive():
+                p.terminate()
+        for q in self._tasks:   # whatever is left unread must not hold up interpreter exit
+            q.cancel_join_thread()
+        self._stopping = True
+        self._collector.join(timeout=5.0)
+
+    # --- coordinator side ---
+    def _put(self, shard: int, msg):
+        # a filings batch is registered to the worker generation whose queue it is put on:
+        # _revive drops exactly what a dead worker took, and a batch still waiting here
+        # when its worker is replaced is re-registered and goes to the new one
+        seqs = [seq for seq, _, _ in msg[1]] if msg[0] == "filings" else ()
+        t0 = None
+        while True:
+            with self._cond:
+                q, gen = self._tasks[shard], self._gen[shard]
+                for seq in seqs:
+                    self._pending[seq] = (shard, gen)
+            try:
+                if t0 is None:
+                    q.put_nowait(msg)
+                else:
+                    q.put(msg, timeout=PUT_POLL)
+                break
+            except queue.Full:      # backpressure: wait for the worker to catch up
+                if t0 is None:
+                    t0 = time.monotonic()
+                    continue
+                if not self._procs[shard].is_alive():   # nobody will drain it: respawn
+                    with self._cond:
+                        self._revive()
+        if t0 is not None:
+            self.blocked += 1
+            self.blocked_s += time.monotonic() - t0
+
+    def _send(self):
+        # outbox thread: messages whose senders must not block
+        while True:
+            item = self._outbox.get()
+            if item is None:
+                return
+            try:
+                self._put(*item)
+            except Exception as e:
+                print("worker message failed:", e)
+
+    def _flush(self, shard: int):
+        batch, self._batches[shard] = self._batches[shard], []
+        if batch:
+            self._put(shard, ("filings", batch))
+
+    def new_cycle(self):
+        """Start of a cycle: workers forget their memoized features."""
+        for shard in range(self.n):
+            self._put(shard, ("cycle",))
+
+    def submit(self, filing: dict, fetched_at: float) -> bool:
+        """Batch a filing for the worker owning its ticker; blocks while that worker is full.
+
+        A batch is queued when full or on wait().
+        """
+        symbol = filing.get("ticker")
+        if not symbol:
+            return False    # strategies reject ticker-less filings anyway
+        shard = shard_of(symbol, self.n)
+        with self._cond:
+            self._seq += 1
+            seq = self._seq
+            self._pending[seq] = (shard, None)   # registered to a worker once queued
+        self.filings[shard] += 1
+        self._batches[shard].append((seq, filing, fetched_at))
+        if len(self._batches[shard]) >= WORKER_BATCH:
+            self._flush(shard)
+        return True
+
+    def forward_close(self, symbol: str, pnl: float, exit_time=None):
+        """A closed trade (TradeHistoryIndex listener): update the owning worker's history.
+
+        Never blocks: it runs on the exit path, queued via the outbox thread.
+        """
+        self._outbox.put((shard_of(symbol, self.n), ("close", symbol, pnl, exit_time)))
+
+    def wait(self):
+        """Block until every submitted filing is evaluated and its orders placed."""
+        for shard in range(self.n):
+            self._flush(shard)
+        with self._cond:
+            while self._pending:
+                if not self._cond.wait(1.0):
+                    self._revive()
+            placing, self._placing = list(self._placing.values()), {}
+        wait(placing)
+
+    def _revive(self):
+        # holding self._cond: respawn dead workers; filings on their queues are lost,
+        # ones not queued yet (batching, or a blocked _put) go to the replacement
+        for shard, p in enumerate(self._procs):
+            if p.is_alive():
+                continue
+            lost = [seq for seq, (s, gen) in self._pending.items() if s == shard and gen == self._gen[shard]]
+            for seq in lost:
+                del self._pending[seq]
+            print(f"strategy worker {shard} died (exit {p.exitcode}); "
+                  f"{len(lost)} filings dropped, restarting")
+            self._ready.discard(shard)
+            self._spawn(shard)
+
+    def stats(self, reset: bool = False) -> dict:
+        """Filings per shard, backpressure waits and the workers' merged filter stats."""
+        from bot.strategies import pipeline
+        with self._cond:
+            self._shard_stats = {}
+        for shard in range(self.n):
+            self._put(shard, ("stats",))
+        with self._cond:
+            self._cond.wait_for(lambda: len(self._shard_stats) == self.n, 10.0)
+            filters = pipeline.merge_stats(self._shard_stats.values())
+        out = {"workers": self.n, "filings": list(self.filings), "blocked": self.blocked,
+               "blocked_s": self.blocked_s, "filters": filters}
+        if reset:
+            self._reset_counters()
+        return out
+
+    # --- collector thread ---
+    def _collect(self):
+        conns = set()
+        while not self._stopping:
+            conns.update(r for r in self._readers if r is not None and not r.closed)
+            for conn in wait_readable(list(conns), timeout=0.2):
+                try:
+                    msg = conn.recv()
+                except (EOFError, OSError):   # its worker died; a respawn brings a new pipe
+                    conns.discard(conn)
+                    conn.close()
+                    continue
+                try:
+                    self._handle(msg)
+                except Exception as e:
+                    print("worker result error:", e)
+
+    def _handle(self, msg):
+        kind = msg[0]
+        if kind == "order":
+            _, seq, name, filing, order, fetched_at = msg
+            fut = self.on_order(name, filing, order, fetched_at)
+            if fut is not None:
+                with self._cond:
+                    self._placing[(seq, name)] = fut
+        elif kind == "done":
+            with self._cond:
+                for seq in msg[1]:
+                    self._pending.pop(seq, None)
+                self._cond.notify_all()
+        elif kind == "snapshots":
+            for seq, name, row in msg[1]:
+                with self._cond:
+                    fut = self._placing.get((seq, name))
+                if fut is None:
+                    self.on_snapshot(row)
+                else:   # the live traded flag is whether the coordinator placed it
+                    fut.add_done_callback(lambda f, row=row: self.on_snapshot(
+                        row[:4] + (f.exception() is None and bool(f.result()),) + row[5:]))
+        elif kind == "stats":
+            with self._cond:
+                self._shard_stats[msg[1]] = msg[2]
+                self._cond.notify_all()
+        elif kind == "ready":
+            with self._cond:
+                self._ready.add(msg[1])
+                self._cond.notify_all()
+
+
+def _bench(n_filings: int, counts: list[int]):
+    os.environ.setdefault("SIM_LATENCY_MS", "0")
+    os.environ.setdefault("SIM_RATE_LIMIT_PER_MIN", "0")
+    os.environ.setdefault("SIM_ERROR_RATE", "0")
+    from bot import main as bot
+    from bot.brokers.sim import synthetic_filings
+    from bot.strategies import pipeline
+    bot.BROKER = "sim"
+    filings = list(synthetic_filings(n_filings, seed=1, universe=5000, run="bench"))
+
+    broker = bot.new_broker(0)
+    t0 = time.perf_counter()
+    for f in filings:
+        for strat in bot.STRATEGIES:
+            strat.decide_trade(f, broker)
+    base = n_filings / (time.perf_counter() - t0)
+    print(f"in-process: {base:,.0f} filings/s")
+    for n in counts:
+        pool = WorkerPool(n, on_order=lambda *a: None, broker_kind="sim", per_minute=0)
+        pool.start()
+        try:
+            pipeline.new_cycle()
+            t0 = time.perf_counter()
+            pool.new_cycle()
+            for f in filings:
+                pool.submit(f, time.monotonic())
+            pool.wait()
+            rate = n_filings / (time.perf_counter() - t0)
+            st = pool.stats()
+        finally:
+            pool.stop()
+        print(f"{n} worker(s): {rate:,.0f} filings/s ({rate / base:.2f}× in-process), "
+              f"dispatcher blocked {st['blocked']}× ({st['blocked_s']:.2f}s), "
+              f"per shard {min(st['filings'])}–{max(st['filings'])}")
+
+
+if __name__ == "__main__":
+    import sys
+    args = [int(a) for a in sys.argv[1:]]
+    _bench(args[0] if args else 4000, args[1:] or [1, 2, 4, os.cpu_count() or 1])
@@ -0,0 +1,31 @@
+import datetime as dt, json, sys, pathlib
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+
+@pytest.fixture
+def replay_data(tmp_path):
+    """A small BarStore (daily + minute bars) and a JSONL archive of Form 4 buys over 40 days."""
+    from bot.backtest.store import BarStore
+    rng = np.random.default_rng(3)
+    store = BarStore(tmp_path / "bars")
+    symbols = [f"T{i:02d}" for i in range(20)]
+    day0 = dt.datetime(2023, 1, 2)
+    n_days = 320
+    for sym in symbols:
+        closes = 20 * np.exp(np.cumsum(rng.normal(0.001, 0.02, n_days)))
+        t = [int((day0 + dt.timedelta(days=d)).timestamp()) for d in range(n_days)]
+        store.write("day", sym, [(t[d], c, c * 1.01, c * 0.99, c, 200_000) for d, c in enumerate(closes)])
+    filings = []
+    for i in range(1500):
+        d = 260 + i % 40
+        filings.append({"form": "4", "ticker": symbols[i % len(symbols)],
+                        "filed_at": (day0 + dt.timedelta(days=d, hours=15, seconds=i)).isoformat(),
+                        "accession": f"acc-{i}", "link": f"https://example.test/{i}",
+                        "officer_role": "CEO", "transaction_type": "BUY", "transaction_shares": 1000})
+    path = tmp_path / "filings.jsonl"
+    path.write_text("".join(json.dumps(f) + "\n" for f in filings))
+    return path, tmp_path / "bars"
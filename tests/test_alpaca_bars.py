@@ -0,0 +1,71 @@
+# tests/test_alpaca_bars.py
+from datetime import datetime, timedelta, timezone
+import pytest
+
+tradeapi = pytest.importorskip("alpaca_trade_api")
+from alpaca_trade_api.entity_v2 import BarV2
+from alpaca_trade_api.rest import REST, Sort, TimeFrame
+from bot.brokers import alpaca
+
+
+def test_scheduled_methods_exist_on_rest():
+    for method in alpaca.METHOD_PRIORITY:
+        name = "submit_order" if method.startswith("submit_order") else method
+        assert callable(getattr(REST, name, None)), method
+
+
+class _BarsREST:
+    """get_bars answering newest-first, like the v2 data API with sort=desc."""
+
+    def __init__(self):
+        self.calls = []
+
+    def get_bars(self, symbol, timeframe, start=None, limit=None, sort=None):
+        self.calls.append((symbol, timeframe, start, limit, sort))
+        return [BarV2({"t": f"2024-01-{d:02d}T05:00:00Z", "o": d, "h": d, "l": d, "c": d, "v": 100})
+                for d in range(limit, 0, -1)]
+
+
+@pytest.fixture
+def broker(monkeypatch):
+    monkeypatch.setenv("ALPACA_KEY_ID", "test")
+    monkeypatch.setenv("ALPACA_SECRET_KEY", "test")
+    b = alpaca.AlpacaBroker()
+    b.scheduler = alpaca.RequestScheduler(per_minute=0)
+    b.api = _BarsREST()
+    return b
+
+
+def test_daily_and_minute_bars_use_get_bars(broker):
+    closes = [b.c for b in broker.daily_bars("AAPL", 20)]
+    assert closes == sorted(closes) and len(closes) == 20
+    sym, tf, start, limit, sort = broker.api.calls[0]
+    assert (sym, tf, limit, sort) == ("AAPL", TimeFrame.Day, alpaca.DAILY_LOOKBACK, Sort.Desc)
+    assert datetime.fromisoformat(start.replace("Z", "+00:00")) < datetime.now(timezone.utc) - timedelta(days=365)
+
+    assert len(broker.minute_bars("AAPL", 30)) == 30
+    _, tf, start, limit, sort = broker.api.calls[1]
+    assert (tf, limit, sort) == (TimeFrame.Minute, 30, Sort.Desc)
+
+
+class _TradesREST:
+    """get_latest_trades for multi-symbol requests; the second request fails."""
+
+    def __init__(self):
+        self.calls = []
+
+    def get_latest_trades(self, symbols):
+        self.calls.append(list(symbols))
+        if len(self.calls) == 2:
+            raise RuntimeError("503")
+        return {s: type("Trade", (), {"price": float(len(s))})() for s in symbols}
+
+
+def test_latest_prices_in_chunks(broker, monkeypatch):
+    monkeypatch.setattr(alpaca, "LATEST_TRADES_CHUNK", 200)
+    broker.api = _TradesREST()
+    symbols = [f"S{i}" for i in range(450)]
+    prices = broker.latest_prices(symbols + symbols[:10])   # repeats are asked for once
+    assert [len(c) for c in broker.api.calls] == [200, 200, 50]
+    assert set(prices) == set(symbols[:200] + symbols[400:])   # the failed chunk is left out
+    assert broker.cache.get(("trade", "S0"), alpaca.QUOTE_TTL, None).price == 2.0
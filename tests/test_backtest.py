@@ -0,0 +1,47 @@
+# tests/test_backtest.py
+import datetime as dt
+
+from bot.backtest import engine
+from bot.backtest.broker import PointInTimeBroker
+from bot.backtest.store import BarStore
+from bot.risk.exit import should_exit
+
+DAY0 = dt.datetime(2023, 1, 2)
+
+
+def test_broker_only_sees_bars_complete_at_its_clock(replay_data):
+    _, bars = replay_data
+    store = BarStore(bars)
+    closes = store.load("day", "T00")["c"]
+    broker = PointInTimeBroker(store)
+    broker.set_time(DAY0 + dt.timedelta(days=100, hours=15))        # mid-session: day 100 still open
+    assert broker.current_price("T00") == closes[99]
+    assert [b.c for b in broker.daily_bars("T00", 3)] == list(closes[97:100])
+    assert broker.api.get_bars("T00", "1Day", limit=2, sort="desc")[0].c == closes[99]
+    broker.set_time(DAY0 + dt.timedelta(days=100, hours=21))        # after the close
+    assert broker.current_price("T00") == closes[100]
+    broker.set_time(DAY0 - dt.timedelta(days=1))
+    assert broker.current_price("T00") is None and broker.daily_bars("T00") == []
+
+
+def test_shards_never_split_a_day():
+    filings = [{"filed_at": DAY0 + dt.timedelta(days=i // 7, hours=i % 7)} for i in range(70)]
+    shards = engine.shard_by_date(filings, 4)
+    assert sum(shards, []) == filings
+    days = [{f["filed_at"].date() for f in s} for s in shards]
+    assert all(not a & b for i, a in enumerate(days) for b in days[i + 1:])
+
+
+def test_result_does_not_depend_on_the_worker_count(replay_data):
+    path, bars = replay_data
+    filings = engine.load_filings(path)[:300]
+    one = engine.run_backtest(filings, bars, workers=1, shards=4)
+    two = engine.run_backtest(filings, bars, workers=2, shards=4)
+    key = lambda t: (t["symbol"], t["entry_time"], t["exit_time"])
+    trades = sorted(one.pop("closed_trades"), key=key)
+    assert trades == sorted(two.pop("closed_trades"), key=key)
+    assert one == two and one["trades"] == len(trades) > 0
+    for t in trades:
+        assert t["exit_time"] > t["entry_time"]
+        if t["reason"] != "END":   # exits go through should_exit at the exit check's price
+            assert should_exit(t["entry_price"], t["exit_price"], t["entry_time"], t["exit_time"]) == t["reason"]
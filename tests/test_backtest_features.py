@@ -0,0 +1,23 @@
+from bot.backtest import engine, sweep
+from bot.utils import journal
+
+
+def test_features_out_round_trips_through_the_sweep(replay_data, tmp_path):
+    filings, bars = replay_data
+    out = tmp_path / "features"
+    res = engine.main(["--filings", str(filings), "--bars", str(bars), "--workers", "1",
+                       "--features-out", str(out)])
+    written = len(res["snapshots"])
+    assert written > journal.FLUSH_ROWS * 2   # several chunks, most of them for past days
+    assert len(journal.read("features", root=out)) == written
+
+    per_strategy = {}
+    for row in res["snapshots"]:
+        per_strategy[row[2]] = per_strategy.get(row[2], 0) + 1
+    rows = journal.read("features", root=out)
+    for strategy, n in per_strategy.items():
+        assert (rows["strategy"] == strategy).sum() == n
+        swept = sweep.main(["--bars", str(bars), "--journal", str(out), "--strategy", strategy,
+                            "--workers", "1", "--top", "1"])
+        assert swept["snapshots"] == n
+        assert 0 < swept["rows"] <= n   # labeled: the rest have no exit bar yet
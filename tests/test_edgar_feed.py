@@ -0,0 +1,214 @@
+from datetime import datetime
+from types import SimpleNamespace
+
+from bot.data import edgar_feed, issuers
+
+# entries as EDGAR's getcurrent atom feed lists them (one per filer of the accession)
+FEED = b"""<?xml version="1.0" encoding="ISO-8859-1" ?>
+<feed xmlns="http://www.w3.org/2005/Atom">
+<title>Latest Filings - Thu, 02 May 2024 16:31:05 EDT</title>
+<entry>
+<title>4 - Apple Inc. (0000320193) (Issuer)</title>
+<link rel="alternate" type="text/html" href="https://www.sec.gov/Archives/edgar/data/320193/000032019324000061/0000320193-24-000061-index.htm"/>
+<summary type="html"> &lt;b&gt;Filed:&lt;/b&gt; 2024-05-02 &lt;b&gt;AccNo:&lt;/b&gt; 0000320193-24-000061 &lt;b&gt;Size:&lt;/b&gt; 5 KB</summary>
+<updated>2024-05-02T16:30:11-04:00</updated>
+<category scheme="https://www.sec.gov/" label="form type" term="4"/>
+<id>urn:tag:sec.gov,2008:accession-number=0000320193-24-000061</id>
+</entry>
+<entry>
+<title>4 - Williams Jeffrey E (0001496686) (Reporting)</title>
+<link rel="alternate" type="text/html" href="https://www.sec.gov/Archives/edgar/data/1496686/000032019324000061/0000320193-24-000061-index.htm"/>
+<updated>2024-05-02T16:30:11-04:00</updated>
+<category scheme="https://www.sec.gov/" label="form type" term="4"/>
+<id>urn:tag:sec.gov,2008:accession-number=0000320193-24-000061</id>
+</entry>
+<entry>
+<title>4/A - Apple Inc. (0000320193) (Issuer)</title>
+<link rel="alternate" type="text/html" href="https://www.sec.gov/Archives/edgar/data/320193/000032019324000062/0000320193-24-000062-index.htm"/>
+<updated>2024-05-02T16:29:00-04:00</updated>
+<id>urn:tag:sec.gov,2008:accession-number=0000320193-24-000062</id>
+</entry>
+<entry>
+<title>SC 13G/A - Apple Inc. (0000320193) (Subject)</title>
+<link rel="alternate" type="text/html" href="https://www.sec.gov/Archives/edgar/data/320193/000119312524000001/0001193125-24-000001-index.htm"/>
+<updated>2024-05-02T16:28:00-04:00</updated>
+<id>urn:tag:sec.gov,2008:accession-number=0001193125-24-000001</id>
+</entry>
+<entry>
+<title>10-Q - Apple Inc. (0000320193) (Filer)</title>
+<link rel="alternate" type="text/html" href="https://www.sec.gov/Archives/edgar/data/320193/000032019324000063/0000320193-24-000063-index.htm"/>
+<updated>2024-05-02T16:27:00-04:00</updated>
+<id>urn:tag:sec.gov,2008:accession-number=0000320193-24-000063</id>
+</entry>
+</feed>
+"""
+
+
+def _index(monkeypatch):
+    idx = issuers.IssuerIndex("/nonexistent/issuers.npy")
+    idx._set(issuers.build([(320193, "AAPL"), (1496686, "")]))
+    monkeypatch.setattr(issuers, "_index", idx)
+
+
+def test_verbatim_form4_title_resolves_through_the_issuer_index(monkeypatch):
+    _index(monkeypatch)
+    e = edgar_feed._to_entry("urn:tag:sec.gov,2008:accession-number=0000320193-24-000061",
+                             "4 - Apple Inc. (0000320193) (Issuer)",
+                             "https://www.sec.gov/Archives/edgar/data/320193/000032019324000061/x-index.htm", None)
+    assert e["form"] == "4"
+    assert e["ticker"] == "AAPL"
+    assert e["accession"] == "0000320193-24-000061"
+    assert e["entity"] == {"name": "Apple Inc.", "cik": "0000320193", "role": "Issuer"}
+
+
+def test_feed_page_yields_one_event_per_accession(monkeypatch):
+    _index(monkeypatch)
+    events = list(edgar_feed.parse_filings(FEED))
+    assert [(e["form"], e["ticker"], e["accession"]) for e in events] == [
+        ("4", "AAPL", "0000320193-24-000061"),
+        ("4/A", "AAPL", "0000320193-24-000062"),
+        ("13G/A", "AAPL", "0001193125-24-000001"),
+    ]
+    assert events[0]["reporting_owners"] == [{"name": "Williams Jeffrey E", "cik": "0001496686"}]
+
+
+def test_synthetic_and_other_titles():
+    assert edgar_feed.FORM_RE.search("Form 4 - SIM12 (ABC) (Issuer)").group(1) == "4"
+    assert edgar_feed.FORM_RE.search("SC 13D - Foo Corp (0000000001) (Subject)").group(1) == "13D"
+    for title in ("10-Q - Apple Inc. (0000320193) (Filer)", "424B2 - X (0000000002) (Filer)",
+                  "40-F - Y (0000000003) (Filer)"):
+        assert edgar_feed.FORM_RE.search(title) is None
+
+
+def test_reporting_owner_names_never_become_tickers(monkeypatch):
+    _index(monkeypatch)
+    acc = "urn:tag:sec.gov,2008:accession-number=0001234567-24-000007"
+    link = "https://www.sec.gov/Archives/edgar/data/1234567/000123456724000007/x-index.htm"
+    owner = edgar_feed._to_entry(acc, "4 - KKR FUND HOLDINGS (US) LP (0001234567) (Reporting)", link, None)
+    assert owner["ticker"] is None
+    # an issuer whose name carries a "(XYZ)" still resolves by CIK, not by name text
+    issuer = edgar_feed._to_entry(acc, "4 - Apple Inc. (NEW) (0000320193) (Issuer)", link, None)
+    assert issuer["ticker"] == "AAPL"
+    unknown = edgar_feed._to_entry(acc, "4 - KKR & Co (KKR) (0001404912) (Issuer)", link, None)
+    assert unknown["ticker"] is None
+    assert edgar_feed._to_entry(acc, "Form 4 - SIM12 (ABC) (Reporting)", link, None)["ticker"] is None
+    assert edgar_feed._to_entry(acc, "Form 4 - SIM12 (ABC) (Issuer)", link, None)["ticker"] == "ABC"
+    assert list(edgar_feed.coalesce([dict(owner, filed_at=0)])) == []
+
+
+def test_schedule_13d_13g_titles():
+    for title, form in (("SCHEDULE 13D/A - Apple Inc. (0000320193) (Subject)", "13D/A"),
+                        ("SCHEDULE 13G - Apple Inc. (0000320193) (Subject)", "13G"),
+                        ("SC 13G/A - Apple Inc. (0000320193) (Subject)", "13G/A")):
+        m = edgar_feed.FORM_RE.search(title)
+        assert m.group(1).upper() + (m.group(2) or "").upper() == form
+
+
+def test_feed_with_both_schedule_spellings(monkeypatch):
+    _index(monkeypatch)
+    feed = FEED.replace(b"<title>SC 13G/A - Apple Inc.", b"<title>SCHEDULE 13G/A - Apple Inc.").replace(
+        b"</feed>",
+        b"""<entry>
+<title>SCHEDULE 13D - Apple Inc. (0000320193) (Subject)</title>
+<link rel="alternate" type="text/html" href="https://www.sec.gov/Archives/edgar/data/320193/000119312524000002/0001193125-24-000002-index.htm"/>
+<updated>2024-05-02T16:26:00-04:00</updated>
+<id>urn:tag:sec.gov,2008:accession-number=0001193125-24-000002</id>
+</entry>
+<entry>
+<title>SCHEDULE 13D - KKR FUND HOLDINGS (US) LP (0001234567) (Filed by)</title>
+<link rel="alternate" type="text/html" href="https://www.sec.gov/Archives/edgar/data/1234567/000119312524000002/0001193125-24-000002-index.htm"/>
+<updated>2024-05-02T16:26:00-04:00</updated>
+<id>urn:tag:sec.gov,2008:accession-number=0001193125-24-000002</id>
+</entry>
+</feed>""")
+    events = list(edgar_feed.parse_filings(feed))
+    assert [(e["form"], e["ticker"]) for e in events] == [("4", "AAPL"), ("4/A", "AAPL"), ("13G/A", "AAPL"),
+                                                         ("13D", "AAPL")]
+
+
+class _SEC:
+    """The getcurrent feed, newest first, paged by `start` and answering 304 on a matching ETag."""
+
+    def __init__(self):
+        self.entries = []   # (updated, n), newest first
+        self.requests = []
+
+    def publish(self, n, updated):
+        self.entries.insert(0, (updated, n))
+
+    def get(self, url, headers=None, timeout=None):
+        start = int(url.rsplit("&start=", 1)[1]) if "&start=" in url else 0
+        self.requests.append((start, dict(headers or {})))
+        etag = f'"{len(self.entries)}"'
+        if start == 0 and (headers or {}).get("If-None-Match") == etag:
+            return SimpleNamespace(status_code=304, content=b"", headers={})
+        page = self.entries[start:start + edgar_feed.PAGE_SIZE]
+        body = "".join(
+            f"<entry><title>Form 4 - SIM{n} ({_ticker(n)}) (Issuer)</title>"
+            f'<link rel="alternate" type="text/html" href="https://example.test/{n}-index.htm"/>'
+            f"<updated>2024-05-02T{updated}-04:00</updated><id>urn:tag:sec.gov,2008:accession-number=0000000001-24-{n:06d}</id></entry>" for updated, n in page)
+        content = f'<feed xmlns="http://www.w3.org/2005/Atom">{body}</feed>'.encode()
+        return SimpleNamespace(status_code=200, content=content, headers={"ETag": etag},
+                               raise_for_status=lambda: None)
+
+
+def _ticker(n):
+    return "T" + chr(65 + n)
+
+
+def _tickers(events):
+    return sorted(e["ticker"] for e in events)
+
+
+def test_polls_are_conditional_and_stop_at_the_high_water_mark(monkeypatch):
+    sec = _SEC()
+    monkeypatch.setattr(edgar_feed, "_sec_get", sec.get)
+    monkeypatch.setattr(edgar_feed, "_poll", dict(edgar_feed._poll, etag=None, last_modified=None,
+                                                  hwm=None, hwm_ids=frozenset()))
+    monkeypatch.setattr(edgar_feed, "PAGE_SIZE", 5)
+    monkeypatch.setattr(issuers, "maybe_refresh", lambda: None)
+    for n in range(3):
+        sec.publish(n, f"10:00:0{n}")
+    assert _tickers(edgar_feed.latest_filings()) == ["TA", "TB", "TC"]
+
+    assert list(edgar_feed.latest_filings()) == []                       # quiet poll
+    assert edgar_feed.feed_stats()["not_modified"] and edgar_feed.feed_stats()["bytes"] == 0
+    assert sec.requests[-1] == (0, {"If-None-Match": '"3"'})
+
+    for n in range(3, 15):                                                # a burst: 12 new, 5 a page
+        sec.publish(n, f"10:01:{n:02d}")
+    assert _tickers(edgar_feed.latest_filings()) == sorted(_ticker(n) for n in range(3, 15))
+    assert [start for start, _ in sec.requests[-3:]] == [0, 5, 10]
+    assert edgar_feed.feed_stats()["entries"] == 12
+
+    sec.publish(15, "10:01:14")                                           # same second as the mark
+    sec.publish(16, "10:02:00")
+    events = edgar_feed.latest_filings()
+    next(events)
+    events.close()                                                        # abandoned mid-poll
+    assert _tickers(edgar_feed.latest_filings()) == ["TP", "TQ"]        # ... so nothing was marked
+    assert list(edgar_feed.latest_filings()) == []
+
+
+def test_iter_entries_matches_a_full_parse():
+    import xml.etree.ElementTree as ET
+    want = [(e.findtext(edgar_feed._TITLE), e.find(edgar_feed._LINK).get("href"), e.findtext(edgar_feed._ID))
+            for e in ET.fromstring(FEED).iter(edgar_feed._ENTRY)]
+    got = list(edgar_feed.iter_entries(FEED))
+    assert [(title, link, eid) for _, eid, title, link in got] == want
+    assert got[0][0] == datetime(2024, 5, 2, 20, 30, 11)   # -04:00 read as naive UTC
+
+
+def test_iter_entries_frees_entries_as_it_goes():
+    import tracemalloc
+    entry = ("<entry><title>Form 4 - SIM{0} (ABC) (Issuer)</title>"
+             '<link rel="alternate" type="text/html" href="https://example.test/{0}-index.htm"/>'
+             "<updated>2024-05-02T10:00:00-04:00</updated><id>urn:{0}</id></entry>")
+    feed = ('<feed xmlns="http://www.w3.org/2005/Atom">'
+            + "".join(entry.format(i) for i in range(20_000)) + "</feed>").encode()
+    tracemalloc.start()
+    n = sum(1 for _ in edgar_feed.iter_entries(feed))
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    assert n == 20_000
+    assert peak < len(feed) / 4   # a retained tree would be several times the document
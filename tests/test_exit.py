@@ -0,0 +1,51 @@
+# tests/test_exit.py
+import datetime as dt, random
+
+from bot import main
+from bot.brokers.sim import SimBroker, SimConfig
+from bot.risk import protect
+from bot.risk.exit import exits_batch, should_exit
+from bot.utils.positions import PositionBook
+
+NOW = dt.datetime(2024, 5, 2, 15, 0)
+
+
+def _positions(n, seed=5):
+    rng = random.Random(seed)
+    return [{"symbol": f"S{i:03d}", "qty": 10, "entry_price": rng.uniform(5, 50),
+             "entry_time": NOW - dt.timedelta(days=rng.uniform(0, 40))} for i in range(n)]
+
+
+def test_batch_matches_should_exit_per_position():
+    book = _positions(400)
+    rng = random.Random(6)
+    prices = {p["symbol"]: p["entry_price"] * rng.uniform(0.8, 1.25) for p in book[:-20]}   # last 20 unpriced
+    prices[book[0]["symbol"]] = book[0]["entry_price"] * 0.9                             # exactly at the stop
+    got = {p["symbol"]: (price, reason) for p, price, reason in exits_batch(book, prices, NOW)}
+    want = {p["symbol"]: (prices[p["symbol"]], r) for p in book if p["symbol"] in prices
+            for r in [should_exit(p["entry_price"], prices[p["symbol"]], p["entry_time"], NOW)] if r}
+    assert got == want
+    assert {r for _, r in got.values()} == {"STOP", "TP", "TIME"}
+    assert exits_batch(book[-20:], prices, NOW) == [] and exits_batch([], prices) == []
+
+
+def test_exit_pass_prices_the_book_in_one_bulk_call(monkeypatch, tmp_path):
+    monkeypatch.setattr(protect, "EXIT_ORDERS", "local")
+    broker = SimBroker(SimConfig(latency_ms=0, error_rate=0, rate_limit_per_min=0))
+    book = PositionBook(tmp_path / "positions.json", tmp_path / "positions.journal")
+    for p in _positions(150):
+        book.add(dict(p, entry_time=dt.datetime.utcnow(), exit_orders=[]))
+    calls, closed = [], []
+
+    def latest_prices(symbols):
+        symbols = list(symbols)
+        calls.append(symbols)
+        return {s: book.get(s)["entry_price"] * (0.5 if s < "S010" else 1.0) for s in symbols}
+
+    monkeypatch.setattr(broker, "latest_prices", latest_prices)
+    monkeypatch.setattr(main, "broker", broker)
+    monkeypatch.setattr(main, "book", book)
+    monkeypatch.setattr(main, "_close", lambda pos, price, reason: closed.append((pos["symbol"], reason)))
+    main._exit_pass()
+    assert len(calls) == 1 and len(calls[0]) == 150
+    assert closed == [(f"S{i:03d}", "STOP") for i in range(10)]
@@ -0,0 +1,70 @@
+# tests/test_form4.py
+"""Feed poll, issuer refresh and Form 4 enrichment against a local SEC stand-in (tests/fixtures/sec)."""
+import functools, http.server, pathlib, threading
+import pytest
+from bot.data import edgar_feed, form4, issuers
+from bot.utils.ratelimit import TokenBucket
+
+FIXTURES = pathlib.Path(__file__).parent / "fixtures" / "sec"
+
+
+class _Handler(http.server.SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.server.paths.append(self.path)
+        super().do_GET()
+
+
+class _CountingBucket(TokenBucket):
+    def __init__(self):
+        super().__init__(edgar_feed.SEC_MAX_RPS)
+        self.acquired = 0
+
+    def acquire(self, tokens: float = 1) -> float:
+        self.acquired += tokens
+        return super().acquire(tokens)
+
+
+@pytest.fixture
+def sec(monkeypatch, tmp_path):
+    server = http.server.ThreadingHTTPServer(
+        ("127.0.0.1", 0), functools.partial(_Handler, directory=str(FIXTURES)))
+    server.paths = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_port}"
+    monkeypatch.setenv("NO_PROXY", "127.0.0.1")
+    monkeypatch.setattr(edgar_feed, "FEED_URL", base + "/cgi-bin/browse-edgar?action=getcurrent&count=100")
+    monkeypatch.setattr(edgar_feed, "_poll", {"etag": None, "last_modified": None, "hwm": None, "hwm_ids": frozenset()})
+    monkeypatch.setattr(edgar_feed, "_sec_bucket", _CountingBucket())
+    monkeypatch.setattr(issuers, "SEC_BASE_URL", base)
+    monkeypatch.setattr(issuers, "_index", issuers.IssuerIndex(tmp_path / "issuers.npy"))
+    monkeypatch.setattr(form4, "SEC_BASE_URL", base)
+    monkeypatch.setattr(form4, "CACHE_DIR", tmp_path / "form4")
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_poll_and_enrich_through_the_shared_sec_bucket(sec):
+    filings = form4.enrich(edgar_feed.latest_filings())
+    by_form = {f["form"]: f for f in filings}
+    assert by_form["4"]["ticker"] == "AAPL"
+    assert by_form["4"]["transaction_type"] == "SELL"
+    assert by_form["4"]["transaction_shares"] == 59162
+    assert by_form["4"]["officer_role"] == "Officer"
+    assert by_form["4"]["reporting_owners"][0]["officer_title"] == "COO"
+    # issuer refresh, feed page, folder index, ownership XML (the ex24.xml exhibit is skipped)
+    assert [p.split("?")[0].rsplit("/", 1)[-1] for p in sec.paths] == [
+        "company_tickers.json", "browse-edgar", "index.json", "wk-form4_1714681811.xml"]
+    assert edgar_feed._sec_bucket.acquired == len(sec.paths)
+
+
+def test_unnamed_ownership_document_found_by_its_root_element(sec):
+    link = "https://www.sec.gov/Archives/edgar/data/320193/000032019324000062/0000320193-24-000062-index.htm"
+    doc = form4.fetch_ownership(link)
+    assert doc["transaction_type"] == "BUY" and doc["shares_owned_after"] == 490944
+    assert form4.fetch_ownership(link) == doc    # second call served from the disk cache
+    assert len(sec.paths) == 3                   # index.json, metadata.xml, edgar.xml
+    assert edgar_feed._sec_bucket.acquired == 3
@@ -0,0 +1,62 @@
+import json, pathlib, random
+
+import numpy as np
+import pytest
+
+from bot.strategies import indicators as ind, momentum
+
+GOLDEN = json.loads((pathlib.Path(__file__).parent / "fixtures" / "momentum_golden.json").read_text())["cases"]
+
+
+def series(seed, n):
+    # the closes the golden values were computed from (same generator)
+    rng = random.Random(seed)
+    p, out = 20.0 + seed % 50, []
+    for _ in range(n):
+        p *= 1 + rng.gauss(0.0005, 0.02)
+        out.append(round(p, 4))
+    return out
+
+
+def _same(got, want):
+    if want is None:
+        return np.isnan(got)
+    return got == pytest.approx(want, rel=1e-9, abs=1e-12)
+
+
+@pytest.mark.parametrize("case", GOLDEN, ids=lambda c: f"{c['bars']}bars")
+def test_single_row_matches_old_implementation(case):
+    x = np.array(series(case["seed"], case["bars"]))
+    m, s, h = ind.macd(x)
+    assert _same(ind.rsi(x), case["rsi"])
+    assert _same(m, case["macd"]) and _same(s, case["signal"]) and _same(h, case["hist"])
+
+
+def test_padded_watchlist_matches_old_implementation():
+    closes = ind.closes_matrix([series(c["seed"], c["bars"]) for c in GOLDEN])
+    m, s, h = ind.macd(closes)
+    r = ind.rsi(closes)
+    for i, case in enumerate(GOLDEN):
+        assert _same(r[i], case["rsi"]), case["bars"]
+        assert _same(m[i], case["macd"]) and _same(s[i], case["signal"]) and _same(h[i], case["hist"]), case["bars"]
+    ok = momentum.score_watchlist(closes)["ok"]
+    assert ok.tolist() == [c["ok"] for c in GOLDEN]
+    assert any(c["ok"] for c in GOLDEN)
+
+
+@pytest.mark.parametrize("fn", [lambda x: ind.sma(x, 20), lambda x: ind.ema(x, 26),
+                                lambda x: ind.rolling_std(x, 20)], ids=["sma", "ema", "rolling_std"])
+def test_padded_rows_match_their_unpadded_series(fn):
+    rows = [series(seed, n) for seed, n in ((1, 252), (2, 120), (3, 40), (4, 20), (5, 7), (6, 1))]
+    got = fn(ind.closes_matrix(rows))
+    for row, closes in zip(got, rows):
+        want = fn(np.array(closes))
+        pad = len(row) - len(closes)
+        assert np.isnan(row[:pad]).all()
+        np.testing.assert_array_equal(row[pad:], want)
+    assert not np.isnan(got[2, -1])   # a 40-bar row has a 20-bar mean / 26-span EMA
+
+
+def test_first_valid():
+    m = ind.closes_matrix([[1.0, 2.0, 3.0], [4.0], []])
+    assert ind.first_valid(m).tolist() == [0, 2, 3]
@@ -0,0 +1,82 @@
+# tests/test_intraday.py
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from bot.brokers.alpaca import MarketDataHelpers
+from bot.data.intraday import BARS_WINDOW, SPREAD_WINDOW, IntradayBook
+
+
+def _ticks(minutes, seed=4):
+    """(price, size, t) trades, 1-3 per minute, plus each minute's close / pv / volume."""
+    rng = np.random.default_rng(seed)
+    price, ticks, bars = 50.0, [], []
+    for m in range(minutes):
+        pv = vol = 0.0
+        for k in range(int(rng.integers(1, 4))):
+            price *= 1 + rng.normal(0, 0.002)
+            size = float(rng.integers(1, 500))
+            ticks.append((price, size, m * 60 + k * 7.5))
+            pv, vol = pv + price * size, vol + size
+        bars.append((price, pv, vol))
+    return ticks, bars
+
+
+def test_rolling_stats_match_a_full_recompute():
+    book = IntradayBook(capacity=2)
+    ticks, bars = _ticks(200)
+    for price, size, t in ticks:
+        book.on_trade("AAA", price, size, t)
+    closed = bars[:-1]                              # the last minute is still in progress
+    closes = np.array([c for c, _, _ in closed[-BARS_WINDOW:]])
+    assert book.volatility("AAA") == pytest.approx(np.std(np.diff(closes) / closes[:-1], ddof=1), rel=1e-9)
+    window = closed[-BARS_WINDOW:] + bars[-1:]
+    assert book.vwap("AAA") == pytest.approx(sum(pv for _, pv, _ in window) / sum(v for _, _, v in window))
+
+    rng = np.random.default_rng(5)
+    spreads = rng.uniform(0.01, 0.05, 120)
+    for s in spreads:
+        book.on_quote("AAA", 50.0, 50.0 + s)
+    st = book.spread_stats("AAA")
+    assert st["n"] == SPREAD_WINDOW and st["last"] == pytest.approx(spreads[-1])
+    assert st["mean"] == pytest.approx(spreads[-SPREAD_WINDOW:].mean())
+    assert st["std"] == pytest.approx(spreads[-SPREAD_WINDOW:].std(ddof=1))
+
+
+def test_rows_grow_and_recycle():
+    book = IntradayBook(capacity=2)
+    for i in range(5):                              # doubles past the initial capacity
+        book.on_bar(f"S{i}", 10.0 + i, 100)
+    assert [book.vwap(f"S{i}") for i in range(5)] == [10.0, 11.0, 12.0, 13.0, 14.0]
+    book.drop("S1")
+    book.on_quote("NEW", 1.0, 1.5)                  # takes S1's row, cleared
+    assert book.vwap("NEW") is None and book.spread("NEW") == 0.5 and "S1" not in book
+    assert book.volatility("S0") is None            # not a full window yet
+    assert IntradayBook(capacity=1000).nbytes() / 1000 < 2048
+
+
+class _Helpers(MarketDataHelpers):
+    """Market-data helpers whose REST lookups are counted."""
+
+    def __init__(self, intraday):
+        self.intraday, self.rest = intraday, []
+
+    def minute_bars(self, symbol, limit=60):
+        self.rest.append(("bars", symbol))
+        return [SimpleNamespace(c=10.0 * (1 + 0.001 * (i % 3)), v=100.0) for i in range(limit)]
+
+    def latest_quote(self, symbol):
+        self.rest.append(("quote", symbol))
+        return SimpleNamespace(bidprice=9.9, askprice=10.1)
+
+
+def test_gates_are_answered_from_the_book_once_it_is_warm():
+    book = IntradayBook()
+    broker = _Helpers(book)
+    book.on_quote("AAA", 10.0, 10.02)
+    assert broker.bid_ask_spread("AAA") == pytest.approx(0.02) and broker.rest == []
+    first = broker.intraday_volatility("AAA")       # cold: one REST fetch, which seeds the ring
+    assert broker.rest == [("bars", "AAA")]
+    assert broker.intraday_volatility("AAA") == pytest.approx(first) and len(broker.rest) == 1
+    assert broker.bid_ask_spread("BBB") == pytest.approx(0.2)   # unwatched: REST as before
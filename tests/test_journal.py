@@ -0,0 +1,95 @@
+import datetime as dt
+
+import numpy as np
+
+from bot.utils import journal
+from bot.utils.journal import Journal
+
+
+def _rows(n, days=3, start=dt.datetime(2024, 1, 2, 15, 0)):
+    # interleaved across `days` past days, like late-flushed or replayed rows
+    return [(start + dt.timedelta(days=i % days, seconds=i), f"S{i % 7}", 1, 10.0, 10.5, 0.5, "TP")
+            for i in range(n)]
+
+
+def test_chunks_of_past_days_survive_compaction(tmp_path):
+    j = Journal("closed", root=tmp_path, flush_rows=500, flush_seconds=0)
+    for r in _rows(1200):
+        j.append(r)
+    j.flush()
+    assert len(journal.read("closed", root=tmp_path)) == 1200
+    j.compact()
+    arr = journal.read("closed", root=tmp_path)
+    assert len(arr) == 1200
+    assert sorted(p.name for p in (tmp_path / "closed").iterdir()) == \
+        ["2024-01-02.1.npy", "2024-01-03.1.npy", "2024-01-04.1.npy"]
+
+
+def test_late_rows_merge_into_an_existing_segment(tmp_path):
+    j = Journal("closed", root=tmp_path, flush_rows=10_000, flush_seconds=0)
+    for r in _rows(300):
+        j.append(r)
+    j.compact()
+    for r in _rows(50, days=1):   # stamped for an already compacted day
+        j.append(r)
+    j.flush()
+    assert len(journal.read("closed", root=tmp_path)) == 350
+    j.compact()
+    assert len(journal.read("closed", root=tmp_path)) == 350
+    assert len(journal.read("closed", "2024-01-02", "2024-01-03", root=tmp_path)) == 150
+    assert sorted(p.name for p in (tmp_path / "closed").iterdir())[0] == "2024-01-02.2.npy"
+
+
+def test_interrupted_compaction_neither_drops_nor_doubles(tmp_path):
+    j = Journal("closed", root=tmp_path, flush_rows=10_000, flush_seconds=0)
+    for r in _rows(100, days=1):
+        j.append(r)
+    j.compact()
+    base = tmp_path / "closed"
+    # crash after sealing new chunks but before writing segment 2
+    sealed = base / "2024-01-02.2"
+    sealed.mkdir()
+    np.save(sealed / "000001.npy", np.array(_rows(20, days=1), dtype=journal.SCHEMAS["closed"]))
+    assert len(journal.read("closed", root=tmp_path)) == 120
+    # crash after writing segment 2 but before deleting what it supersedes
+    merged = np.concatenate([np.load(base / "2024-01-02.1.npy"), np.load(sealed / "000001.npy")])
+    np.save(base / "2024-01-02.2.npy", merged)
+    assert len(journal.read("closed", root=tmp_path)) == 120
+    j.compact()
+    assert len(journal.read("closed", root=tmp_path)) == 120
+    assert [p.name for p in base.iterdir()] == ["2024-01-02.2.npy"]
+
+
+def test_legacy_daily_segment_is_still_read(tmp_path):
+    base = tmp_path / "closed"
+    base.mkdir()
+    np.save(base / "2024-01-02.npy", np.array(_rows(30, days=1), dtype=journal.SCHEMAS["closed"]))
+    j = Journal("closed", root=tmp_path, flush_rows=10_000, flush_seconds=0)
+    for r in _rows(5, days=1):
+        j.append(r)
+    j.compact()
+    assert len(journal.read("closed", root=tmp_path)) == 35
+    assert [p.name for p in base.iterdir()] == ["2024-01-02.1.npy"]
+
+
+def test_exported_rows_are_not_counted_twice(tmp_path, monkeypatch):
+    from bot.utils import trade_history
+    legacy = tmp_path / "closed_trades.csv"
+    legacy.write_text("utc_exit,symbol,qty,entry_price,exit_price,pnl_dollars,reason\n"
+                      "2023-12-29T15:00:00,S0,1,10.0,9.0,-1.0,SL\n")
+    j = Journal("closed", root=tmp_path / "journal", flush_rows=10_000, flush_seconds=0)
+    for r in _rows(70):
+        j.append(r)
+    j.flush()
+    monkeypatch.setattr(journal, "JOURNAL_ROOT", tmp_path / "journal")
+    monkeypatch.setattr(trade_history, "CLOSED_TRADES", legacy)
+
+    def s0():
+        monkeypatch.setattr(trade_history, "_index", None)
+        return trade_history.get_index().stats("S0")
+
+    assert s0().count == 11 and s0().wins == 10
+    # an export of the journal appended to the legacy log
+    journal.export_csv("closed", tmp_path / "export.csv", root=tmp_path / "journal")
+    legacy.write_text(legacy.read_text() + (tmp_path / "export.csv").read_text().split("\n", 1)[1])
+    assert s0().count == 11
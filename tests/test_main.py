@@ -0,0 +1,61 @@
+# tests/test_main.py
+import threading, time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+from bot import main
+from bot.brokers.sim import SimBroker, SimConfig
+from bot.risk import protect
+from bot.strategies import snapshots
+from bot.utils import journal
+from bot.utils.positions import PositionBook
+from bot.utils.state import SeenStore
+
+
+def _strategy(name):
+    def decide_trade(filing, broker):
+        return {"symbol": filing["ticker"], "qty": 10, "entry_price": 10.0}
+    return SimpleNamespace(__name__=f"bot.strategies.{name}", decide_trade=decide_trade)
+
+
+def test_entry_pass_fans_out_but_submits_one_order_at_a_time_per_symbol(monkeypatch, tmp_path, capsys):
+    monkeypatch.chdir(tmp_path)
+    broker = SimBroker(SimConfig(latency_ms=0, error_rate=0, rate_limit_per_min=0, partial_fill_rate=0))
+    filings = [{"form": "4", "ticker": f"S{i % 4}", "accession": f"acc-{i}", "link": f"https://example.test/{i}",
+                "transaction_type": "BUY"} for i in range(12)]
+    active, peak, lock = Counter(), Counter(), threading.Lock()
+
+    def submit_entry(broker, symbol, qty, entry_price):
+        with lock:
+            active[symbol] += 1
+            active["*"] += 1
+            peak[symbol] = max(peak[symbol], active[symbol])
+            peak["*"] = max(peak["*"], active["*"])
+        time.sleep(0.02)
+        with lock:
+            active[symbol] -= 1
+            active["*"] -= 1
+        return broker.submit_buy_market(symbol, qty), []
+
+    monkeypatch.setattr(protect, "submit_entry", submit_entry)
+    monkeypatch.setattr(snapshots, "RECORD_FEATURES", 0)
+    monkeypatch.setattr(journal, "_journals", {})
+    monkeypatch.setattr(main, "latest_filings", lambda: iter(filings))
+    monkeypatch.setattr(main, "STRATEGIES", (_strategy("a"), _strategy("b")))
+    monkeypatch.setattr(main, "broker", broker)
+    monkeypatch.setattr(main, "book", PositionBook(tmp_path / "positions.json", tmp_path / "positions.journal"))
+    monkeypatch.setattr(main, "seen", SeenStore(tmp_path / "seen.db"))
+    monkeypatch.setattr(main, "pool", ThreadPoolExecutor(max_workers=8))
+
+    assert len(main._entry_pass()) == 12
+    assert peak["*"] > 1                                   # symbols were submitted concurrently
+    assert all(peak[f"S{i}"] == 1 for i in range(4))       # ... but never two for one symbol
+    assert len(broker.orders) == 24 and len(main.seen) == 12
+    assert sorted(p["symbol"] for p in main.book.positions()) == ["S0", "S1", "S2", "S3"]
+    out = capsys.readouterr().out
+    assert "Filing→order latency [a]: 12 orders" in out and "Filing→order latency [b]: 12 orders" in out
+    assert main._entry_pass() == []                        # all seen: nothing re-evaluated
+    main.pool.shutdown()
+    journal.flush_all()                                    # trade rows land under tmp_path
+    assert len(journal.read("trades")) == 24
@@ -0,0 +1,63 @@
+# tests/test_metrics.py
+import bisect, random, socket, urllib.request
+
+import pytest
+
+from bot.utils import metrics
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def test_quantiles_stay_within_a_bucket_and_windows_reset():
+    rng = random.Random(1)
+    values = sorted(rng.lognormvariate(-3, 1.5) for _ in range(5000))
+    for v in values:
+        metrics.observe("test_latency_seconds", v, stage="a")
+    h = metrics.histogram("test_latency_seconds", stage="a")
+    for q in (0.5, 0.95, 0.99):
+        true = values[int(q * len(values)) - 1]
+        i = bisect.bisect_left(metrics.BUCKETS, true)
+        lo, hi = metrics.BUCKETS[i - 1], metrics.BUCKETS[i]
+        assert lo - 1e-12 <= h.quantile(q) <= hi + 1e-12
+
+    [row] = metrics.cycle_summary("test_latency_seconds")
+    assert row["n"] == 5000 and row["total"] == pytest.approx(sum(values))
+    assert metrics.cycle_summary("test_latency_seconds") == []   # window taken...
+    assert h.count == 5000                                         # ... cumulative counts kept
+
+
+def test_span_counts_errors_and_reraises():
+    with metrics.span("test_ok", strategy="x"):
+        pass
+    with pytest.raises(ValueError):
+        with metrics.span("test_fails", strategy="x"):
+            raise ValueError("boom")
+    spans = {r["labels"]["span"]: r["n"] for r in metrics.cycle_summary()}
+    assert spans["test_ok"] == 1 and spans["test_fails"] == 1
+    assert metrics._counters[metrics._key("bot_span_errors_total", {"span": "test_fails", "strategy": "x"})] == 1
+
+
+def test_endpoint_serves_prometheus_text():
+    metrics.describe("test_requests_total", "Requests seen by the test.")
+    metrics.inc("test_requests_total", 3, route="/x")
+    metrics.set_gauge("test_queue_depth", lambda: 7)
+    metrics.observe("test_wait_seconds", 0.25)
+    port = _free_port()
+    server = metrics.serve(port)
+    try:
+        body = urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5).read().decode()
+    finally:
+        server.shutdown()
+    lines = body.splitlines()
+    assert "# HELP test_requests_total Requests seen by the test." in lines
+    assert "# TYPE test_requests_total counter" in lines
+    assert 'test_requests_total{route="/x"} 3' in lines
+    assert "test_queue_depth 7" in lines
+    assert 'test_wait_seconds_bucket{le="+Inf"} 1' in lines and "test_wait_seconds_count 1" in lines
+    buckets = [int(l.rsplit(" ", 1)[1]) for l in lines if l.startswith("test_wait_seconds_bucket")]
+    assert buckets == sorted(buckets) and buckets[0] == 0
+    assert metrics.serve(0) is None
@@ -0,0 +1,58 @@
+# tests/test_pipeline.py
+import threading, time
+from concurrent.futures import ThreadPoolExecutor
+
+from bot.strategies import pipeline
+from bot.strategies.pipeline import Filter, Pipeline
+
+
+class _Broker:
+    def __init__(self, delay=0.0):
+        self.delay, self.calls = delay, 0
+        self._lock = threading.Lock()
+
+    def current_price(self, symbol):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.delay)
+        return 10.0
+
+
+def test_features_are_shared_across_strategies_within_a_cycle(monkeypatch):
+    monkeypatch.setattr(pipeline, "_pipelines", [])
+    broker = _Broker(delay=0.05)
+    a = Pipeline("a", [Filter("price", lambda ctx: ctx["price"] > 0)])
+    b = Pipeline("b", [Filter("price", lambda ctx: ctx["price"] < 100)])
+    filing = {"ticker": "AAA"}
+    with ThreadPoolExecutor(8) as pool:   # concurrent first uses: one lookup
+        assert all(pool.map(lambda p: p.run(filing, broker), [a, b] * 4))
+    assert broker.calls == 1
+    assert b.run({"ticker": "BBB"}, broker)["price"] == 10.0 and broker.calls == 2
+    pipeline.new_cycle(broker)
+    a.run(filing, broker)
+    assert broker.calls == 3
+
+
+def test_cheap_selective_filters_move_ahead_of_costly_ones(monkeypatch):
+    monkeypatch.setattr(pipeline, "_pipelines", [])
+    monkeypatch.setattr(pipeline, "REORDER_EVERY", 10)
+    monkeypatch.setattr(pipeline, "MIN_SAMPLES", 5)
+    lookups = []
+
+    def slow(broker, symbol):
+        lookups.append(symbol)
+        time.sleep(0.002)
+        return 1.0
+
+    monkeypatch.setitem(pipeline.FEATURES, "slow", slow)
+    p = Pipeline("t", [Filter("costly", lambda ctx: ctx["slow"] > 0),          # never rejects
+                       Filter("cheap", lambda ctx: ctx.symbol.endswith("0"))])  # rejects 9 in 10
+    broker = _Broker()
+    passed = [p.run({"ticker": f"S{i}"}, broker) is not None for i in range(100)]
+    assert sum(passed) == 10
+    assert [f.name for f in p.order] == ["cheap", "costly"]
+    assert len(lookups) == 10 + 9          # after the first re-sort only survivors pay for it
+    st = {s["filter"]: s for s in p.stats(reset=True)}
+    assert st["cheap"]["evals"] == 100 and st["cheap"]["rejects"] == 90
+    assert st["costly"]["evals"] == 19 and st["costly"]["mean_ms"] >= 2
+    assert pipeline.stats()["t"][0]["evals"] == 0
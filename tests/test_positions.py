@@ -0,0 +1,73 @@
+# tests/test_positions.py
+import datetime as dt, json
+
+from bot.utils.positions import PositionBook
+
+T0 = dt.datetime(2024, 5, 1, 14, 30)
+
+
+def _open(tmp_path, **kw):
+    return PositionBook(tmp_path / "positions.json", tmp_path / "positions.journal", **kw)
+
+
+def _pos(symbol, qty, price, t=T0, orders=()):
+    return {"symbol": symbol, "qty": qty, "entry_price": price, "entry_time": t, "exit_orders": list(orders)}
+
+
+def _state(book):
+    return sorted((p.symbol, p.qty, round(p.entry_price, 6), p.entry_time, tuple(p.exit_orders))
+                  for p in book.positions())
+
+
+def test_journal_replays_every_mutation_after_a_crash(tmp_path):
+    book = _open(tmp_path)
+    book.add(_pos("AAA", 10, 10.0, orders=["o1"]))
+    book.add(_pos("AAA", 30, 14.0, T0 - dt.timedelta(days=1), ["o2"]))   # second buy merges
+    book.add(_pos("BBB", 5, 20.0))
+    book.add(_pos("CCC", 5, 30.0))
+    book.reduce("BBB", 2)
+    book.set_exit_orders("CCC", ["o3"])
+    book.remove("CCC")
+    want = _state(book)
+    assert want == [("AAA", 40, 13.0, T0 - dt.timedelta(days=1), ("o1", "o2")),
+                    ("BBB", 3, 20.0, T0, ())]
+    assert not (tmp_path / "positions.json").exists()   # never compacted: all in the journal
+    assert _state(_open(tmp_path)) == want               # no close(): a crash
+
+
+def test_torn_last_record_is_dropped(tmp_path):
+    book = _open(tmp_path)
+    book.add(_pos("AAA", 10, 10.0))
+    with open(tmp_path / "positions.journal", "a") as f:
+        f.write('{"op": "add", "symbol": "BB')          # died mid-write
+    book = _open(tmp_path)
+    assert _state(book) == [("AAA", 10, 10.0, T0, ())]
+    book.add(_pos("BBB", 1, 1.0))
+    assert [p.symbol for p in _open(tmp_path).positions()] == ["AAA", "BBB"]
+
+
+def test_crash_between_snapshot_and_truncation_does_not_replay_twice(tmp_path):
+    book = _open(tmp_path, compact_every=1000)
+    book.add(_pos("AAA", 10, 10.0))
+    book.reduce("AAA", 4)
+    journal = (tmp_path / "positions.journal").read_text()
+    book.compact()
+    (tmp_path / "positions.journal").write_text(journal)   # the truncation never happened
+    book = _open(tmp_path)
+    assert _state(book) == [("AAA", 6, 10.0, T0, ())]
+    book.reduce("AAA", 1)
+    assert _state(_open(tmp_path)) == [("AAA", 5, 10.0, T0, ())]
+
+
+def test_snapshot_every_n_records_and_legacy_list(tmp_path):
+    book = _open(tmp_path, compact_every=3)
+    for i in range(7):
+        book.add(_pos(f"S{i}", 1, 1.0))
+    assert len(json.loads((tmp_path / "positions.json").read_text())["positions"]) == 6
+    assert len((tmp_path / "positions.journal").read_text().splitlines()) == 1
+    assert len(_open(tmp_path)) == 7
+
+    legacy = tmp_path / "legacy"
+    legacy.mkdir()
+    (legacy / "positions.json").write_text(json.dumps([dict(_pos("OLD", 3, 2.0), entry_time=T0.isoformat())]))
+    assert _state(_open(legacy)) == [("OLD", 3, 2.0, T0, ())]
@@ -0,0 +1,60 @@
+import datetime as dt, threading, time
+from collections import defaultdict
+
+import pytest
+
+from bot.brokers.sim import SimBroker, SimConfig
+from bot.risk import protect
+from bot.utils.positions import PositionBook
+
+
+@pytest.fixture
+def setup(tmp_path, monkeypatch):
+    monkeypatch.setattr(protect, "EXIT_ORDERS", "trailing")
+    broker = SimBroker(SimConfig(latency_ms=0, error_rate=0, rate_limit_per_min=0, partial_fill_rate=0))
+    book = PositionBook(tmp_path / "positions.json", tmp_path / "positions.journal")
+    return broker, book
+
+
+def _trails(broker, symbol):
+    return [o for o in broker.exit_orders.values() if o.symbol == symbol and o.status == "new"]
+
+
+def _book(book, symbol, qty):
+    return book.add({"symbol": symbol, "qty": qty, "entry_price": 10.0,
+                     "entry_time": dt.datetime.utcnow(), "exit_orders": []})
+
+
+def test_unfilled_entry_is_not_armed(setup):
+    broker, book = setup
+    _book(book, "AAA", 10)              # booked, but the broker holds no shares yet
+    protect.reconcile(broker, book)
+    assert _trails(broker, "AAA") == [] and book.get("AAA").exit_orders == []
+    broker.submit_buy_market("AAA", 10)  # the fill arrives
+    protect.reconcile(broker, book)
+    assert len(_trails(broker, "AAA")) == 1
+
+
+def test_entry_and_reconcile_arm_once(setup):
+    broker, book = setup
+    locks = defaultdict(threading.Lock)
+    armed = threading.Event()
+
+    def entry():
+        # main._place: buy, book and arm while holding the symbol lock
+        with locks["AAA"]:
+            broker.submit_buy_market("AAA", 10)
+            pos = _book(book, "AAA", 10)
+            time.sleep(0.2)             # reconcile runs meanwhile and waits on the lock
+            protect.arm(broker, book, pos, 10)
+            armed.set()
+
+    t = threading.Thread(target=entry)
+    t.start()
+    while "AAA" not in book:
+        time.sleep(0.001)
+    protect.reconcile(broker, book, lambda s: locks[s])
+    t.join()
+    assert armed.is_set()
+    assert len(_trails(broker, "AAA")) == 1
+    assert len(book.get("AAA").exit_orders) == 1
@@ -0,0 +1,66 @@
+# tests/test_scheduler.py
+import threading, time
+
+import pytest
+
+from bot.brokers.alpaca import PRIORITY_ENTRY, PRIORITY_EXIT, RequestScheduler
+
+
+def _until(cond, timeout=5):
+    end = time.monotonic() + timeout
+    while not cond():
+        assert time.monotonic() < end
+        time.sleep(0.001)
+
+
+def test_exit_calls_jump_queued_entry_lookups():
+    s = RequestScheduler(per_minute=240, burst=1)    # ~4 tokens a second once the burst is spent
+    s.acquire("get_bars")
+    served = []
+
+    def call(name, level=None):
+        if level is None:
+            s.acquire("get_bars")
+        else:
+            with s.priority(level):
+                s.acquire("get_bars")
+        served.append(name)
+
+    entries = [threading.Thread(target=call, args=(f"entry{i}",)) for i in range(3)]
+    for t in entries:
+        t.start()
+    _until(lambda: s.depth[PRIORITY_ENTRY] == 3)
+    exit_ = threading.Thread(target=call, args=("exit", PRIORITY_EXIT))
+    exit_.start()
+    for t in entries + [exit_]:
+        t.join(10)
+    assert served[0] == "exit" and sorted(served[1:]) == ["entry0", "entry1", "entry2"]
+    st = s.stats(reset=True)
+    assert (st["exit"]["calls"], st["entry"]["calls"], st["entry"]["delayed"]) == (1, 4, 3)
+    assert st["entry"]["queued"] == 0 and st["entry"]["wait_max"] > 0.2
+    assert s.stats()["entry"]["calls"] == 0
+
+
+def test_priority_only_raises_a_call():
+    s = RequestScheduler(per_minute=0)
+    with s.priority(PRIORITY_ENTRY):
+        s.acquire("submit_order_sell")                # an exit stays an exit
+        with s.priority(PRIORITY_EXIT):
+            s.acquire("get_bars")
+        s.acquire("get_bars")
+    st = s.stats()
+    assert (st["exit"]["calls"], st["entry"]["calls"]) == (2, 1)
+
+
+def test_429_empties_the_bucket():
+    s = RequestScheduler(per_minute=600, burst=50)
+
+    class TooMany(Exception):
+        status_code = 429
+
+    def fail():
+        raise TooMany()
+
+    with pytest.raises(TooMany):
+        s.call("get_bars", fail)
+    assert s.bucket.take() > 0                        # the next call waits for a refill
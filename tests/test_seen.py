@@ -0,0 +1,61 @@
+# tests/test_seen.py
+import hashlib, time
+from bot import main
+from bot.utils import state
+from bot.utils.state import SeenStore
+
+ISSUER = "https://www.sec.gov/Archives/edgar/data/320193/000032019324000061/0000320193-24-000061-index.htm"
+OWNER = "https://www.sec.gov/Archives/edgar/data/1496686/000032019324000061/0000320193-24-000061-index.htm"
+FILING = {"form": "4", "ticker": "AAPL", "accession": "0000320193-24-000061",
+          "link": ISSUER, "links": [ISSUER, OWNER]}
+
+
+def _sha1(text):
+    return hashlib.sha1(text.encode()).hexdigest()
+
+
+def test_filings_seen_under_the_legacy_link_key_are_not_retraded(monkeypatch, tmp_path):
+    store = SeenStore(tmp_path / "seen.db")
+    store.add(_sha1(OWNER))   # a pre-upgrade run saw the reporting owner's entry
+    monkeypatch.setattr(main, "seen", store)
+    fid = _sha1("0000320193-24-000061|AAPL")
+    assert main._is_seen(FILING, fid)
+    assert fid in store       # migrated: the next poll is a single lookup
+    assert not main._is_seen(dict(FILING, accession="0000320193-24-000099", links=[], link="x"), _sha1("new"))
+
+
+def test_dry_run_does_not_record_the_migrated_key(monkeypatch, tmp_path):
+    store = SeenStore(tmp_path / "seen.db")
+    store.add(_sha1(ISSUER))
+    monkeypatch.setattr(main, "seen", store)
+    monkeypatch.setattr(main, "DRY_RUN", True)
+    fid = _sha1("0000320193-24-000061|AAPL")
+    assert main._is_seen(FILING, fid)
+    assert fid not in store
+
+
+def test_legacy_json_is_migrated_once(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "state").mkdir()
+    (tmp_path / "state" / "seen.json").write_text('["a", "b", "c"]')
+    store = state.load_seen()
+    assert len(store) == 3 and "b" in store and "d" not in store
+    assert not (tmp_path / "state" / "seen.json").exists()
+    assert (tmp_path / "state" / "seen.json.migrated").exists()
+    store.add("d")
+    state.save_seen(store)
+    store.close()
+    assert len(state.load_seen()) == 4   # committed rows survive a reopen; nothing migrated twice
+
+
+def test_rows_past_retention_are_pruned(tmp_path):
+    store = SeenStore(tmp_path / "seen.db", retention_days=14)
+    now = time.time()
+    store.update(["old"], seen_at=now - 15 * 86400)
+    store.add("new", seen_at=now - 13 * 86400)
+    store.add("new", seen_at=now)   # re-adding keeps the first sighting
+    store.prune()
+    assert "old" not in store and "new" in store and len(store) == 1
+    store.close()
+    store = SeenStore(tmp_path / "seen.db", retention_days=12)   # opening sweeps too
+    assert len(store) == 0
@@ -0,0 +1,19 @@
+# tests/test_snapshots.py
+from bot.strategies import snapshots
+
+
+def test_every_live_evaluation_recorded_by_default(monkeypatch):
+    assert snapshots.RECORD_FEATURES == 1
+    assert snapshots.sampled({"accession": "0000320193-24-000001"})
+    monkeypatch.setattr(snapshots, "RECORD_FEATURES", 0.0)
+    assert not snapshots.sampled({"accession": "0000320193-24-000001"})
+
+
+def test_sample_rate_is_per_filing(monkeypatch):
+    filings = [{"accession": f"0000320193-24-{i:06d}"} for i in range(2000)]
+    monkeypatch.setattr(snapshots, "RECORD_FEATURES", 0.1)
+    picked = [f for f in filings if snapshots.sampled(f)]
+    assert 120 < len(picked) < 280
+    assert picked == [f for f in filings if snapshots.sampled(dict(f))]   # stable per accession
+    monkeypatch.setattr(snapshots, "RECORD_FEATURES", 1.0)
+    assert all(snapshots.sampled(f) for f in filings)
@@ -0,0 +1,24 @@
+# tests/test_startup.py
+import os, pathlib, subprocess, sys
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+
+
+def _startup_check(tmp_path, *args):
+    env = dict(os.environ, PYTHONPATH=str(ROOT))
+    env.pop("IMPORT_BUDGET_MS", None)
+    return subprocess.run([sys.executable, "-m", "bot", "startup-check", *args],
+                          cwd=tmp_path, env=env, capture_output=True, text=True, timeout=120)
+
+
+def test_import_stays_within_budget(tmp_path):
+    out = _startup_check(tmp_path)
+    assert out.returncode == 0, out.stdout + out.stderr
+    assert out.stdout.strip().endswith("— ok")
+    assert os.listdir(tmp_path) == []
+
+
+def test_blown_budget_fails(tmp_path):
+    out = _startup_check(tmp_path, "--budget-ms", "0")
+    assert out.returncode == 1
+    assert "FAILED" in out.stdout
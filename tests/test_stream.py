@@ -0,0 +1,62 @@
+# tests/test_stream.py
+import asyncio, json, socket
+from bot.data import stream
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _recording(path):
+    rows = [
+        (0.0, {"T": "t", "S": "AAPL", "p": 189.5, "s": 100, "t": "2024-05-02T14:30:00Z"}),
+        (0.0, {"T": "q", "S": "MSFT", "bp": 409.9, "ap": 410.1, "bs": 2, "as": 3, "t": "2024-05-02T14:30:00Z"}),
+        (0.0, {"T": "t", "S": "MSFT", "p": 410.0, "s": 50, "t": "2024-05-02T14:30:00Z"}),
+        (0.1, {"T": "t", "S": "AAPL", "p": 189.6, "s": 10, "t": "2024-05-02T14:30:00Z"}),
+        (0.1, {"T": "t", "S": "NVDA", "p": 880.0, "s": 10, "t": "2024-05-02T14:30:00Z"}),   # not subscribed
+        (1.1, {"T": "t", "S": "MSFT", "p": 411.0, "s": 50, "t": "2024-05-02T14:30:01Z"}),
+    ]
+    path.write_text("".join(json.dumps({"at": 1714660200 + at, "msg": m}) + "\n" for at, m in rows))
+
+
+def test_replayed_ticks_and_stale_prices_age_out(tmp_path):
+    """AAPL goes quiet after 0.1 s of replay; by MSFT's tick at 1.1 s its price is too old to use."""
+    _recording(tmp_path / "ticks.jsonl")
+    port = _free_port()
+
+    async def run():
+        server = asyncio.create_task(stream.replay_server(tmp_path / "ticks.jsonl", port=port))
+        await asyncio.sleep(0.2)
+        ts = stream.TickStream(url=f"ws://127.0.0.1:{port}", key="k", secret="s")
+        await ts.subscribe(["AAPL", "MSFT"])
+        last = stream.LastPrices(max_age=0.5)
+        seen, fresh_at_aapl = [], None
+        try:
+            async for tick in ts.ticks():
+                seen.append(tick)
+                if isinstance(tick, stream.Trade):
+                    last.update(tick.symbol, tick.price)
+                if isinstance(tick, stream.Trade) and tick.symbol == "AAPL" and tick.price == 189.6:
+                    fresh_at_aapl = last.fresh()
+                if isinstance(tick, stream.Trade) and tick.price == 411.0:
+                    break
+        finally:
+            await ts.close()
+            server.cancel()
+        return seen, fresh_at_aapl, last.fresh()
+
+    seen, before, after = asyncio.run(asyncio.wait_for(run(), 10))
+    assert [type(t).__name__ for t in seen] == ["Trade", "Quote", "Trade", "Trade", "Trade"]
+    assert "NVDA" not in {t.symbol for t in seen}
+    assert before == {"AAPL": 189.6, "MSFT": 410.0}
+    assert after == {"MSFT": 411.0}   # AAPL's last tick is ~1 s old: left to REST
+
+
+def test_discarded_symbols_are_forgotten():
+    last = stream.LastPrices(max_age=60)
+    last.update("AAPL", 1.0)
+    last.discard("AAPL")
+    last.discard("AAPL")
+    assert last.fresh() == {}
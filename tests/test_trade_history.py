@@ -0,0 +1,31 @@
+# tests/test_trade_history.py
+import datetime as dt
+
+from bot.strategies import insider_simple
+from bot.utils import journal, logger, trade_history
+from bot.utils.trade_history import TradeHistoryIndex
+
+
+def test_log_close_updates_the_index_in_place(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(journal, "_journals", {})
+    monkeypatch.setattr(trade_history, "_index", None)
+    heard = []
+    trade_history.get_index().subscribe(lambda *a: heard.append(a))
+    entry = dt.datetime(2024, 5, 1, 14, 30)
+    for symbol, exit_price in [("AAA", 12.0), ("AAA", 9.0), ("AAA", 11.0), ("BBB", 8.0)]:
+        logger.log_close({"symbol": symbol, "qty": 10, "entry_price": 10.0, "entry_time": entry},
+                         exit_price, "TP")
+
+    live = trade_history.get_index()
+    s = live.stats("AAA")
+    assert (s.count, s.wins, round(s.pnl_sum, 2)) == (3, 2, 20.0)
+    assert insider_simple._historical_insider_success("AAA") == 2 / 3
+    assert insider_simple._historical_insider_success("BBB") == 0.0
+    assert insider_simple._historical_insider_success("CCC") is None
+    assert [(sym, pnl) for sym, pnl, _ in heard] == [("AAA", 20.0), ("AAA", -10.0), ("AAA", 10.0), ("BBB", -20.0)]
+
+    journal.flush_all()
+    rebuilt = TradeHistoryIndex().load_journal()   # what the next start builds
+    for symbol in ("AAA", "BBB"):
+        assert rebuilt.stats(symbol).as_dict() == live.stats(symbol).as_dict()
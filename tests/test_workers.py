@@ -0,0 +1,98 @@
+import threading, time
+
+import pytest
+
+from bot import workers
+from bot.brokers.sim import synthetic_filings
+
+
+@pytest.fixture
+def pool(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    for k, v in {"SIM_LATENCY_MS": "0", "SIM_RATE_LIMIT_PER_MIN": "0", "SIM_ERROR_RATE": "0"}.items():
+        monkeypatch.setenv(k, v)
+    monkeypatch.setattr(workers, "PUT_POLL", 0.1)
+    orders = []
+    p = workers.WorkerPool(2, on_order=lambda *a: orders.append(a), broker_kind="sim", depth=1)
+    p.start()
+    p.orders = orders
+    yield p
+    p.stop()
+
+
+def _fill(pool, shard):
+    # stop the worker draining, then fill its one-slot queue
+    pool._procs[shard].kill()
+    pool._procs[shard].join()
+    pool._tasks[shard].put(("cycle",))
+    time.sleep(0.1)
+
+
+def test_evaluates_every_filing(pool):
+    filings = list(synthetic_filings(100, seed=2, run="t"))
+    for f in filings:
+        pool.submit(f, time.monotonic())
+    pool.wait()
+    st = pool.stats()
+    assert sum(st["filings"]) == 100
+    assert sum(f["evals"] for f in st["filters"]["insider_simple"][:1]) == 100
+    assert pool.orders
+
+
+def test_dispatch_to_a_dead_full_worker_respawns_it(pool):
+    _fill(pool, 0)
+    done = threading.Event()
+    filings = [f for f in synthetic_filings(200, seed=3, run="t")
+               if workers.shard_of(f["ticker"], 2) == 0][:workers.WORKER_BATCH * 3]
+
+    def dispatch():
+        for f in filings:
+            pool.submit(f, time.monotonic())
+        pool.wait()
+        done.set()
+
+    threading.Thread(target=dispatch, daemon=True).start()
+    assert done.wait(30), "dispatcher blocked on a dead worker"
+    assert pool._procs[0].is_alive()
+
+
+def test_forward_close_never_blocks(pool):
+    _fill(pool, 1)
+    sym = next(f["ticker"] for f in synthetic_filings(50, seed=4, run="t") if workers.shard_of(f["ticker"], 2) == 1)
+    t0 = time.monotonic()
+    for _ in range(20):
+        pool.forward_close(sym, 1.0)
+    assert time.monotonic() - t0 < 0.05
+    deadline = time.monotonic() + 30
+    while not pool._procs[1].is_alive() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert pool._procs[1].is_alive()
+
+
+def test_worker_killed_with_a_full_queue(pool):
+    """Filings the dead worker took are dropped; the batch blocked behind them goes to its replacement."""
+    done, lock = [], threading.Lock()
+    handle = pool._handle
+
+    def record(msg):
+        if msg[0] == "done":
+            with lock:
+                done.extend(msg[1])
+        handle(msg)
+
+    pool._handle = record
+    pool._procs[0].kill()
+    pool._procs[0].join()
+    filings = [f for f in synthetic_filings(400, seed=5, run="t")
+               if workers.shard_of(f["ticker"], 2) == 0][:workers.WORKER_BATCH * 2]
+    assert len(filings) == workers.WORKER_BATCH * 2
+    for f in filings:   # batch 1 fills the dead worker's queue, batch 2 blocks behind it
+        pool.submit(f, time.monotonic())
+    pool.wait()
+    with lock:
+        at_wait = sorted(done)
+    time.sleep(0.5)
+    assert sorted(done) == at_wait, "results arrived after wait() returned"
+    n = workers.WORKER_BATCH
+    assert at_wait == list(range(n + 1, 2 * n + 1))   # batch 2, once
+    assert not pool._pending